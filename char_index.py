@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import script_parser
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+MOVIES_DIR = script_parser.MOVIES_DIR
+CHARS_FILENAME = "chars"
+SCRIPT_FILENAME = script_parser.SCRIPT_FILENAME
+
+# Output goes next to the parser output unless --in-place is given, in which
+# case movies/<movie>/chars_dict is overwritten.
+OUTPUT_DIR = script_parser.OUTPUT_DIR
+INDEX_FILENAME = "chars_index.json"
+
+# Worker processes for fanning movies out (None = os.cpu_count())
+MAX_WORKERS = None
+
+# ==========================================
+# AHO-CORASICK AUTOMATON
+# ==========================================
+
+class NameAutomaton:
+    """
+    Aho-Corasick automaton over lowercase character names. One scan of a line
+    reports every (start, end, name) occurrence, regardless of how many names
+    there are.
+    """
+
+    def __init__(self, names):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for name in names:
+            self._add(name)
+        self._build()
+
+    def _add(self, name):
+        state = 0
+        for ch in name:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nxt
+        self.output[state].append(name)
+
+    def _build(self):
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if self.goto[f].get(ch, 0) != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter_matches(self, text):
+        """Yields (start, end, name) for every occurrence in text (overlaps included)."""
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for name in output[state]:
+                yield i - len(name) + 1, i + 1, name
+
+def _is_word_boundary(text, start, end):
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+def find_mentions(automaton, text):
+    """
+    Whole-word, leftmost-longest, non-overlapping name matches in a lowercase
+    line, so "day guard" is not also counted as "guard".
+    """
+    candidates = [m for m in automaton.iter_matches(text) if _is_word_boundary(text, m[0], m[1])]
+    candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+    kept = []
+    last_end = -1
+    for start, end, name in candidates:
+        if start >= last_end:
+            kept.append((start, end, name))
+            last_end = end
+    return kept
+
+# ==========================================
+# INDEXING
+# ==========================================
+
+def load_names(movie, movies_dir=MOVIES_DIR):
+    path = os.path.join(movies_dir, movie, CHARS_FILENAME)
+    with open(path, 'r', encoding='utf-8') as f:
+        # Blank lines used to yield the "" name that matched at every position
+        return [line.strip().lower() for line in f if line.strip()]
+
+def index_movie(movie, movies_dir=MOVIES_DIR):
+    """
+    Scans the script once. Returns (chars_dict, index) where index maps each
+    name to a list of [line_no, offset, kind] and kind is "cue" when the line
+    is that character's dialogue cue, "mention" otherwise.
+    """
+    names = load_names(movie, movies_dir)
+    automaton = NameAutomaton(names)
+    frequency = {name: 0 for name in names}
+    index = {name: [] for name in names}
+
+    script_path = os.path.join(movies_dir, movie, SCRIPT_FILENAME)
+    with open(script_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line_no, raw in enumerate(f, 1):
+            stripped = raw.strip()
+            if not stripped:
+                continue
+            lowered = raw.rstrip("\n").lower()
+            cue_name = None
+            if script_parser.is_cue(stripped):
+                cue_name = script_parser.normalize_cue(stripped).lower()
+            for start, end, name in find_mentions(automaton, lowered):
+                kind = "cue" if name == cue_name else "mention"
+                frequency[name] += 1
+                index[name].append([line_no, start, kind])
+    return frequency, index
+
+def _index_worker(args):
+    movie, movies_dir = args
+    start = time.perf_counter()
+    frequency, index = index_movie(movie, movies_dir)
+    return movie, frequency, index, time.perf_counter() - start
+
+def indexable_movies(movies_dir=MOVIES_DIR):
+    return sorted(
+        m for m in os.listdir(movies_dir)
+        if os.path.exists(os.path.join(movies_dir, m, CHARS_FILENAME))
+        and os.path.exists(os.path.join(movies_dir, m, SCRIPT_FILENAME))
+    )
+
+def index_corpus(movies=None, movies_dir=MOVIES_DIR, max_workers=MAX_WORKERS):
+    """Indexes movies in parallel worker processes. Yields (movie, chars_dict, index, seconds)."""
+    if movies is None:
+        movies = indexable_movies(movies_dir)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        yield from pool.map(_index_worker, [(m, movies_dir) for m in movies])
+
+def write_index(movie, frequency, index, in_place=False, movies_dir=MOVIES_DIR, out_dir=OUTPUT_DIR):
+    if in_place:
+        target = os.path.join(movies_dir, movie)
+    else:
+        target = os.path.join(out_dir, MOVIES_DIR, movie)
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, "chars_dict"), 'w', encoding='utf-8') as f:
+        json.dump(frequency, f)
+    with open(os.path.join(target, INDEX_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def main():
+    args = sys.argv[1:]
+    in_place = "--in-place" in args
+    movies = [a for a in args if not a.startswith("--")] or None
+
+    start = time.perf_counter()
+    count = 0
+    for movie, frequency, index, seconds in index_corpus(movies):
+        write_index(movie, frequency, index, in_place)
+        cues = sum(1 for hits in index.values() for hit in hits if hit[2] == "cue")
+        print(f"{movie:<30} {len(frequency):>3} names  {sum(frequency.values()):>6} mentions  {cues:>5} cues  {seconds * 1000:7.1f}ms")
+        count += 1
+    print(f"Indexed {count} movies in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
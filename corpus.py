@@ -0,0 +1,248 @@
+import os
+import json
+import hashlib
+import threading
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Path to the root folder
+ROOT_DIR = "dialogue_interactions"
+
+# Cached catalog; entries are reused while the file's (mtime, size) is unchanged
+CATALOG_PATH = ".corpus_catalog.json"
+CATALOG_VERSION = 2
+
+# Every prediction file gets a sidecar (llm-..._<pair>.sig) recording the
+# content hash of the pair file it was made from and the run signature of the
+# evaluator (model, options, prompts, modes). mtimes are arbitrary after a
+# clone or checkout, so freshness is decided by content only; predictions
+# without a sidecar are treated as stale.
+SIGNATURE_SUFFIX = ".sig"
+
+# Folder / file naming conventions of the dataset (see README)
+GT_FOLDER = "relationships"
+RELATIONSHIP_EVAL_FOLDER = "relationship_eval"
+AGESEX_EVAL_FOLDER = "agesex_eval"
+GT_SUFFIX = "_relationships.json"
+RELATIONSHIP_PREFIX = "llm-relationship_"
+AGESEX_PREFIX = "llm-agesex_"
+
+# ==========================================
+# CATALOG BUILDING
+# ==========================================
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _scan_json(folder):
+    """filename -> (path, mtime_ns, size) for every .json file directly in folder."""
+    found = {}
+    if not os.path.isdir(folder):
+        return found
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".json"):
+                st = entry.stat()
+                found[entry.name] = (entry.path, st.st_mtime_ns, st.st_size)
+    return found
+
+def _file_ref(scan, name):
+    hit = scan.get(name)
+    if hit is None:
+        return None
+    path, mtime, size = hit
+    return {"path": path, "mtime": mtime, "size": size}
+
+def content_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _summarize_pair(path):
+    """Loads a pair file once to record its content hash, interaction and line counts and speakers."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    interactions_list = json.loads(raw)
+    characters = []
+    line_counts = []
+    for interaction in interactions_list:
+        line_counts.append(len(interaction))
+        for line in interaction:
+            name = line.get("character", "Unknown")
+            if name not in characters:
+                characters.append(name)
+    return {
+        "sha256": hashlib.sha256(raw).hexdigest(),
+        "interactions": len(interactions_list),
+        "lines": sum(line_counts),
+        "line_counts": line_counts,
+        "characters": characters,
+    }
+
+def load_cached_catalog(cache_path=CATALOG_PATH):
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if catalog.get("version") != CATALOG_VERSION:
+        return None
+    return catalog
+
+def build_catalog(root=ROOT_DIR, cache_path=CATALOG_PATH, verbose=False):
+    """
+    Builds (or incrementally refreshes) the corpus catalog:
+
+        movies -> movie -> pairs -> pair name -> {
+            path, mtime, size, sha256, interactions, lines, line_counts, characters,
+            gt, relationship_pred, agesex_pred   (each {path, mtime, size} or None)
+        }
+
+    Each movie folder and its three sub-folders are listed once. Pair files are
+    only re-parsed when their mtime or size changed since the cached catalog.
+    """
+    previous = load_cached_catalog(cache_path) or {}
+    previous_movies = previous.get("movies", {}) if previous.get("root") == root else {}
+
+    catalog = {"version": CATALOG_VERSION, "root": root, "movies": {}}
+    reparsed = 0
+
+    if not os.path.isdir(root):
+        return catalog
+
+    with os.scandir(root) as it:
+        movie_dirs = sorted((e.name, e.path) for e in it if e.is_dir())
+
+    for movie, movie_path in movie_dirs:
+        pair_scan = _scan_json(movie_path)
+        gt_scan = _scan_json(os.path.join(movie_path, GT_FOLDER))
+        rel_scan = _scan_json(os.path.join(movie_path, RELATIONSHIP_EVAL_FOLDER))
+        agesex_scan = _scan_json(os.path.join(movie_path, AGESEX_EVAL_FOLDER))
+        old_pairs = previous_movies.get(movie, {}).get("pairs", {})
+
+        pairs = {}
+        for filename in sorted(pair_scan):
+            # Expecting: [movie]_[char1]_[char2].json
+            if not filename.startswith(movie):
+                continue
+            path, mtime, size = pair_scan[filename]
+            pair = filename[:-len(".json")]
+
+            old = old_pairs.get(pair)
+            if old and old.get("mtime") == mtime and old.get("size") == size:
+                summary = {k: old[k] for k in ("sha256", "interactions", "lines", "line_counts", "characters")}
+            else:
+                try:
+                    summary = _summarize_pair(path)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Failed to load {filename}: {e}")
+                    continue
+                reparsed += 1
+
+            pairs[pair] = {
+                "path": path,
+                "mtime": mtime,
+                "size": size,
+                **summary,
+                "gt": _file_ref(gt_scan, pair + GT_SUFFIX),
+                "relationship_pred": _file_ref(rel_scan, RELATIONSHIP_PREFIX + filename),
+                "agesex_pred": _file_ref(agesex_scan, AGESEX_PREFIX + filename),
+            }
+
+        catalog["movies"][movie] = {"path": movie_path, "pairs": pairs}
+
+    if verbose:
+        total = sum(len(m["pairs"]) for m in catalog["movies"].values())
+        print(f"Catalog: {len(catalog['movies'])} movies, {total} pair files ({reparsed} re-parsed)")
+
+    if cache_path:
+        # Per-process / per-thread temp name: several workers may refresh at once
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, cache_path)
+    return catalog
+
+# ==========================================
+# QUERIES
+# ==========================================
+
+def iter_pairs(catalog, movie=None):
+    """Yields (movie, pair_name, entry) in sorted order, optionally for a single movie."""
+    for movie_name, movie_entry in catalog["movies"].items():
+        if movie is not None and movie_name != movie:
+            continue
+        for pair, entry in movie_entry["pairs"].items():
+            yield movie_name, pair, entry
+
+def load_pair(entry):
+    with open(entry["path"], 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def iter_interactions(catalog, movie=None):
+    """
+    Lazily yields (movie, pair_name, interaction_idx, interaction_lines).
+    Only one pair file is held in memory at a time.
+    """
+    for movie_name, pair, entry in iter_pairs(catalog, movie):
+        for i, interaction in enumerate(load_pair(entry)):
+            yield movie_name, pair, i, interaction
+
+def run_signature(**fields):
+    """
+    Short hash over everything an evaluator's answers depend on (model,
+    options, prompts, modes). Values must be JSON-serializable.
+    """
+    material = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+def signature_path(prediction_path):
+    return os.path.splitext(prediction_path)[0] + SIGNATURE_SUFFIX
+
+def write_signature(prediction_path, pair_path, run=None):
+    """
+    Records the content hash of the pair file a prediction was just made from
+    and the run signature of the evaluator that made it.
+    """
+    signature = {"pair_sha256": content_hash(pair_path), "run": run}
+    tmp_path = f"{signature_path(prediction_path)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(signature, f)
+    os.replace(tmp_path, signature_path(prediction_path))
+
+def read_signature(prediction_path):
+    try:
+        with open(signature_path(prediction_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def is_stale(entry, kind, run=None):
+    """
+    True if the prediction of the given kind ("relationship_pred" or
+    "agesex_pred") is missing, has no signature, was made from different
+    pair-file content or, when run is given, by a differently configured run.
+    """
+    pred = entry.get(kind)
+    if pred is None:
+        return True
+    signature = read_signature(pred["path"])
+    if signature is None or signature.get("pair_sha256") != entry.get("sha256"):
+        return True
+    return run is not None and signature.get("run") != run
+
+def changed_pairs(catalog, kind, movie=None, run=None):
+    """Pairs whose prediction of the given kind must be (re)computed."""
+    return [(m, p, e) for m, p, e in iter_pairs(catalog, movie) if is_stale(e, kind, run)]
+
+if __name__ == "__main__":
+    catalog = build_catalog(verbose=True)
+    for movie_name, movie_entry in catalog["movies"].items():
+        pairs = movie_entry["pairs"].values()
+        print(f"{movie_name:<30} pairs={len(pairs):<3} "
+              f"interactions={sum(p['interactions'] for p in pairs):<5} "
+              f"lines={sum(p['lines'] for p in pairs)}")
@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import hashlib
+
+import numpy as np
+
+import corpus
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Output folder of the columnar store (rebuilt with `python dialogue_store.py`)
+STORE_DIR = "dialogue_store"
+STORE_VERSION = 2
+
+# Relationship / evidence type codes used in the GT columns
+RELATIONSHIP_CODES = ["Romantic", "Platonic", "Professional", "Antagonistic", "Familial", "Unknown"]
+EVIDENCE_TYPE_CODES = ["Implied", "Definitive", "Explicit"]
+NO_LABEL = -1
+
+# ==========================================
+# LAYOUT
+# ==========================================
+#
+# Every column is a flat .npy array (memory-mapped on read) or a UTF-8 blob:
+#
+#   meta.json             interned movie / pair / speaker names, code tables
+#                         and source sha256s used for freshness checks
+#   pair_movie            int32 [pairs]         movie id of each pair file
+#   pair_offsets          int64 [pairs+1]       interaction range of each pair
+#   interaction_offsets   int64 [inter+1]       line range of each interaction
+#   line_speaker          int32 [lines]         speaker id of each line
+#   line_text_offsets     int64 [lines+1]       byte range in line_text.bin
+#   line_text.bin                               concatenated dialogue text
+#
+#   gt_relationship       int8  [inter]         RELATIONSHIP_CODES index or NO_LABEL
+#   gt_item_offsets       int64 [inter+1]       evidence item range per interaction
+#   gt_item_type          int8  [items]         EVIDENCE_TYPE_CODES index
+#   gt_item_line_offsets  int64 [items+1]       range in gt_item_lines
+#   gt_item_lines         int32 [...]           cited line indices
+#   gt_item_text_offsets  int64 [items+1]       byte range in gt_item_text.bin
+#   gt_item_text.bin                            evidence text copied by annotators
+
+ARRAY_COLUMNS = [
+    "pair_movie", "pair_offsets", "interaction_offsets", "line_speaker", "line_text_offsets",
+    "gt_relationship", "gt_item_offsets", "gt_item_type", "gt_item_line_offsets",
+    "gt_item_lines", "gt_item_text_offsets",
+]
+
+# ==========================================
+# BUILD
+# ==========================================
+
+class _Interner:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __call__(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+def _code(table, value):
+    if value not in table:
+        table.append(value)
+    return table.index(value)
+
+def build_store(root=corpus.ROOT_DIR, out_dir=STORE_DIR, catalog=None):
+    """Converts every pair file (and its relationship GT, if any) into the columnar store."""
+    if catalog is None:
+        catalog = corpus.build_catalog(root)
+
+    movies, speakers = _Interner(), _Interner()
+    relationship_codes = list(RELATIONSHIP_CODES)
+    type_codes = list(EVIDENCE_TYPE_CODES)
+    pairs = []
+    pair_movie, pair_offsets = [], [0]
+    interaction_offsets, line_speaker, line_text_offsets = [0], [], [0]
+    gt_relationship, gt_item_offsets, gt_item_type = [], [0], []
+    gt_item_line_offsets, gt_item_lines, gt_item_text_offsets = [0], [], [0]
+    sources = {}
+
+    os.makedirs(out_dir, exist_ok=True)
+    text_path = os.path.join(out_dir, "line_text.bin")
+    item_text_path = os.path.join(out_dir, "gt_item_text.bin")
+
+    with open(text_path, 'wb') as text_out, open(item_text_path, 'wb') as item_text_out:
+        for movie, pair, entry in corpus.iter_pairs(catalog):
+            interactions_list = corpus.load_pair(entry)
+            gt_data, gt_sha256 = {}, None
+            if entry["gt"] is not None:
+                with open(entry["gt"]["path"], 'rb') as f:
+                    raw = f.read()
+                gt_data, gt_sha256 = json.loads(raw), hashlib.sha256(raw).hexdigest()
+
+            pairs.append(pair)
+            pair_movie.append(movies(movie))
+            sources[pair] = {"sha256": entry["sha256"], "gt_sha256": gt_sha256}
+
+            for i, interaction in enumerate(interactions_list):
+                for line in interaction:
+                    line_speaker.append(speakers(line.get("character", "Unknown")))
+                    encoded = line.get("dialogue", "").encode("utf-8")
+                    text_out.write(encoded)
+                    line_text_offsets.append(line_text_offsets[-1] + len(encoded))
+                interaction_offsets.append(len(line_speaker))
+
+                gt_obj = gt_data.get(str(i))
+                if gt_obj is None:
+                    gt_relationship.append(NO_LABEL)
+                else:
+                    gt_relationship.append(_code(relationship_codes, gt_obj.get("relationship", "Unknown")))
+                    for item in gt_obj.get("evidence", []):
+                        gt_item_type.append(_code(type_codes, item.get("type", "Implied")))
+                        gt_item_lines.extend(item.get("line_indices", []))
+                        gt_item_line_offsets.append(len(gt_item_lines))
+                        encoded = item.get("text", "").encode("utf-8")
+                        item_text_out.write(encoded)
+                        gt_item_text_offsets.append(gt_item_text_offsets[-1] + len(encoded))
+                gt_item_offsets.append(len(gt_item_type))
+
+            pair_offsets.append(len(interaction_offsets) - 1)
+
+    columns = {
+        "pair_movie": np.asarray(pair_movie, dtype=np.int32),
+        "pair_offsets": np.asarray(pair_offsets, dtype=np.int64),
+        "interaction_offsets": np.asarray(interaction_offsets, dtype=np.int64),
+        "line_speaker": np.asarray(line_speaker, dtype=np.int32),
+        "line_text_offsets": np.asarray(line_text_offsets, dtype=np.int64),
+        "gt_relationship": np.asarray(gt_relationship, dtype=np.int8),
+        "gt_item_offsets": np.asarray(gt_item_offsets, dtype=np.int64),
+        "gt_item_type": np.asarray(gt_item_type, dtype=np.int8),
+        "gt_item_line_offsets": np.asarray(gt_item_line_offsets, dtype=np.int64),
+        "gt_item_lines": np.asarray(gt_item_lines, dtype=np.int32),
+        "gt_item_text_offsets": np.asarray(gt_item_text_offsets, dtype=np.int64),
+    }
+    for name, array in columns.items():
+        np.save(os.path.join(out_dir, name + ".npy"), array)
+
+    meta = {
+        "version": STORE_VERSION,
+        "movies": movies.names,
+        "pairs": pairs,
+        "speakers": speakers.names,
+        "relationship_codes": relationship_codes,
+        "evidence_type_codes": type_codes,
+        "sources": sources,
+    }
+    with open(os.path.join(out_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+# ==========================================
+# READ
+# ==========================================
+
+class InteractionSlice:
+    """
+    View of one interaction inside the store. Speaker ids and text offsets are
+    array slices; strings are only decoded when asked for.
+    """
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.start = int(store.interaction_offsets[index])
+        self.stop = int(store.interaction_offsets[index + 1])
+
+    def __len__(self):
+        return self.stop - self.start
+
+    @property
+    def speaker_ids(self):
+        return self.store.line_speaker[self.start:self.stop]
+
+    def speakers(self):
+        names = self.store.speakers
+        return [names[s] for s in self.speaker_ids]
+
+    def dialogue(self, line_idx):
+        return self.store.line_text(self.start + line_idx)
+
+    def lines(self):
+        """Yields (speaker_name, dialogue) without building per-line dicts."""
+        names = self.store.speakers
+        for line_id in range(self.start, self.stop):
+            yield names[self.store.line_speaker[line_id]], self.store.line_text(line_id)
+
+    @property
+    def gt_relationship(self):
+        code = int(self.store.gt_relationship[self.index])
+        return None if code == NO_LABEL else self.store.relationship_codes[code]
+
+    def gt_evidence_lines(self):
+        """All line indices cited by the GT evidence of this interaction (int32 array)."""
+        s = self.store
+        first = s.gt_item_offsets[self.index]
+        last = s.gt_item_offsets[self.index + 1]
+        return s.gt_item_lines[s.gt_item_line_offsets[first]:s.gt_item_line_offsets[last]]
+
+class DialogueStore:
+    """Memory-mapped reader for a store written by build_store()."""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported dialogue store version in {path}")
+        self.meta = meta
+        self.movies = meta["movies"]
+        self.pairs = meta["pairs"]
+        self.speakers = meta["speakers"]
+        self.relationship_codes = meta["relationship_codes"]
+        self.evidence_type_codes = meta["evidence_type_codes"]
+        self.pair_ids = {pair: i for i, pair in enumerate(self.pairs)}
+
+        for name in ARRAY_COLUMNS:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode='r'))
+        self._text = self._map_blob("line_text.bin")
+        self._item_text = self._map_blob("gt_item_text.bin")
+
+    def _map_blob(self, name):
+        blob_path = os.path.join(self.path, name)
+        if os.path.getsize(blob_path) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(blob_path, dtype=np.uint8, mode='r')
+
+    def line_text(self, line_id):
+        start = self.line_text_offsets[line_id]
+        stop = self.line_text_offsets[line_id + 1]
+        return self._text[start:stop].tobytes().decode("utf-8")
+
+    def item_text(self, item_id):
+        start = self.gt_item_text_offsets[item_id]
+        stop = self.gt_item_text_offsets[item_id + 1]
+        return self._item_text[start:stop].tobytes().decode("utf-8")
+
+    def is_fresh(self, pair, sha256, kind="sha256"):
+        """True if the store was built from this exact content of the pair (kind="sha256") or GT file (kind="gt_sha256")."""
+        source = self.meta["sources"].get(pair)
+        return source is not None and source[kind] == sha256
+
+    def movie_of(self, pair):
+        return self.movies[self.pair_movie[self.pair_ids[pair]]]
+
+    def interaction_range(self, pair):
+        p = self.pair_ids[pair]
+        return int(self.pair_offsets[p]), int(self.pair_offsets[p + 1])
+
+    def interactions(self, pair):
+        """InteractionSlice for every interaction of a pair file, in order."""
+        start, stop = self.interaction_range(pair)
+        return [InteractionSlice(self, i) for i in range(start, stop)]
+
+    # --- Materializing helpers (original JSON shapes) ---
+
+    def load_pair(self, pair):
+        """Rebuilds the list-of-interactions structure of the original pair file."""
+        movie = self.movie_of(pair)
+        return [
+            [{"character": speaker, "dialogue": dialogue, "movie": movie} for speaker, dialogue in view.lines()]
+            for view in self.interactions(pair)
+        ]
+
+    def load_gt(self, pair):
+        """Rebuilds the {interaction_id: {relationship, evidence}} GT dict (empty if none)."""
+        start, stop = self.interaction_range(pair)
+        gt = {}
+        for i in range(start, stop):
+            code = int(self.gt_relationship[i])
+            if code == NO_LABEL:
+                continue
+            evidence = []
+            for item in range(int(self.gt_item_offsets[i]), int(self.gt_item_offsets[i + 1])):
+                lines = self.gt_item_lines[self.gt_item_line_offsets[item]:self.gt_item_line_offsets[item + 1]]
+                evidence.append({
+                    "line_indices": [int(x) for x in lines],
+                    "text": self.item_text(item),
+                    "type": self.evidence_type_codes[self.gt_item_type[item]],
+                })
+            gt[str(i - start)] = {"relationship": self.relationship_codes[code], "evidence": evidence}
+        return gt
+
+def open_store(path=STORE_DIR):
+    """Returns a DialogueStore, or None if no store has been built at path."""
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return DialogueStore(path)
+
+def load_pair_file(file_path, store=None):
+    """Reads a pair file from the store when it is up to date, otherwise from its JSON."""
+    pair = os.path.splitext(os.path.basename(file_path))[0]
+    if store is not None and store.is_fresh(pair, corpus.content_hash(file_path)):
+        return store.load_pair(pair)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_gt_file(gt_path, store=None):
+    """Reads a *_relationships.json GT file from the store when it is up to date."""
+    pair = os.path.basename(gt_path)[:-len(corpus.GT_SUFFIX)]
+    if store is not None and store.is_fresh(pair, corpus.content_hash(gt_path), "gt_sha256"):
+        return store.load_gt(pair)
+    with open(gt_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# ==========================================
+# ROUND-TRIP CHECK
+# ==========================================
+
+def verify_store(store, catalog):
+    """Compares every pair file and GT file against the store. Returns the list of mismatches."""
+    mismatches = []
+    for movie, pair, entry in corpus.iter_pairs(catalog):
+        if pair not in store.pair_ids:
+            mismatches.append(f"{pair}: missing from store")
+            continue
+        if store.load_pair(pair) != corpus.load_pair(entry):
+            mismatches.append(f"{pair}: dialogue differs")
+        if entry["gt"] is not None:
+            with open(entry["gt"]["path"], 'r', encoding='utf-8') as f:
+                if store.load_gt(pair) != json.load(f):
+                    mismatches.append(f"{pair}: relationship GT differs")
+    return mismatches
+
+if __name__ == "__main__":
+    catalog = corpus.build_catalog()
+    if "--verify" not in sys.argv[1:]:
+        meta = build_store(catalog=catalog)
+        print(f"Built {STORE_DIR}: {len(meta['pairs'])} pair files, {len(meta['speakers'])} speakers")
+    problems = verify_store(DialogueStore(), catalog)
+    for problem in problems:
+        print(f"  MISMATCH {problem}")
+    print("Round-trip OK" if not problems else f"{len(problems)} mismatches")
@@ -0,0 +1,437 @@
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import corpus
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+ROOT_DIR = corpus.ROOT_DIR
+
+# Ground truth spreadsheet (one row per character) and its parsed, indexed copy.
+# The cache is rebuilt whenever the spreadsheet's (mtime, size) changes.
+GT_XLSX = "character_asl_with_age_class.xlsx"
+GT_CACHE_PATH = ".agesex_gt_cache.json"
+GT_CACHE_VERSION = 1
+
+# Spreadsheet header -> GT field
+GT_COLUMNS = {
+    "character name": "name",
+    "moviename": "movie",
+    "sex": "sex",
+    "age": "age",
+    "age-class": "age_class",
+}
+
+# Ordered, so the index doubles as the ordinal used for the age error
+AGE_CLASSES = ["Toddler", "Child", "Adolescent", "Young Adult", "Adult", "Senior"]
+SEXES = ["Male", "Female"]
+
+# GT uses "m"/"f" and "young-adult"; "-" marks an unknown value
+SEX_MAP = {"m": "male", "f": "female"}
+UNKNOWN_VALUES = {"", "-", "unknown"}
+
+# Code for a missing GT value or prediction; predictions outside the label set
+# (e.g. "Teenager") get len(classes) and count as wrong
+MISSING = -1
+
+XLSX_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+# ==========================================
+# GROUND TRUTH (xlsx -> cached index)
+# ==========================================
+
+def normalize_name(name):
+    """Case, punctuation and whitespace insensitive key: "Dr. Jewell" -> "dr jewell"."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", (name or "").lower()).split())
+
+def _column_letters(ref):
+    return "".join(ch for ch in ref if ch.isalpha())
+
+def read_xlsx_rows(path):
+    """
+    Yields each non-empty row of the first worksheet as {column letter: text}.
+    Only shared strings, inline strings and plain values are handled, which is
+    all the GT spreadsheet uses.
+    """
+    with zipfile.ZipFile(path) as z:
+        shared = []
+        if "xl/sharedStrings.xml" in z.namelist():
+            root = ET.fromstring(z.read("xl/sharedStrings.xml"))
+            for si in root.findall("m:si", XLSX_NS):
+                shared.append("".join(t.text or "" for t in si.iter(f"{{{XLSX_NS['m']}}}t")))
+        sheet = ET.fromstring(z.read("xl/worksheets/sheet1.xml"))
+
+    for row in sheet.iter(f"{{{XLSX_NS['m']}}}row"):
+        values = {}
+        for cell in row.findall("m:c", XLSX_NS):
+            kind = cell.get("t")
+            if kind == "inlineStr":
+                text = "".join(t.text or "" for t in cell.iter(f"{{{XLSX_NS['m']}}}t"))
+            else:
+                v = cell.find("m:v", XLSX_NS)
+                if v is None:
+                    continue
+                text = shared[int(v.text)] if kind == "s" else v.text
+            values[_column_letters(cell.get("r"))] = text.strip()
+        if any(values.values()):
+            yield values
+
+def parse_gt_xlsx(path=GT_XLSX):
+    """{movie: {normalized name: {name, sex, age, age_class}}} from the GT spreadsheet."""
+    rows = read_xlsx_rows(path)
+    header = next(rows, {})
+    fields = {col: GT_COLUMNS[text.lower()] for col, text in header.items() if text.lower() in GT_COLUMNS}
+
+    index = {}
+    for values in rows:
+        record = {field: values.get(col, "") for col, field in fields.items()}
+        movie = record.pop("movie", "")
+        if not movie or not record.get("name"):
+            continue
+        index.setdefault(movie, {})[normalize_name(record["name"])] = record
+    return index
+
+def load_gt_index(path=GT_XLSX, cache_path=GT_CACHE_PATH, verbose=False):
+    """
+    Returns the GT index, parsing the spreadsheet only when it changed since
+    the cached copy was written.
+    """
+    st = os.stat(path)
+    source = {"path": path, "mtime": st.st_mtime_ns, "size": st.st_size}
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("version") == GT_CACHE_VERSION and cached.get("source") == source:
+                return cached["movies"]
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    start = time.perf_counter()
+    index = parse_gt_xlsx(path)
+    if verbose:
+        total = sum(len(chars) for chars in index.values())
+        print(f"Parsed {path}: {len(index)} movies, {total} characters in {time.perf_counter() - start:.3f}s")
+
+    if cache_path:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": GT_CACHE_VERSION, "source": source, "movies": index}, f)
+        os.replace(tmp_path, cache_path)
+    return index
+
+# ==========================================
+# LABEL CODES
+# ==========================================
+
+def _label_key(label):
+    return " ".join(label.strip().lower().replace("-", " ").split()) if isinstance(label, str) else ""
+
+AGE_IDS = {_label_key(c): i for i, c in enumerate(AGE_CLASSES)}
+SEX_IDS = {_label_key(c): i for i, c in enumerate(SEXES)}
+
+def age_code(label):
+    key = _label_key(label)
+    if key in UNKNOWN_VALUES:
+        return MISSING
+    return AGE_IDS.get(key, len(AGE_CLASSES))
+
+def sex_code(label):
+    key = _label_key(label)
+    if key in UNKNOWN_VALUES:
+        return MISSING
+    key = SEX_MAP.get(key, key)
+    return SEX_IDS.get(key, len(SEXES))
+
+def load_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return None
+
+# ==========================================
+# LOADING (one pass into aligned arrays)
+# ==========================================
+
+def load_scoring_data(catalog=None, gt_index=None, predictions=None, verbose=True):
+    """
+    Joins every llm-agesex prediction with the GT index in one pass. Each row
+    is one character as predicted from one pair file.
+
+    predictions: optional {pair_name: llm-agesex list} to score results held
+    in memory instead of the agesex_eval files.
+
+    Returns a dict with:
+      movies [m], characters [c]               (movie, GT name) per character id
+      movie [n], character [n]                 row -> movie id / character id
+      gt_age, pred_age, gt_sex, pred_sex [n]   label codes (MISSING = unknown)
+      files, unmatched                         scored pair files, predictions without a GT row
+    """
+    if catalog is None:
+        catalog = corpus.build_catalog(ROOT_DIR)
+    if gt_index is None:
+        gt_index = load_gt_index(verbose=verbose)
+
+    movies, characters = [], []
+    character_ids = {}
+    movie_col, char_col = [], []
+    gt_age, pred_age, gt_sex, pred_sex = [], [], [], []
+    files = 0
+    unmatched = []
+
+    for movie_name, movie_entry in catalog["movies"].items():
+        if predictions is None:
+            predicted = [(pair, entry) for pair, entry in movie_entry["pairs"].items() if entry["agesex_pred"]]
+        else:
+            predicted = [(pair, entry) for pair, entry in movie_entry["pairs"].items() if pair in predictions]
+        if not predicted:
+            continue
+
+        movie_gt = gt_index.get(movie_name)
+        if movie_gt is None:
+            if verbose:
+                print(f"Skipping {movie_name}: No rows in {GT_XLSX}.")
+            continue
+
+        movie_id = len(movies)
+        movies.append(movie_name)
+
+        for pair, entry in predicted:
+            if predictions is None:
+                llm_data = load_json(entry["agesex_pred"]["path"])
+            else:
+                llm_data = predictions[pair]
+            if not isinstance(llm_data, list):
+                continue
+
+            files += 1
+
+            # Expecting: [{"char1": NAME, "age": .., "sex": ..}, {"char2": NAME, ...}]
+            for item in llm_data:
+                if not isinstance(item, dict):
+                    continue
+                name = item.get("char1") or item.get("char2")
+                gt_obj = movie_gt.get(normalize_name(name))
+                if gt_obj is None:
+                    unmatched.append((movie_name, name))
+                    continue
+
+                key = (movie_name, normalize_name(name))
+                if key not in character_ids:
+                    character_ids[key] = len(characters)
+                    characters.append((movie_name, gt_obj["name"]))
+
+                movie_col.append(movie_id)
+                char_col.append(character_ids[key])
+                gt_age.append(age_code(gt_obj.get("age_class")))
+                gt_sex.append(sex_code(gt_obj.get("sex")))
+                pred_age.append(age_code(item.get("age")))
+                pred_sex.append(sex_code(item.get("sex")))
+
+    return {
+        "movies": movies,
+        "characters": characters,
+        "movie": np.asarray(movie_col, dtype=np.int32),
+        "character": np.asarray(char_col, dtype=np.int32),
+        "gt_age": np.asarray(gt_age, dtype=np.int32),
+        "pred_age": np.asarray(pred_age, dtype=np.int32),
+        "gt_sex": np.asarray(gt_sex, dtype=np.int32),
+        "pred_sex": np.asarray(pred_sex, dtype=np.int32),
+        "files": files,
+        "unmatched": unmatched,
+    }
+
+# ==========================================
+# METRICS (vectorized)
+# ==========================================
+
+def confusion_matrix(gt, pred, k):
+    """
+    k x (k + 1) counts over rows with a known GT value (rows = GT). The last
+    column collects missing and out-of-vocabulary predictions.
+    """
+    mask = (gt >= 0) & (gt < k)
+    pred = np.where((pred >= 0) & (pred < k), pred, k)
+    return np.bincount(gt[mask] * (k + 1) + pred[mask], minlength=k * (k + 1)).reshape(k, k + 1)
+
+def majority_votes(ids, codes, n_ids, k):
+    """
+    Most frequent in-vocabulary code per id (ties go to the lower code) and
+    how many of the id's rows cast it. Ids without any valid vote get MISSING.
+    """
+    valid = (codes >= 0) & (codes < k)
+    counts = np.bincount(ids[valid] * k + codes[valid], minlength=n_ids * k).reshape(n_ids, k)
+    votes = counts.argmax(axis=1).astype(np.int32)
+    support = counts.max(axis=1)
+    votes[support == 0] = MISSING
+    return votes, support
+
+def _ratio(num, den):
+    return float(num) / float(den) if den else 0.0
+
+def _field_metrics(movie, n_movies, gt, pred, k, ordinal=False):
+    known = (gt >= 0) & (gt < k)
+    correct = known & (gt == pred)
+    result = {
+        "n": int(known.sum()),
+        "correct": int(correct.sum()),
+        "accuracy": _ratio(correct.sum(), known.sum()),
+        "movie_correct": np.bincount(movie[correct], minlength=n_movies),
+        "movie_total": np.bincount(movie[known], minlength=n_movies),
+        "confusion": confusion_matrix(gt, pred, k),
+    }
+    if ordinal:
+        # Distance in age classes, over rows where both sides are in the label set
+        both = known & (pred >= 0) & (pred < k)
+        error = np.abs(gt[both] - pred[both]).astype(np.float64)
+        result["ordinal_n"] = int(both.sum())
+        result["ordinal_error"] = float(error.mean()) if len(error) else 0.0
+        result["within_one"] = _ratio((error <= 1).sum(), len(error))
+        result["movie_error_sum"] = np.bincount(movie[both], weights=error, minlength=n_movies)
+        result["movie_error_count"] = np.bincount(movie[both], minlength=n_movies)
+    return result
+
+def _character_metrics(data, gt_field, pred_field, k):
+    """Scores the majority vote of each character across all its pair files."""
+    n_chars = len(data["characters"])
+    char = data["character"]
+    votes, support = majority_votes(char, data[pred_field], n_chars, k)
+    rows = np.bincount(char, minlength=n_chars)
+
+    # Every row of a character carries the same GT value
+    gt = np.full(n_chars, MISSING, dtype=np.int32)
+    gt[char] = data[gt_field]
+
+    known = (gt >= 0) & (gt < k)
+    correct = known & (votes == gt)
+    return {
+        "votes": votes,
+        "support": support,
+        "rows": rows,
+        "gt": gt,
+        "n": int(known.sum()),
+        "correct": int(correct.sum()),
+        "accuracy": _ratio(correct.sum(), known.sum()),
+        # Share of a character's predictions that agree with its own majority
+        "consistency": _ratio(support.sum(), rows.sum()),
+        "unanimous": _ratio(((support == rows) & (rows > 1)).sum(), (rows > 1).sum()),
+    }
+
+def score(data):
+    n_movies = len(data["movies"])
+    movie = data["movie"]
+    return {
+        "rows": len(movie),
+        "age": _field_metrics(movie, n_movies, data["gt_age"], data["pred_age"], len(AGE_CLASSES), ordinal=True),
+        "sex": _field_metrics(movie, n_movies, data["gt_sex"], data["pred_sex"], len(SEXES)),
+        "character_age": _character_metrics(data, "gt_age", "pred_age", len(AGE_CLASSES)),
+        "character_sex": _character_metrics(data, "gt_sex", "pred_sex", len(SEXES)),
+    }
+
+# ==========================================
+# REPORT
+# ==========================================
+
+def _pct(correct, total):
+    return (correct / total) * 100 if total > 0 else 0.0
+
+def _label(classes, code):
+    return classes[code] if 0 <= code < len(classes) else "-"
+
+def print_confusion(title, classes, matrix):
+    print(f"\n{title} (rows = GT, columns = LLM)")
+    header = "".join(f"{name[:11]:>12}" for name in classes + ["Other"])
+    print(f"{'':<13}{header}")
+    for c, name in enumerate(classes):
+        print(f"{name:<13}" + "".join(f"{v:>12}" for v in matrix[c]))
+
+def print_characters(data, results):
+    age, sex = results["character_age"], results["character_sex"]
+    print("\n" + "="*100)
+    print(f"{'MOVIE':<28} | {'CHARACTER':<22} | {'FILES':>5} | {'AGE VOTE (GT)':<28} | {'SEX VOTE (GT)':<18}")
+    print("="*100)
+    for c, (movie, name) in enumerate(data["characters"]):
+        age_cell = f"{_label(AGE_CLASSES, age['votes'][c])} {age['support'][c]}/{age['rows'][c]} ({_label(AGE_CLASSES, age['gt'][c])})"
+        sex_cell = f"{_label(SEXES, sex['votes'][c])} {sex['support'][c]}/{sex['rows'][c]} ({_label(SEXES, sex['gt'][c])})"
+        print(f"{movie[:28]:<28} | {name[:22]:<22} | {age['rows'][c]:>5} | {age_cell:<28} | {sex_cell:<18}")
+
+def print_report(data, results, elapsed=None):
+    age, sex = results["age"], results["sex"]
+    print("\n" + "="*100)
+    print(f"{'MOVIE':<30} | {'AGE-CLASS ACCURACY':<22} | {'SEX ACCURACY':<22} | {'AGE ERROR (classes)':<18}")
+    print("="*100)
+
+    for i, movie in enumerate(data["movies"]):
+        a_c, a_t = age["movie_correct"][i], age["movie_total"][i]
+        s_c, s_t = sex["movie_correct"][i], sex["movie_total"][i]
+        e_n = age["movie_error_count"][i]
+        error = age["movie_error_sum"][i] / e_n if e_n > 0 else 0.0
+        age_count = f"({a_c}/{a_t})"
+        sex_count = f"({s_c}/{s_t})"
+        print(f"{movie:<30} | {_pct(a_c, a_t):6.2f}% {age_count:<14} | "
+              f"{_pct(s_c, s_t):6.2f}% {sex_count:<14} | {error:6.3f}")
+
+    print("="*100)
+    age_count = f"({age['correct']}/{age['n']})"
+    sex_count = f"({sex['correct']}/{sex['n']})"
+    print(f"{'OVERALL':<30} | {age['accuracy'] * 100:6.2f}% {age_count:<14} | "
+          f"{sex['accuracy'] * 100:6.2f}% {sex_count:<14} | {age['ordinal_error']:6.3f}")
+    print("="*100)
+    print(f"Total Files Processed: {data['files']}  ({results['rows']} character predictions)")
+    if data["unmatched"]:
+        names = ", ".join(f"{m}/{n}" for m, n in data["unmatched"][:10])
+        more = f" (+{len(data['unmatched']) - 10} more)" if len(data["unmatched"]) > 10 else ""
+        print(f"Predictions without a GT row: {len(data['unmatched'])}: {names}{more}")
+    print("\n* Age error: mean distance in age classes (Toddler .. Senior) where both labels are known;")
+    print(f"  {age['within_one'] * 100:.2f}% of {age['ordinal_n']} predictions are within one class.")
+
+    print_confusion("AGE-CLASS CONFUSION MATRIX", AGE_CLASSES, age["confusion"])
+    print_confusion("SEX CONFUSION MATRIX", SEXES, sex["confusion"])
+
+    # Per-character aggregation across pair files
+    c_age, c_sex = results["character_age"], results["character_sex"]
+    print(f"\nPER-CHARACTER MAJORITY VOTE ({len(data['characters'])} characters)")
+    print(f"  Age-class accuracy {c_age['accuracy'] * 100:6.2f}% ({c_age['correct']}/{c_age['n']})   "
+          f"consistency {c_age['consistency'] * 100:6.2f}%   unanimous {c_age['unanimous'] * 100:6.2f}%")
+    print(f"  Sex accuracy       {c_sex['accuracy'] * 100:6.2f}% ({c_sex['correct']}/{c_sex['n']})   "
+          f"consistency {c_sex['consistency'] * 100:6.2f}%   unanimous {c_sex['unanimous'] * 100:6.2f}%")
+    print("  (consistency = share of a character's predictions matching its own vote;")
+    print("   unanimous = characters in several pair files whose predictions all agree)")
+
+    if elapsed is not None:
+        print(f"\nScoring time: {elapsed:.3f}s")
+
+# ==========================================
+# MAIN EVALUATION LOGIC
+# ==========================================
+
+def main():
+    args = sys.argv[1:]
+
+    # 1. Load every prediction and join it with the GT index
+    data = load_scoring_data()
+
+    # 2. Score
+    start = time.perf_counter()
+    results = score(data)
+    elapsed = time.perf_counter() - start
+
+    # 3. Print
+    print_report(data, results, elapsed)
+    if "--characters" in args:
+        print_characters(data, results)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 import os
 import json
-import collections
+import time
+
+import numpy as np
+
+import corpus
+import dialogue_store
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
 
-ROOT_DIR = "dialogue_interactions"
+ROOT_DIR = corpus.ROOT_DIR
+
+# Read GT from the columnar store (dialogue_store.py) when it is up to date
+USE_DIALOGUE_STORE = True
 
 # Mapping for Evidence Types (if you want to compare them strictly later)
 # LLM uses "Explicit", GT uses "Definitive"
@@ -15,6 +23,18 @@ TYPE_MAP = {
     "Implied": "Implied"
 }
 
+# Relationship classes scored per class and in the confusion matrix. Other
+# labels (e.g. "Unknown") still count for accuracy via exact match.
+CLASSES = ["Romantic", "Platonic", "Professional", "Antagonistic", "Familial"]
+
+# Bootstrap confidence intervals (resampling interactions with replacement)
+BOOTSTRAP_SAMPLES = 10000
+BOOTSTRAP_SEED = 0
+CONFIDENCE = 0.95
+BOOTSTRAP_CHUNK = 1000
+
+MISSING = -1
+
 # ==========================================
 # HELPER FUNCTIONS
 # ==========================================
@@ -26,13 +46,20 @@ def get_line_indices(evidence_list):
     indices = set()
     if not evidence_list:
         return indices
-    
+
     for item in evidence_list:
         lines = item.get("line_indices", [])
         for line in lines:
             indices.add(line)
     return indices
 
+def load_gt(path, store):
+    try:
+        return dialogue_store.load_gt_file(path, store)
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return None
+
 def load_json(path):
     try:
         with open(path, 'r', encoding='utf-8') as f:
@@ -42,163 +69,389 @@ def load_json(path):
         return None
 
 # ==========================================
-# MAIN EVALUATION LOGIC
+# LOADING (one pass into aligned arrays)
 # ==========================================
 
-def main():
-    # Statistics Containers
-    # movie_stats[movie_name] = { 'correct_rel': 0, 'total_rel': 0, 'evidence_recall_sum': 0, 'evidence_count': 0 }
-    movie_stats = collections.defaultdict(lambda: {
-        'correct_rel': 0, 
-        'total_rel': 0, 
-        'evidence_recall_sum': 0.0, 
-        'evidence_count': 0
-    })
-
-    # Global counters
-    total_files_processed = 0
-
-    # 1. Walk through the directory structure
-    for root, dirs, files in os.walk(ROOT_DIR):
-        
-        # We only care about the LLM output folder
-        if os.path.basename(root) == "relationship_eval":
-            movie_name = os.path.basename(os.path.dirname(root))
-            movie_dir = os.path.dirname(root)
-            gt_folder = os.path.join(movie_dir, "relationships")
-
-            # Check if GT folder exists
-            if not os.path.exists(gt_folder):
+def _valid_indices(evidence_list, line_count=None):
+    """
+    Non-negative integer line indices of an evidence list. With line_count,
+    indices past the end of the interaction (hallucinated lines) are renumbered
+    to consecutive slots right after it: each still counts against precision,
+    but the bitset width no longer depends on how large the bogus index is.
+    """
+    indices = sorted(i for i in get_line_indices(evidence_list) if isinstance(i, int) and i >= 0)
+    if line_count is None:
+        return indices
+    inside = [i for i in indices if i < line_count]
+    return inside + list(range(line_count, line_count + len(indices) - len(inside)))
+
+def _to_bitsets(index_lists, words):
+    """List of line-index lists -> uint64 array [n, words] with bit i set for line i."""
+    bits = np.zeros((len(index_lists), words), dtype=np.uint64)
+    rows, cols = [], []
+    for row, indices in enumerate(index_lists):
+        rows.extend([row] * len(indices))
+        cols.extend(indices)
+    if rows:
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        np.bitwise_or.at(bits, (rows, cols // 64), np.left_shift(np.uint64(1), (cols % 64).astype(np.uint64)))
+    return bits
+
+def load_scoring_data(catalog=None, predictions=None, store=None, verbose=True):
+    """
+    Loads every (GT, prediction) interaction pair once into aligned arrays.
+
+    predictions: optional {pair_name: llm-relationship dict} to score results
+    held in memory (e.g. sweep variants) instead of the relationship_eval files.
+    Pairs without a prediction are skipped, like missing prediction files.
+
+    Returns a dict with:
+      movies [m], movie [n], gt [n], pred [n]    label codes (MISSING = no prediction)
+      pair [n], index [n]                        pair number and interaction id
+      labels                                     code -> lowercase label
+      gt_bits / pred_bits [n, words]             evidence line bitsets
+      files                                      number of scored pair files
+    """
+    if catalog is None:
+        catalog = corpus.build_catalog(ROOT_DIR)
+    if store is None and USE_DIALOGUE_STORE:
+        store = dialogue_store.open_store()
+
+    labels = [c.lower() for c in CLASSES]
+    label_ids = {label: i for i, label in enumerate(labels)}
+
+    def code(label):
+        label = (label or "").strip().lower() if isinstance(label, str) else ""
+        if label not in label_ids:
+            label_ids[label] = len(labels)
+            labels.append(label)
+        return label_ids[label]
+
+    movies = []
+    movie_col, gt_col, pred_col = [], [], []
+    pair_col, index_col = [], []
+    gt_lines, pred_lines = [], []
+    files = 0
+
+    for movie_name, movie_entry in catalog["movies"].items():
+        if predictions is None:
+            predicted = [(pair, entry) for pair, entry in movie_entry["pairs"].items() if entry["relationship_pred"]]
+        else:
+            predicted = [(pair, entry) for pair, entry in movie_entry["pairs"].items() if pair in predictions]
+        if not predicted:
+            continue
+
+        # Check if GT folder exists
+        if not os.path.exists(os.path.join(movie_entry["path"], corpus.GT_FOLDER)):
+            if verbose:
                 print(f"Skipping {movie_name}: No 'relationships' Ground Truth folder found.")
+            continue
+
+        movie_id = len(movies)
+        movies.append(movie_name)
+
+        for pair, entry in predicted:
+            # GT:  [movie]_[char1]_[char2]_relationships.json (resolved by the catalog)
+            if entry["gt"] is None:
+                if verbose:
+                    print(f"  Warning: GT file missing for {corpus.RELATIONSHIP_PREFIX}{pair}.json")
                 continue
 
-            for file in files:
-                if file.startswith("llm-relationship_") and file.endswith(".json"):
-                    llm_path = os.path.join(root, file)
-                    
-                    # 2. Construct Ground Truth Filename
-                    # LLM: llm-relationship_[movie]_[char1]_[char2].json
-                    # GT:  [movie]_[char1]_[char2]_relationships.json
-                    
-                    base_name = file.replace("llm-relationship_", "") # Remove prefix
-                    gt_filename = base_name.replace(".json", "_relationships.json") # Add suffix
-                    gt_path = os.path.join(gt_folder, gt_filename)
-
-                    if not os.path.exists(gt_path):
-                        # Try to handle potential minor naming mismatches if necessary
-                        print(f"  Warning: GT file missing for {file}")
-                        continue
-
-                    # 3. Load Data
-                    llm_data = load_json(llm_path)
-                    gt_data = load_json(gt_path)
-
-                    if not llm_data or not gt_data:
-                        continue
-
-                    total_files_processed += 1
-
-                    # 4. Compare Interaction by Interaction
-                    # We iterate through GT keys to ensure we are checking what SHOULD be there.
-                    for interaction_id, gt_obj in gt_data.items():
-                        
-                        # Initialize metric for this specific interaction
-                        is_rel_correct = False
-                        evidence_recall = 0.0
-                        
-                        # Get corresponding LLM object
-                        llm_obj = llm_data.get(interaction_id)
-
-                        # --- A. Relationship Classification Accuracy ---
-                        gt_rel = gt_obj.get("relationship", "").strip().lower()
-                        
-                        if llm_obj:
-                            llm_rel = llm_obj.get("relationship", "").strip().lower()
-                            if gt_rel == llm_rel:
-                                is_rel_correct = True
-                        
-                        # Update Stats
-                        movie_stats[movie_name]['total_rel'] += 1
-                        if is_rel_correct:
-                            movie_stats[movie_name]['correct_rel'] += 1
-
-                        # --- B. Evidence Retrieval (Recall) ---
-                        # "Additional evidence... shouldn't be counted as negative" -> Ignore Precision
-                        # "Evidence that hasn't been found... should be negatively noted" -> Use Recall
-                        
-                        gt_indices = get_line_indices(gt_obj.get("evidence", []))
-                        
-                        if len(gt_indices) > 0:
-                            if llm_obj:
-                                llm_indices = get_line_indices(llm_obj.get("evidence", []))
-                                
-                                # Find intersection (Correctly identified lines)
-                                common = gt_indices.intersection(llm_indices)
-                                
-                                # Recall = Matches / Total Expected
-                                evidence_recall = len(common) / len(gt_indices)
-                            else:
-                                # LLM missed this interaction entirely
-                                evidence_recall = 0.0
-                            
-                            movie_stats[movie_name]['evidence_recall_sum'] += evidence_recall
-                            movie_stats[movie_name]['evidence_count'] += 1
-                        else:
-                            # If GT has no evidence lines listed, we skip evidence scoring for this item
-                            pass
-
-    # ==========================================
-    # PRINT RESULTS
-    # ==========================================
+            if predictions is None:
+                llm_data = load_json(entry["relationship_pred"]["path"])
+            else:
+                llm_data = predictions[pair]
+            gt_data = load_gt(entry["gt"]["path"], store)
 
-    print("\n" + "="*90)
-    print(f"{'MOVIE':<30} | {'RELATIONSHIP ACCURACY':<25} | {'EVIDENCE RECALL (Line Match)':<25}")
-    print("="*90)
+            if not llm_data or not gt_data:
+                continue
 
-    grand_total_rel = 0
-    grand_correct_rel = 0
-    grand_recall_sum = 0
-    grand_recall_count = 0
+            files += 1
+            pair_id = files
 
-    for movie, stats in movie_stats.items():
-        # Rel Accuracy
-        if stats['total_rel'] > 0:
-            rel_acc = (stats['correct_rel'] / stats['total_rel']) * 100
-        else:
-            rel_acc = 0.0
-            
-        # Evidence Recall
-        if stats['evidence_count'] > 0:
-            avg_recall = (stats['evidence_recall_sum'] / stats['evidence_count']) * 100
-        else:
-            avg_recall = 0.0
+            line_counts = entry.get("line_counts", [])
+            # We iterate through GT keys to ensure we are checking what SHOULD be there.
+            for interaction_id, gt_obj in gt_data.items():
+                llm_obj = llm_data.get(interaction_id)
+                k = int(interaction_id)
+                line_count = line_counts[k] if k < len(line_counts) else None
+                movie_col.append(movie_id)
+                pair_col.append(pair_id)
+                index_col.append(k)
+                gt_col.append(code(gt_obj.get("relationship", "")))
+                gt_lines.append(_valid_indices(gt_obj.get("evidence", [])))
+                if llm_obj:
+                    pred_col.append(code(llm_obj.get("relationship", "")))
+                    pred_lines.append(_valid_indices(llm_obj.get("evidence", []), line_count))
+                else:
+                    pred_col.append(MISSING)
+                    pred_lines.append([])
+
+    max_line = max((max(l) for l in gt_lines + pred_lines if l), default=0)
+    words = max_line // 64 + 1
+    return {
+        "movies": movies,
+        "labels": labels,
+        "movie": np.asarray(movie_col, dtype=np.int32),
+        "gt": np.asarray(gt_col, dtype=np.int32),
+        "pred": np.asarray(pred_col, dtype=np.int32),
+        "pair": np.asarray(pair_col, dtype=np.int32),
+        "index": np.asarray(index_col, dtype=np.int32),
+        "gt_bits": _to_bitsets(gt_lines, words),
+        "pred_bits": _to_bitsets(pred_lines, words),
+        "files": files,
+    }
+
+# ==========================================
+# METRICS (vectorized)
+# ==========================================
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(bits):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+else:
+    # NumPy < 2.0 has no bitwise_count: unpack the bytes of each row instead
+    def _popcount(bits):
+        bytes_ = np.ascontiguousarray(bits).view(np.uint8).reshape(len(bits), -1)
+        return np.unpackbits(bytes_, axis=1).sum(axis=1, dtype=np.int64)
+
+def per_interaction_metrics(data):
+    """
+    Per-interaction vectors that every aggregate is built from:
+      correct           exact (case-insensitive) label match
+      recall, has_gt    |GT ∩ pred| / |GT| where GT cites lines
+      precision, has_pred_ev    |GT ∩ pred| / |pred| where the prediction cites lines
+      jaccard, has_union        |GT ∩ pred| / |GT ∪ pred| where either cites lines
+    """
+    gt_count = _popcount(data["gt_bits"])
+    pred_count = _popcount(data["pred_bits"])
+    common = _popcount(data["gt_bits"] & data["pred_bits"])
+    union = gt_count + pred_count - common
+
+    def ratio(num, den):
+        out = np.zeros(len(num), dtype=np.float64)
+        np.divide(num, den, out=out, where=den > 0)
+        return out
+
+    return {
+        "correct": (data["gt"] == data["pred"]).astype(np.float64),
+        "recall": ratio(common, gt_count), "has_gt": gt_count > 0,
+        "precision": ratio(common, pred_count), "has_pred_ev": pred_count > 0,
+        "jaccard": ratio(common, union), "has_union": union > 0,
+    }
+
+def confusion_matrix(gt, pred, k=len(CLASSES)):
+    """k x k counts over interactions whose GT and prediction are both among CLASSES (rows = GT)."""
+    mask = (gt >= 0) & (gt < k) & (pred >= 0) & (pred < k)
+    return np.bincount(gt[mask] * k + pred[mask], minlength=k * k).reshape(k, k)
+
+def class_report(gt, pred, k=len(CLASSES)):
+    """
+    Per-class precision / recall / F1 over all interactions: a GT label of
+    class c counts towards recall even when the prediction is missing or out
+    of vocabulary; precision counts every prediction of class c.
+    """
+    classes = np.arange(k)
+    tp = np.array([np.sum((gt == c) & (pred == c)) for c in classes])
+    support = np.array([np.sum(gt == c) for c in classes])
+    predicted = np.array([np.sum(pred == c) for c in classes])
+    precision = np.divide(tp, predicted, out=np.zeros(k), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros(k), where=support > 0)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros(k), where=denom > 0)
+    return {"precision": precision, "recall": recall, "f1": f1, "support": support}
+
+def label_switch_rate(pair, index, labels):
+    """Share of consecutive interactions of a pair (by interaction id) whose labels differ."""
+    order = np.lexsort((index, pair))
+    same_pair = pair[order][1:] == pair[order][:-1]
+    changed = labels[order][1:] != labels[order][:-1]
+    return float(changed[same_pair].mean()) if same_pair.any() else 0.0
+
+def _masked_mean(values, mask):
+    return float(values[mask].mean()) if mask.any() else 0.0
+
+def score(data):
+    """Overall and per-movie aggregates as plain floats / arrays."""
+    m = per_interaction_metrics(data)
+    n_movies = len(data["movies"])
+    movie = data["movie"]
+
+    def per_movie(values, mask=None):
+        weights = values if mask is None else values * mask
+        counts = np.bincount(movie, minlength=n_movies) if mask is None else np.bincount(movie, weights=mask, minlength=n_movies)
+        sums = np.bincount(movie, weights=weights, minlength=n_movies)
+        return sums, counts
+
+    correct_sum, total = per_movie(m["correct"])
+    recall_sum, recall_count = per_movie(m["recall"], m["has_gt"].astype(np.float64))
+
+    report = class_report(data["gt"], data["pred"])
+    return {
+        "n": len(data["gt"]),
+        "accuracy": float(m["correct"].mean()) if len(data["gt"]) else 0.0,
+        "evidence_recall": _masked_mean(m["recall"], m["has_gt"]),
+        "evidence_precision": _masked_mean(m["precision"], m["has_pred_ev"]),
+        "evidence_jaccard": _masked_mean(m["jaccard"], m["has_union"]),
+        "macro_f1": float(report["f1"].mean()),
+        "classes": report,
+        "confusion": confusion_matrix(data["gt"], data["pred"]),
+        "gt_switch_rate": label_switch_rate(data["pair"], data["index"], data["gt"]),
+        "pred_switch_rate": label_switch_rate(data["pair"], data["index"], data["pred"]),
+        "movie_correct": correct_sum.astype(np.int64),
+        "movie_total": total.astype(np.int64),
+        "movie_recall_sum": recall_sum,
+        "movie_recall_count": recall_count.astype(np.int64),
+    }
+
+EVIDENCE_SERIES = [
+    ("evidence_recall", "recall", "has_gt"),
+    ("evidence_precision", "precision", "has_pred_ev"),
+    ("evidence_jaccard", "jaccard", "has_union"),
+]
+
+def bootstrap(data, samples=BOOTSTRAP_SAMPLES, seed=BOOTSTRAP_SEED, confidence=CONFIDENCE):
+    """
+    Percentile bootstrap CIs for accuracy, macro-F1 and the evidence metrics.
+
+    Each resample is represented by how often it draws every interaction
+    (a [b, n] count matrix built with one bincount per chunk). Every statistic
+    is a ratio of weighted sums, so a single matrix product with a per-
+    interaction feature matrix scores a whole chunk of resamples.
+    """
+    m = per_interaction_metrics(data)
+    n = len(data["gt"])
+    if n == 0:
+        return {}
+    rng = np.random.default_rng(seed)
+    k = len(CLASSES)
+    gt, pred = data["gt"], data["pred"]
+    # Out-of-vocabulary / missing predictions go to an extra column k so they
+    # still count as misses for recall but never as a hit.
+    gt_k = np.where((gt >= 0) & (gt < k), gt, k)
+    pred_k = np.where((pred >= 0) & (pred < k), pred, k)
+    pair_code = gt_k * (k + 1) + pred_k
+
+    # Feature columns: correct, then (value * mask, mask) per evidence metric,
+    # then a one-hot of the (GT, prediction) confusion cell.
+    columns = [m["correct"]]
+    for _, value_name, mask_name in EVIDENCE_SERIES:
+        mask = m[mask_name].astype(np.float64)
+        columns += [m[value_name] * mask, mask]
+    features = np.concatenate([
+        np.stack(columns, axis=1),
+        np.eye((k + 1) ** 2)[pair_code],
+    ], axis=1)
+    cm_start = 1 + 2 * len(EVIDENCE_SERIES)
+
+    series = {name: [] for name in ("accuracy", "macro_f1", "evidence_recall", "evidence_precision", "evidence_jaccard")}
+    done = 0
+    while done < samples:
+        b = min(BOOTSTRAP_CHUNK, samples - done)
+        idx = rng.integers(0, n, size=(b, n), dtype=np.int32)
+        offsets = (np.arange(b, dtype=np.int64) * n)[:, None]
+        weights = np.bincount((idx + offsets).ravel(), minlength=b * n).reshape(b, n).astype(np.float64)
+        sums = weights @ features
+
+        series["accuracy"].append(sums[:, 0] / n)
+        for j, (name, _, _) in enumerate(EVIDENCE_SERIES):
+            num, den = sums[:, 1 + 2 * j], sums[:, 2 + 2 * j]
+            series[name].append(np.divide(num, den, out=np.zeros(b), where=den > 0))
 
-        print(f"{movie:<30} | {rel_acc:6.2f}% ({stats['correct_rel']}/{stats['total_rel']})       | {avg_recall:6.2f}% (Avg. coverage of GT lines)")
+        cm = sums[:, cm_start:].reshape(b, k + 1, k + 1)
+        tp = cm[:, np.arange(k), np.arange(k)]
+        support = cm[:, :k, :].sum(axis=2)
+        predicted = cm[:, :, :k].sum(axis=1)
+        precision = np.divide(tp, predicted, out=np.zeros(tp.shape), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros(tp.shape), where=support > 0)
+        denom = precision + recall
+        f1 = np.divide(2 * precision * recall, denom, out=np.zeros(tp.shape), where=denom > 0)
+        series["macro_f1"].append(f1.mean(axis=1))
+        done += b
 
-        # Aggregate totals
-        grand_total_rel += stats['total_rel']
-        grand_correct_rel += stats['correct_rel']
-        grand_recall_sum += stats['evidence_recall_sum']
-        grand_recall_count += stats['evidence_count']
+    alpha = (1 - confidence) / 2
+    return {
+        name: tuple(float(x) for x in np.quantile(np.concatenate(values), [alpha, 1 - alpha]))
+        for name, values in series.items()
+    }
 
+# ==========================================
+# REPORT
+# ==========================================
+
+def print_report(data, results, intervals=None, elapsed=None):
+    print("\n" + "="*90)
+    print(f"{'MOVIE':<30} | {'RELATIONSHIP ACCURACY':<25} | {'EVIDENCE RECALL (Line Match)':<25}")
     print("="*90)
-    
-    # Overall
-    if grand_total_rel > 0:
-        overall_rel_acc = (grand_correct_rel / grand_total_rel) * 100
-    else:
-        overall_rel_acc = 0.0
-        
-    if grand_recall_count > 0:
-        overall_recall = (grand_recall_sum / grand_recall_count) * 100
-    else:
-        overall_recall = 0.0
-
-    print(f"{'OVERALL':<30} | {overall_rel_acc:6.2f}%                        | {overall_recall:6.2f}%")
+
+    for i, movie in enumerate(data["movies"]):
+        correct, total = results["movie_correct"][i], results["movie_total"][i]
+        rel_acc = (correct / total) * 100 if total > 0 else 0.0
+        count = results["movie_recall_count"][i]
+        avg_recall = (results["movie_recall_sum"][i] / count) * 100 if count > 0 else 0.0
+        print(f"{movie:<30} | {rel_acc:6.2f}% ({correct}/{total})       | {avg_recall:6.2f}% (Avg. coverage of GT lines)")
+
+    print("="*90)
+    print(f"{'OVERALL':<30} | {results['accuracy'] * 100:6.2f}%                        | {results['evidence_recall'] * 100:6.2f}%")
     print("="*90)
-    print(f"Total Files Processed: {total_files_processed}")
+    print(f"Total Files Processed: {data['files']}")
     print("\n* Evidence Recall explanation: If GT requires lines [1,2,3] and LLM provides [1,5], score is 33% (1/3).")
     print("  Extra lines found by LLM (e.g. line 5) are NOT penalized.")
 
+    # Per-class metrics
+    report = results["classes"]
+    print("\n" + "="*60)
+    print(f"{'CLASS':<15} | {'PRECISION':>9} | {'RECALL':>7} | {'F1':>7} | {'SUPPORT':>7}")
+    print("="*60)
+    for c, name in enumerate(CLASSES):
+        print(f"{name:<15} | {report['precision'][c] * 100:8.2f}% | {report['recall'][c] * 100:6.2f}% | "
+              f"{report['f1'][c] * 100:6.2f}% | {report['support'][c]:>7}")
+    print("="*60)
+    print(f"{'MACRO F1':<15} | {results['macro_f1'] * 100:6.2f}%")
+
+    # Confusion matrix (rows = GT, columns = prediction)
+    print("\nCONFUSION MATRIX (rows = GT, columns = LLM)")
+    header = "".join(f"{name[:12]:>14}" for name in CLASSES)
+    print(f"{'':<15}{header}")
+    for c, name in enumerate(CLASSES):
+        print(f"{name:<15}" + "".join(f"{v:>14}" for v in results["confusion"][c]))
+
+    # Evidence
+    print("\nEVIDENCE (line indices)")
+    print(f"  Recall    {results['evidence_recall'] * 100:6.2f}%   (interactions where GT cites lines)")
+    print(f"  Precision {results['evidence_precision'] * 100:6.2f}%   (interactions where the LLM cites lines)")
+    print(f"  Jaccard   {results['evidence_jaccard'] * 100:6.2f}%   (interactions where either cites lines)")
+
+    # Label stability within a pair
+    print("\nLABEL STABILITY (consecutive interactions of the same pair)")
+    print(f"  GT changes label  {results['gt_switch_rate'] * 100:6.2f}%")
+    print(f"  LLM changes label {results['pred_switch_rate'] * 100:6.2f}%")
+
+    if intervals:
+        pct = int(CONFIDENCE * 100)
+        print(f"\n{pct}% BOOTSTRAP CONFIDENCE INTERVALS ({BOOTSTRAP_SAMPLES} resamples over {results['n']} interactions)")
+        for name, (low, high) in intervals.items():
+            print(f"  {name:<20} [{low * 100:6.2f}%, {high * 100:6.2f}%]")
+    if elapsed is not None:
+        print(f"\nScoring + bootstrap time: {elapsed:.3f}s")
+
+# ==========================================
+# MAIN EVALUATION LOGIC
+# ==========================================
+
+def main():
+    # 1. Load every prediction / GT pair once
+    data = load_scoring_data()
+
+    # 2. Score and bootstrap
+    start = time.perf_counter()
+    results = score(data)
+    intervals = bootstrap(data)
+    elapsed = time.perf_counter() - start
+
+    # 3. Print
+    print_report(data, results, intervals, elapsed)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,16 @@
 import os
+import re
 import json
-import requests
+import time
+import heapq
+import collections
+
+import corpus
+import dialogue_store
+import ollama_client
+import llm_schema
+import telemetry
+from llm_cache import ResponseCache, make_key
 
 # ==========================================
 # CONFIGURATION
@@ -13,50 +23,179 @@ TARGET_MOVIE_FOLDER = "a-different-man"
 # Path to the root folder
 ROOT_DIR = "dialogue_interactions"
 
+# Incremental runs: only re-profile pairs whose file content or run_signature()
+# (model, options, prompts, modes) changed since their llm-agesex_ output
+SKIP_UP_TO_DATE = False
+
 # Ollama Configuration
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = ollama_client.OLLAMA_URL
 MODEL_NAME = "llama3"  # Knowledge cutoff < 2024
 
+# Several Ollama servers (e.g. one per NUMA node) can share the work: list
+# their generate URLs here. None means just OLLAMA_URL. See ollama_client.BackendPool.
+OLLAMA_URLS = None
+
+# Any llm_backends.Backend (e.g. MockBackend, ReplayBackend) used instead of
+# the Ollama endpoints; None talks to OLLAMA_URLS.
+BACKEND = None
+
+# Fixed sampling seed: a pair gets the same answer whichever endpoint serves it
+SEED = 42
+
+# Read pair files from the memory-mapped columnar store (dialogue_store.py)
+# when it was built from the current version of the file. Off by default: the
+# evaluators need each line as a dict, and rebuilding those from the columns
+# is ~3x slower than json.load of the pair file (0.095s vs 0.030s over the
+# corpus). The store pays off for column-wise readers such as the scorer.
+USE_DIALOGUE_STORE = False
+STORE = dialogue_store.open_store() if USE_DIALOGUE_STORE else None
+
+# Response cache keyed by (model, options, prompt). Re-runs only pay for
+# prompts that changed. CACHE_BYPASS forces fresh calls but still refreshes
+# the stored responses.
+USE_CACHE = True
+CACHE_BYPASS = False
+CACHE = ResponseCache(bypass=CACHE_BYPASS) if USE_CACHE else None
+
+# Per-call telemetry (Ollama timings, latency, parse time) appended to
+# traces/agesex_<time>.jsonl and summarized at the end of the run
+USE_TELEMETRY = True
+TRACE = telemetry.Tracer("agesex") if USE_TELEMETRY else None
+
 # Valid Categories
 AGE_CLASSES = ["Toddler", "Child", "Adolescent", "Young Adult", "Adult", "Senior"]
 SEX_CLASSES = ["Male", "Female"]
 
-# Context Safety (Characters)
-# Llama2 has a 4k token limit. ~12-14k chars is a safe upper bound.
-MAX_CONTEXT_CHARS = 12000 
+# Structured outputs: send a JSON Schema with enum-restricted age and sex as
+# Ollama's "format" and validate every answer against it. Invalid fields are
+# re-asked on their own instead of dropping the pair file.
+USE_SCHEMA_FORMAT = True
+SCHEMA_REASK_ROUNDS = 2
+SCHEMA_STATS = llm_schema.SchemaStats()
+
+# Send the fixed instructions as Ollama's "system" field and only the
+# transcript as the prompt, so the evaluated prefix is reused across calls.
+# The model is preloaded and kept resident (ollama_client.KEEP_ALIVE).
+USE_SYSTEM_PREFIX = True
+
+# Context Safety (Tokens)
+# num_ctx is 4096; the instruction block and the answer need roughly 500 of
+# those, so the packed transcript may use the rest.
+CONTEXT_TOKEN_BUDGET = 3400
+
+# When a pair does not fit the budget, split it into several prompts of
+# consecutive interactions and merge the per-person votes instead of dropping
+# the lowest-scoring lines.
+SPLIT_LONG_PAIRS = False
+MAX_PROMPTS_PER_PAIR = 4
+
+# Character mode: profile each character once per movie instead of once per
+# pair file. Every line the character speaks in any of their pair files (and
+# every line spoken to them), deduplicated, is packed into the token budget
+# for a single call; the answer is written to all of their llm-agesex_ files.
+# Calls drop from one per pair to one per character and a character gets the
+# same label in every pair. With SKIP_UP_TO_DATE a movie is redone as a
+# whole when any of its pair files is stale.
+CHARACTER_MODE = False
+
+# Lexical cues that carry age or sex information. When the transcript has to be
+# shortened, lines are ranked by their weighted number of cues divided by the
+# square root of their token count (see line_score).
+AGE_CUES = [
+    "old", "young", "age", "years", "birthday", "born", "kid", "kids", "baby", "child",
+    "teen", "teenager", "school", "class", "college", "university", "grade", "homework",
+    "retire", "retired", "retirement", "pension", "grandkids", "job", "career", "boss",
+    "married", "wedding", "divorce", "prom", "toddler", "diaper", "wrinkles", "gray",
+]
+SEX_CUES = [
+    "he", "she", "him", "her", "his", "hers", "himself", "herself", "man", "woman", "men",
+    "women", "guy", "girl", "boy", "lady", "gentleman", "sir", "ma'am", "madam", "mr",
+    "mrs", "miss", "ms", "dude", "bro", "gal", "pregnant", "beard",
+]
+KINSHIP_CUES = [
+    "mom", "mother", "mommy", "mum", "dad", "father", "daddy", "papa", "son", "daughter",
+    "brother", "sister", "husband", "wife", "boyfriend", "girlfriend", "grandma",
+    "grandpa", "grandmother", "grandfather", "aunt", "uncle", "niece", "nephew",
+]
+CUE_WEIGHTS = {**{w: 1.0 for w in SEX_CUES}, **{w: 2.0 for w in AGE_CUES}, **{w: 2.0 for w in KINSHIP_CUES}}
+CUE_PATTERN = re.compile(r"\b(" + "|".join(re.escape(w) for w in CUE_WEIGHTS) + r")\b", re.IGNORECASE)
+# Numbers like "I'm 17" or "42 years" are strong age evidence
+AGE_NUMBER_PATTERN = re.compile(r"\b([1-9][0-9]?)\b")
+
+INTERACTION_SEPARATOR = "--- [New Interaction] ---"
+OMISSION_MARKER = "..."
 
 # ==========================================
 # OLLAMA INTERACTION
 # ==========================================
 
-def query_ollama(prompt, model=MODEL_NAME):
+def build_payload(prompt, model=MODEL_NAME, fmt="json", system=None, split=None, options=None):
+    """
+    Generate payload. With split=True the static instructions (SYSTEM_PROMPT
+    unless system is given) go into the "system" field; otherwise one prompt
+    in the original order. split=None follows USE_SYSTEM_PREFIX at call time.
+    options override the default sampling options.
+    """
+    if split is None:
+        split = USE_SYSTEM_PREFIX
     payload = {
         "model": model,
-        "prompt": prompt,
-        "format": "json", 
-        "stream": False,
+        "format": fmt,
         "options": {
             "temperature": 0.1, 
-            "num_ctx": 4096
-        }
+            "num_ctx": 4096,
+            "seed": SEED
+        },
+        "keep_alive": ollama_client.KEEP_ALIVE,
     }
-    try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()
-        return response.json().get("response", "")
-    except requests.exceptions.RequestException as e:
-        print(f"Error communicating with Ollama: {e}")
+    if options:
+        payload["options"].update(options)
+    if split:
+        payload["system"] = SYSTEM_PROMPT if system is None else system
+        payload["prompt"] = prompt
+    elif system is None:
+        payload["prompt"] = TASK_PROMPT + prompt + FORMAT_PROMPT
+    else:
+        payload["prompt"] = f"{system}\n{prompt}"
+    return payload
+
+def backends():
+    """BACKEND if set, else the pooled endpoints with least-outstanding dispatch and failover."""
+    if BACKEND is not None:
+        return BACKEND
+    return ollama_client.get_pool(OLLAMA_URLS or [OLLAMA_URL])
+
+def query_ollama(prompt, model=MODEL_NAME, fmt="json", system=None):
+    payload = build_payload(prompt, model, fmt, system=system)
+    cache_key = None
+    if CACHE is not None:
+        cache_key = make_key(model, payload["options"], payload["prompt"], payload["format"], payload.get("system"))
+        cached = CACHE.get(cache_key)
+        if cached is not None:
+            if TRACE is not None:
+                TRACE.call(None, prompt, 0.0, cached=True)
+            return cached
+
+    # Pooled keep-alive session with timeouts and retry/backoff on transient errors
+    start = time.perf_counter()
+    body = backends().generate(payload)
+    if TRACE is not None:
+        TRACE.call(body, prompt, time.perf_counter() - start)
+    if body is None:
         return None
+    text = body.get("response", "")
+    if cache_key is not None and llm_schema.is_cacheable(text, fmt):
+        CACHE.put(cache_key, text, model)
+    return text
 
 # ==========================================
 # DATA PROCESSING
 # ==========================================
 
-def get_char_mapping_and_text(interactions_list):
+def get_char_mapping(interactions_list):
     """
     1. Identifies the two main characters.
     2. Maps them to 'Person A' and 'Person B'.
-    3. Flattens ALL interactions into one long anonymized script.
     """
     unique_chars = []
     
@@ -84,49 +223,173 @@ def get_char_mapping_and_text(interactions_list):
         char_map[char] = anon
         reverse_map[anon] = char
 
-    # 3. Flatten and Anonymize Text
-    full_transcript = []
-    
-    for interaction in interactions_list:
+    return char_map, reverse_map
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style BPE vocabularies (~4 chars per token)."""
+    return len(text) // 4 + 1
+
+def line_score(text):
+    """
+    Information density of a line: weighted age/sex/kinship cues divided by
+    the square root of its token count. Dividing by the full count would rank
+    a one-word "Mom?" above a long line carrying several cues; the square
+    root still prefers short lines per cue without burying the long ones.
+    """
+    score = sum(CUE_WEIGHTS.get(match.lower(), 0.0) for match in CUE_PATTERN.findall(text))
+    score += 1.5 * len(AGE_NUMBER_PATTERN.findall(text))
+    return score / estimate_tokens(text) ** 0.5
+
+def iter_transcript_lines(interactions_list, char_map):
+    """Yields (interaction_idx, anonymized_line) lazily, one dialogue line at a time."""
+    for interaction_idx, interaction in enumerate(interactions_list):
         for line_obj in interaction:
             real_char = line_obj.get("character", "Unknown")
             anon_char = char_map.get(real_char, "Unknown")
             dialogue = line_obj.get("dialogue", "")
-            full_transcript.append(f"{anon_char}: {dialogue}")
-        full_transcript.append("--- [New Interaction] ---")
+            yield interaction_idx, f"{anon_char}: {dialogue}"
 
-    combined_text = "\n".join(full_transcript)
+def pack_transcript(lines, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Streams (interaction_idx, line) pairs into a fixed token budget.
 
-    # 4. Truncate if too long to fit in context window
-    # Strategy: Keep the beginning (intros) and end (resolutions), cut the middle.
-    if len(combined_text) > MAX_CONTEXT_CHARS:
-        half_limit = int(MAX_CONTEXT_CHARS / 2)
-        combined_text = combined_text[:half_limit] + "\n...[SECTION OMITTED FOR LENGTH]...\n" + combined_text[-half_limit:]
+    Lines are kept in a min-heap by score, so at most a budget's worth of text
+    is held at any time; when the budget overflows the least informative line
+    is evicted (ties drop the later line). The survivors are rendered in their
+    original order with interaction separators and omission markers.
+    """
+    heap = []
+    used = 0
+    for seq, (interaction_idx, text) in enumerate(lines):
+        # +2 covers the newline and any separator the line may need
+        cost = estimate_tokens(text) + 2
+        heapq.heappush(heap, (line_score(text), -seq, seq, interaction_idx, text, cost))
+        used += cost
+        while used > budget and heap:
+            used -= heapq.heappop(heap)[5]
+
+    kept = sorted(heap, key=lambda item: item[2])
+    out = []
+    prev_seq = None
+    prev_interaction = None
+    for _, _, seq, interaction_idx, text, _ in kept:
+        if prev_interaction is not None and interaction_idx != prev_interaction:
+            out.append(INTERACTION_SEPARATOR)
+        elif prev_seq is not None and seq != prev_seq + 1:
+            out.append(OMISSION_MARKER)
+        out.append(text)
+        prev_seq, prev_interaction = seq, interaction_idx
+    return "\n".join(out)
+
+def split_interactions(interactions_list, char_map, budget=CONTEXT_TOKEN_BUDGET):
+    """Groups consecutive interactions into chunks that each fit the token budget."""
+    chunks = []
+    current = []
+    used = 0
+    for interaction in interactions_list:
+        cost = sum(estimate_tokens(text) + 2 for _, text in iter_transcript_lines([interaction], char_map))
+        if current and used + cost > budget:
+            chunks.append(current)
+            current = []
+            used = 0
+        current.append(interaction)
+        used += cost
+    if current:
+        chunks.append(current)
+
+    # Too many chunks: merge neighbours so we never exceed MAX_PROMPTS_PER_PAIR;
+    # pack_transcript then trims each merged chunk back into the budget.
+    while len(chunks) > MAX_PROMPTS_PER_PAIR:
+        merged = []
+        for i in range(0, len(chunks), 2):
+            merged.append(sum(chunks[i:i + 2], []))
+        chunks = merged
+    return chunks
 
-    return combined_text, reverse_map
+def get_char_mapping_and_text(interactions_list):
+    """
+    Maps the pair to Person A/B and packs the anonymized transcript into the
+    token budget. Returns a list of transcripts (one per prompt; more than one
+    only with SPLIT_LONG_PAIRS) and the reverse name map.
+    """
+    char_map, reverse_map = get_char_mapping(interactions_list)
 
-def construct_prompt(anonymized_text):
-    return f"""
-You are an expert character profiler. Read the following dialogue transcript between Person A and Person B. 
+    if SPLIT_LONG_PAIRS:
+        chunks = split_interactions(interactions_list, char_map)
+    else:
+        chunks = [interactions_list]
+
+    texts = [pack_transcript(iter_transcript_lines(chunk, char_map)) for chunk in chunks]
+    return texts, reverse_map
+
+def merge_votes(results):
+    """Majority vote per person and field across several parsed answers (first answer breaks ties)."""
+    if len(results) == 1:
+        return results[0]
+    merged = {}
+    for person in ("Person A", "Person B"):
+        answers = [r.get(person) for r in results if isinstance(r.get(person), dict)]
+        if not answers:
+            continue
+        merged[person] = {}
+        for field in ("age", "sex"):
+            votes = collections.Counter(a.get(field) for a in answers if a.get(field))
+            if votes:
+                best = max(votes.values())
+                merged[person][field] = next(a[field] for a in answers if votes.get(a.get(field)) == best)
+    return merged
+
+TASK_PROMPT = f"""
+You are an expert character profiler. You will be given a dialogue transcript between Person A and Person B.
 Analyze their vocabulary, tone, life stage references, and physical descriptions to determine their Sex and Age Class.
 
 POSSIBLE AGES: {", ".join(AGE_CLASSES)}
 (Definitions: Toddler: 1-3, Child: 4-12, Adolescent: 13-19, Young Adult: 20-35, Adult: 36-65, Senior: 65+)
 
 POSSIBLE SEXES: {", ".join(SEX_CLASSES)}
+"""
+
+FORMAT_PROMPT = """
+OUTPUT FORMAT:
+Provide a JSON object exactly like this:
+{
+  "Person A": { "age": "Adult", "sex": "Male" },
+  "Person B": { "age": "Adolescent", "sex": "Female" }
+}
+Do not add any other text.
+"""
 
+# Static instructions sent as the system prompt
+SYSTEM_PROMPT = TASK_PROMPT + FORMAT_PROMPT
+
+def construct_prompt(anonymized_text):
+    """Builds the variable part of the prompt; the instructions are SYSTEM_PROMPT."""
+    return f"""
 TRANSCRIPT:
 {anonymized_text}
+"""
+
+CHARACTER_TASK_PROMPT = f"""
+You are an expert character profiler. You will be given lines spoken by one character (Person A) across several scenes of a film, and lines other characters say to them (Other).
+Analyze their vocabulary, tone, life stage references, and physical descriptions to determine the Sex and Age Class of Person A.
+
+POSSIBLE AGES: {", ".join(AGE_CLASSES)}
+(Definitions: Toddler: 1-3, Child: 4-12, Adolescent: 13-19, Young Adult: 20-35, Adult: 36-65, Senior: 65+)
+
+POSSIBLE SEXES: {", ".join(SEX_CLASSES)}
+"""
 
+CHARACTER_FORMAT_PROMPT = """
 OUTPUT FORMAT:
 Provide a JSON object exactly like this:
-{{
-  "Person A": {{ "age": "Adult", "sex": "Male" }},
-  "Person B": {{ "age": "Adolescent", "sex": "Female" }}
-}}
+{
+  "Person A": { "age": "Adult", "sex": "Male" }
+}
 Do not add any other text.
 """
 
+CHARACTER_SYSTEM_PROMPT = CHARACTER_TASK_PROMPT + CHARACTER_FORMAT_PROMPT
+
 def clean_llm_json(response_text):
     """Parses LLM response, handling potential markdown wrapping."""
     try:
@@ -141,13 +404,107 @@ def clean_llm_json(response_text):
             pass
     return None
 
+def answer_prompt(prompt, schema=None, validator=None, system=None):
+    """
+    One LLM call plus parsing (and schema validation / repair).
+    Returns (parsed dict or None, raw response or None).
+    """
+    response = query_ollama(prompt, fmt=schema or "json", system=system)
+    if not response:
+        print("  No response from LLM.")
+        return None, None
+
+    start = time.perf_counter()
+    result = clean_llm_json(response)
+    if TRACE is not None:
+        TRACE.parsed(time.perf_counter() - start, isinstance(result, dict))
+    if schema is not None:
+        result = llm_schema.validate_and_repair(
+            result, response, schema, validator, prompt,
+            ask=lambda reask, fmt: query_ollama(reask, fmt=fmt, system=system),
+            stats=SCHEMA_STATS, limit=SCHEMA_REASK_ROUNDS,
+        )
+    return (result if isinstance(result, dict) else None), response
+
+def prediction_rows(reverse_map, result):
+    """The per-person answer in the llm-agesex_ layout with real names."""
+    final_output = []
+    
+    # We need to map the keys "Person A" back to real names and structure as requested
+    # Requested Structure: [{ "char1": Name, "age": X, "sex": Y}, { "char2": Name ...}]
+    
+    # Handle Person A
+    if "Person A" in reverse_map:
+        data_a = result.get("Person A", {"age": "Unknown", "sex": "Unknown"})
+        final_output.append({
+            "char1": reverse_map["Person A"],
+            "age": data_a.get("age", "Unknown"),
+            "sex": data_a.get("sex", "Unknown")
+        })
+        
+    # Handle Person B
+    if "Person B" in reverse_map:
+        data_b = result.get("Person B", {"age": "Unknown", "sex": "Unknown"})
+        # Note: Using "char2" key for the second entry as per requested structure pattern
+        final_output.append({
+            "char2": reverse_map["Person B"],
+            "age": data_b.get("age", "Unknown"),
+            "sex": data_b.get("sex", "Unknown")
+        })
+    return final_output
+
+def run_signature():
+    """Hash of the configuration the age/sex answers depend on."""
+    return corpus.run_signature(
+        model=MODEL_NAME,
+        options=build_payload("")["options"],
+        system_prefix=USE_SYSTEM_PREFIX,
+        schema_format=USE_SCHEMA_FORMAT,
+        prompts=[SYSTEM_PROMPT, CHARACTER_SYSTEM_PROMPT],
+        labels=[AGE_CLASSES, SEX_CLASSES],
+        packing=[CONTEXT_TOKEN_BUDGET, SPLIT_LONG_PAIRS, MAX_PROMPTS_PER_PAIR,
+                 AGE_CUES, SEX_CUES, KINSHIP_CUES, CUE_WEIGHTS],
+        character_mode=CHARACTER_MODE,
+    )
+
+def write_prediction(output_path, reverse_map, result, pair_path):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(prediction_rows(reverse_map, result), f, indent=2)
+    corpus.write_signature(output_path, pair_path, run_signature())
+    print(f"  Saved: {output_path}")
+
+def profile_pair(interactions_list):
+    """
+    Age / sex of both characters of a pair file. Returns (reverse_map,
+    merged answer or None, last raw response or None).
+    """
+    # 1. Prepare Data
+    anonymized_texts, reverse_map = get_char_mapping_and_text(interactions_list)
+    
+    # 2. Query LLM (one prompt per chunk when long pairs are split)
+    schema = None
+    if USE_SCHEMA_FORMAT:
+        persons = [p for p in ("Person A", "Person B") if p in reverse_map]
+        schema = llm_schema.agesex_schema(persons, AGE_CLASSES, SEX_CLASSES)
+        validator = llm_schema.compile_validator(schema)
+    else:
+        validator = None
+    parsed = []
+    response = None
+    for anonymized_text in anonymized_texts:
+        # 3. Parse Result (and validate / repair against the schema)
+        result, answer = answer_prompt(construct_prompt(anonymized_text), schema, validator)
+        response = answer
+        if result is not None:
+            parsed.append(result)
+    return reverse_map, (merge_votes(parsed) if parsed else None), response
+
 def process_file(file_path, output_folder):
     filename = os.path.basename(file_path)
     print(f"Processing: {filename}...")
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            interactions_list = json.load(f)
+        interactions_list = dialogue_store.load_pair_file(file_path, STORE)
     except Exception as e:
         print(f"Failed to load {filename}: {e}")
         return
@@ -156,56 +513,104 @@ def process_file(file_path, output_folder):
         print("  Empty file. Skipping.")
         return
 
-    # 1. Prepare Data
-    anonymized_text, reverse_map = get_char_mapping_and_text(interactions_list)
-    
-    # 2. Query LLM
-    prompt = construct_prompt(anonymized_text)
-    response = query_ollama(prompt)
-    
-    if not response:
-        print("  No response from LLM.")
+    reverse_map, result, response = profile_pair(interactions_list)
+    if result is None and response is None:
         return
-
-    # 3. Parse Result
-    result = clean_llm_json(response)
     
     if result:
-        final_output = []
-        
-        # We need to map the keys "Person A" back to real names and structure as requested
-        # Requested Structure: [{ "char1": Name, "age": X, "sex": Y}, { "char2": Name ...}]
-        
-        # Handle Person A
-        if "Person A" in reverse_map:
-            data_a = result.get("Person A", {"age": "Unknown", "sex": "Unknown"})
-            final_output.append({
-                "char1": reverse_map["Person A"],
-                "age": data_a.get("age", "Unknown"),
-                "sex": data_a.get("sex", "Unknown")
-            })
-            
-        # Handle Person B
-        if "Person B" in reverse_map:
-            data_b = result.get("Person B", {"age": "Unknown", "sex": "Unknown"})
-            # Note: Using "char2" key for the second entry as per requested structure pattern
-            final_output.append({
-                "char2": reverse_map["Person B"],
-                "age": data_b.get("age", "Unknown"),
-                "sex": data_b.get("sex", "Unknown")
-            })
-
         # 4. Save
         output_filename = f"llm-agesex_{filename}"
-        output_path = os.path.join(output_folder, output_filename)
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(final_output, f, indent=2)
-        print(f"  Saved: {output_path}")
+        write_prediction(os.path.join(output_folder, output_filename), reverse_map, result, file_path)
         
     else:
         print(f"  Failed to parse JSON response: {response}")
 
+# ==========================================
+# CHARACTER MODE
+# ==========================================
+
+def gather_character_lines(pair_files, characters):
+    """
+    pair_files: [(pair, interactions_list)]. Returns {character: [(interaction_key, line)]}
+    for every character in characters: their own lines as "Person A: ..." and
+    the lines spoken to them as "Other: ...", in pair-file order. A line
+    seen before for the same character (same speaker and text, e.g. a scene
+    shared by two pair files) is kept only once.
+    """
+    lines = collections.defaultdict(list)
+    seen = collections.defaultdict(set)
+    for pair, interactions_list in pair_files:
+        present = [c for c in get_char_mapping(interactions_list)[0] if c in characters]
+        for interaction_idx, interaction in enumerate(interactions_list):
+            for line_obj in interaction:
+                speaker = line_obj.get("character", "Unknown")
+                dialogue = line_obj.get("dialogue", "")
+                for character in present:
+                    if (speaker, dialogue) in seen[character]:
+                        continue
+                    seen[character].add((speaker, dialogue))
+                    label = "Person A" if speaker == character else "Other"
+                    lines[character].append(((pair, interaction_idx), f"{label}: {dialogue}"))
+    return lines
+
+def profile_character(character_lines):
+    """One call for one character over their packed lines. Returns {"age", "sex"} or None."""
+    schema = validator = None
+    if USE_SCHEMA_FORMAT:
+        schema = llm_schema.agesex_schema(["Person A"], AGE_CLASSES, SEX_CLASSES)
+        validator = llm_schema.compile_validator(schema)
+    prompt = construct_prompt(pack_transcript(iter(character_lines)))
+    result, _ = answer_prompt(prompt, schema, validator, system=CHARACTER_SYSTEM_PROMPT)
+    profile = result.get("Person A") if result else None
+    return profile if isinstance(profile, dict) else None
+
+def process_movie(movie, entries, output_folder):
+    """
+    Character mode for one movie (entries: {pair: catalog entry}): profiles
+    every Person A / Person B of its pair files once and fans the answers
+    out to the llm-agesex_ files.
+    Returns (calls, pair files written).
+    """
+    pair_files = []
+    reverse_maps = {}
+    for pair, entry in entries.items():
+        try:
+            interactions_list = dialogue_store.load_pair_file(entry["path"], STORE)
+        except Exception as e:
+            print(f"Failed to load {os.path.basename(entry['path'])}: {e}")
+            continue
+        if interactions_list:
+            pair_files.append((pair, interactions_list))
+            reverse_maps[pair] = get_char_mapping(interactions_list)[1]
+
+    characters = {name for reverse_map in reverse_maps.values()
+                  for anon, name in reverse_map.items() if anon in ("Person A", "Person B")}
+    lines = gather_character_lines(pair_files, characters)
+    print(f"Profiling {len(characters)} characters of {movie} ({len(pair_files)} pair files)...")
+
+    profiles = {}
+    for character in sorted(characters):
+        if TRACE is not None:
+            keys = sorted({key for key, _ in lines[character]})
+            with TRACE.context(movie=movie, file=movie, interactions=[f"{p}:{i}" for p, i in keys]):
+                profiles[character] = profile_character(lines[character])
+        else:
+            profiles[character] = profile_character(lines[character])
+        if profiles[character] is None:
+            print(f"  No usable answer for {character}")
+
+    written = 0
+    for pair, _ in pair_files:
+        reverse_map = reverse_maps[pair]
+        result = {anon: profiles[name] for anon, name in reverse_map.items() if profiles.get(name)}
+        if not result:
+            continue
+        filename = os.path.basename(entries[pair]["path"])
+        write_prediction(os.path.join(output_folder, f"llm-agesex_{filename}"), reverse_map, result,
+                         entries[pair]["path"])
+        written += 1
+    return len(characters), written
+
 # ==========================================
 # MAIN LOOP
 # ==========================================
@@ -215,26 +620,61 @@ def main():
         print(f"Error: Root folder '{ROOT_DIR}' not found.")
         return
 
-    movie_folders = [f for f in os.listdir(ROOT_DIR) if os.path.isdir(os.path.join(ROOT_DIR, f))]
+    # One pass over the tree; unchanged pair files are not re-parsed
+    catalog = corpus.build_catalog(ROOT_DIR, verbose=True)
+    target = None if PROCESS_ALL_MOVIES else TARGET_MOVIE_FOLDER
+
+    # Load the model once up front; every request then extends its keep-alive
+    backends().preload(MODEL_NAME)
+
+    run = run_signature()
+    if CHARACTER_MODE:
+        by_movie = collections.defaultdict(dict)
+        for movie, pair, entry in corpus.iter_pairs(catalog, target):
+            by_movie[movie][pair] = entry
+        calls = files = 0
+        for movie, entries in by_movie.items():
+            if SKIP_UP_TO_DATE and not any(corpus.is_stale(e, "agesex_pred", run) for e in entries.values()):
+                print(f"Skipping {movie} (predictions up to date)")
+                continue
+            eval_folder = os.path.join(catalog["movies"][movie]["path"], corpus.AGESEX_EVAL_FOLDER)
+            os.makedirs(eval_folder, exist_ok=True)
+            movie_calls, movie_files = process_movie(movie, entries, eval_folder)
+            calls += movie_calls
+            files += movie_files
+        print(f"Character mode: {calls} character calls for {files} pair files")
+        pairs = []
+    else:
+        pairs = corpus.iter_pairs(catalog, target)
 
-    for movie in movie_folders:
-        if not PROCESS_ALL_MOVIES and movie != TARGET_MOVIE_FOLDER:
+    for movie, pair, entry in pairs:
+        if SKIP_UP_TO_DATE and not corpus.is_stale(entry, "agesex_pred", run):
+            print(f"Skipping {pair} (prediction up to date)")
             continue
-            
-        movie_path = os.path.join(ROOT_DIR, movie)
-        eval_folder = os.path.join(movie_path, "agesex_eval")
+
+        movie_path = catalog["movies"][movie]["path"]
+        eval_folder = os.path.join(movie_path, corpus.AGESEX_EVAL_FOLDER)
         
         # Create output directory
         os.makedirs(eval_folder, exist_ok=True)
 
-        for file in os.listdir(movie_path):
-            # Only process conversation json files, ignore subfolders and relationship_eval
-            if file.endswith(".json") and "relationship_eval" not in file and "agesex_eval" not in file:
-                
-                # Check naming convention: movie_char1_char2.json
-                if file.startswith(movie):
-                    full_path = os.path.join(movie_path, file)
-                    process_file(full_path, eval_folder)
+        if TRACE is not None:
+            trace_context = {
+                "movie": movie,
+                "file": os.path.basename(entry["path"]),
+                "interactions": list(range(entry["interactions"])),
+            }
+            with TRACE.context(**trace_context):
+                process_file(entry["path"], eval_folder)
+        else:
+            process_file(entry["path"], eval_folder)
+
+    if CACHE is not None:
+        print(CACHE.summary())
+    if USE_SCHEMA_FORMAT:
+        print(SCHEMA_STATS.summary())
+    if TRACE is not None and TRACE.records:
+        telemetry.print_report(TRACE.summary(), TRACE.path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
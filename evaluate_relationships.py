@@ -1,7 +1,21 @@
 import os
 import json
-import requests
 import re
+import time
+import math
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import corpus
+import dialogue_store
+import ollama_client
+import llm_schema
+import telemetry
+import lexical_classifier
+import evidence_index
+import eval_results_relationships
+from llm_cache import ResponseCache, make_key
 
 # ==========================================
 # CONFIGURATION
@@ -15,47 +29,220 @@ TARGET_MOVIE_FOLDER = "hitman"
 ROOT_DIR = "dialogue_interactions"
 
 # Ollama Configuration
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = ollama_client.OLLAMA_URL
+
+# Several Ollama servers (e.g. one per NUMA node) can share the work: list
+# their generate URLs here. None means just OLLAMA_URL. See ollama_client.BackendPool.
+OLLAMA_URLS = None
+
+# Any llm_backends.Backend (e.g. MockBackend, ReplayBackend) used instead of
+# the Ollama endpoints; None talks to OLLAMA_URLS.
+BACKEND = None
 # Llama 2 was released in July 2023, fitting the < 1.1.2024 cutoff requirement.
 # Ensure you have run `ollama pull llama2`
 MODEL_NAME = "llama3" 
 
+# Parallel dispatch: number of interactions in flight against each Ollama
+# endpoint at once. Set to 1 (with a single endpoint) to restore the strictly
+# sequential behaviour. Ollama serves requests concurrently up to
+# OLLAMA_NUM_PARALLEL on the server side, so match that value.
+MAX_CONCURRENT_REQUESTS = 4
+
+# Fixed sampling seed: an interaction gets the same answer whichever endpoint serves it
+SEED = 42
+
+# Seconds to wait for a single generate call before giving up on the interaction
+REQUEST_TIMEOUT = 300
+
+# Read pair files from the memory-mapped columnar store (dialogue_store.py)
+# when it was built from the current version of the file. Off by default: the
+# evaluators need each line as a dict, and rebuilding those from the columns
+# is ~3x slower than json.load of the pair file (0.095s vs 0.030s over the
+# corpus). The store pays off for column-wise readers such as the scorer.
+USE_DIALOGUE_STORE = False
+STORE = dialogue_store.open_store() if USE_DIALOGUE_STORE else None
+
+# Response cache keyed by (model, options, prompt). Re-runs only pay for
+# prompts that changed. CACHE_BYPASS forces fresh calls but still refreshes
+# the stored responses.
+USE_CACHE = True
+CACHE_BYPASS = False
+CACHE = ResponseCache(bypass=CACHE_BYPASS) if USE_CACHE else None
+
+# Per-call telemetry: Ollama's timings and token counts plus our own latency,
+# queue-wait and parse times, appended to traces/relationships_<time>.jsonl and
+# summarized at the end of the run (python telemetry.py <trace> re-prints it).
+USE_TELEMETRY = True
+TRACE = telemetry.Tracer("relationships") if USE_TELEMETRY else None
+
+# Checkpointing: every finished interaction is appended to a JSONL journal
+# (relationship_eval/llm-relationship_<pair>.jsonl) and skipped on restart.
+# The journal is compacted into the final JSON and removed once the file is done.
+# Journals and outputs carry the run_signature() of the configuration that
+# made them (model, options, prompts, modes); a finished file is only skipped
+# when that signature and its pair-file content are unchanged, and a journal
+# from a differently configured run is discarded.
+RESUME_RUNS = True
+
+# Batching: pack consecutive interactions of a pair file into one prompt as
+# long as the estimated prompt plus expected answer fits the context window.
+# Interactions missing or unparsable in the batched answer are re-asked alone.
+BATCH_INTERACTIONS = False
+NUM_CTX = 4096
+BATCH_MAX_INTERACTIONS = 8
+BATCH_OUTPUT_TOKENS_PER_INTERACTION = 150
+
 # Valid relationship categories
 RELATIONSHIPS = ["Romantic", "Platonic", "Professional", "Antagonistic", "Familial"]
+EVIDENCE_TYPES = ["Explicit", "Implied"]
+
+# Send the fixed instructions as Ollama's "system" field and only the dialogue
+# as the prompt. Every call then starts with the same tokens, so the server can
+# reuse the evaluated prefix from its KV cache instead of re-reading it.
+# The model is preloaded and kept resident (ollama_client.KEEP_ALIVE).
+USE_SYSTEM_PREFIX = True
+
+# Structured outputs: send a JSON Schema (enum-restricted relationship and
+# evidence type, integer line_indices) as Ollama's "format" instead of plain
+# "json", and validate every answer against it. Invalid fields are re-asked on
+# their own, up to SCHEMA_REASK_ROUNDS times, instead of discarding the answer.
+USE_SCHEMA_FORMAT = True
+SCHEMA_REASK_ROUNDS = 2
+SCHEMA_STATS = llm_schema.SchemaStats()
+
+# Lexical cascade: a classifier over address terms ("Mom, ...", "..., sir.")
+# trained on the relationships/ GT answers the interactions it is confident
+# about (marked "source": "lexical") and only the rest go to the LLM. With
+# CASCADE_HOLDOUT each movie is answered by a model trained without its own
+# GT. `python lexical_classifier.py` reports calls avoided vs. accuracy cost.
+# Off by default: answers then differ from a pure LLM run, so it is opt-in.
+USE_CASCADE = False
+CASCADE_THRESHOLD = lexical_classifier.THRESHOLD
+CASCADE_HOLDOUT = True
+CASCADE_MODELS = {}
+CASCADE_LOCK = threading.Lock()
+CASCADE_STATS = lexical_classifier.CascadeStats()
+
+# Pair context: the interactions of a pair are evaluated in order and each
+# prompt carries a compact running summary of the pair (current label, how
+# long it has held, its latest PAIR_SUMMARY_LINES evidence lines). Once a
+# label has held for PAIR_STABLE_RUN interactions the model is only asked
+# whether it still holds, a short {"changed", "line_indices"} answer; a
+# "changed" (or unusable) answer is re-asked in full with the summary.
+# A pair runs serially, so whole pair files are spread over the workers.
+# Takes precedence over BATCH_INTERACTIONS.
+PAIR_CONTEXT = False
+PAIR_STABLE_RUN = 2
+PAIR_SUMMARY_LINES = 3
+PAIR_SUMMARY_LINE_CHARS = 160
+
+# Evidence-candidate index: interactions longer than
+# evidence_index.LONG_INTERACTION_LINES are sent as their best BM25-ranked
+# lines only (cue words learned from the GT evidence), keeping each line's
+# original [index] and marking skipped lines with "[...]".
+# `python evidence_index.py` reports the prompt reduction and recall cost.
+USE_EVIDENCE_INDEX = False
+EVIDENCE_CUES = evidence_index.load_or_learn(verbose=False) if USE_EVIDENCE_INDEX else None
+
+# Self-consistency voting: interactions that reach the LLM are sampled one
+# call after another until the leading label is VOTE_MARGIN votes ahead of
+# the runner-up (or VOTE_MAX_SAMPLES were drawn), so agreeing interactions
+# stop early and only contested ones pay for more. The samples run inside the
+# interaction's worker, so MAX_CONCURRENT_REQUESTS still bounds the calls in
+# flight; the parallelism comes from several interactions voting at once.
+# The first sample is the usual greedy call (cache-compatible with single
+# runs); the others use VOTE_TEMPERATURE and their own seeds. Evidence lines
+# cited by at least VOTE_EVIDENCE_SHARE of the agreeing samples are kept.
+# The greedy answer is stored as "single" so the gain can be scored after
+# the run. Turns batching off; ignored with PAIR_CONTEXT.
+SELF_CONSISTENCY = False
+VOTE_MARGIN = 2
+VOTE_MAX_SAMPLES = 5
+VOTE_TEMPERATURE = 0.7
+VOTE_EVIDENCE_SHARE = 0.5
 
 # ==========================================
 # OLLAMA INTERACTION
 # ==========================================
 
-def query_ollama(prompt, model=MODEL_NAME):
-    """Sends the prompt to Ollama and retrieves the JSON response."""
+def build_payload(prompt, model=MODEL_NAME, fmt="json", system=None, split=None, options=None):
+    """
+    Generate payload for a variable prompt suffix. With split=True the static
+    instructions go into the "system" field; otherwise everything is sent as
+    one prompt in the original task / dialogue / output-format order.
+    split=None follows USE_SYSTEM_PREFIX at call time. options override the
+    default sampling options (sweep variants).
+    """
+    if split is None:
+        split = USE_SYSTEM_PREFIX
     payload = {
         "model": model,
-        "prompt": prompt,
-        "format": "json",  # Enforce JSON mode (supported in newer Ollama versions)
-        "stream": False,
+        "format": fmt,  # "json" mode, or a JSON Schema for structured outputs (Ollama >= 0.5)
         "options": {
             "temperature": 0.1, # Low temperature for deterministic classification
-            "num_ctx": 4096     # Ensure context window is large enough
-        }
+            "num_ctx": NUM_CTX, # Ensure context window is large enough
+            "seed": SEED
+        },
+        "keep_alive": ollama_client.KEEP_ALIVE,
     }
+    if options:
+        payload["options"].update(options)
+    if split:
+        payload["system"] = SYSTEM_PROMPT if system is None else system
+        payload["prompt"] = prompt
+    elif system is None:
+        payload["prompt"] = TASK_PROMPT + prompt + FORMAT_PROMPT
+    else:
+        payload["prompt"] = f"{system}\n{prompt}"
+    return payload
+
+def backends():
+    """BACKEND if set, else the pooled endpoints with least-outstanding dispatch and failover."""
+    if BACKEND is not None:
+        return BACKEND
+    return ollama_client.get_pool(OLLAMA_URLS or [OLLAMA_URL])
+
+def query_ollama(prompt, model=MODEL_NAME, timeout=REQUEST_TIMEOUT, fmt="json", system=None, options=None):
+    """Sends the prompt to Ollama and retrieves the JSON response."""
+    payload = build_payload(prompt, model, fmt, system, options=options)
     
-    try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()
-        return response.json().get("response", "")
-    except requests.exceptions.RequestException as e:
-        print(f"Error communicating with Ollama: {e}")
+    cache_key = None
+    if CACHE is not None:
+        cache_key = make_key(model, payload["options"], payload["prompt"], payload["format"], payload.get("system"))
+        cached = CACHE.get(cache_key)
+        if cached is not None:
+            if TRACE is not None:
+                TRACE.call(None, prompt, 0.0, cached=True)
+            return cached
+
+    # Pooled keep-alive session with timeouts and retry/backoff on transient errors
+    start = time.perf_counter()
+    body = backends().generate(payload, timeout=timeout)
+    if TRACE is not None:
+        TRACE.call(body, prompt, time.perf_counter() - start)
+    if body is None:
         return None
+    text = body.get("response", "")
+    if cache_key is not None and llm_schema.is_cacheable(text, fmt):
+        CACHE.put(cache_key, text, model)
+    return text
 
 # ==========================================
 # DATA PROCESSING
 # ==========================================
 
-def anonymize_interaction(interaction_lines):
+def prompt_lines(interaction_lines):
+    """Line indices to send for a long interaction (evidence candidates), or None for all."""
+    if EVIDENCE_CUES is None:
+        return None
+    return evidence_index.select_lines(interaction_lines, EVIDENCE_CUES)
+
+def anonymize_interaction(interaction_lines, char_map=None, keep=None):
     """
     Replaces real character names with 'Person A' and 'Person B'.
     Returns the anonymized text lines (with indices) and the name mapping.
+    An existing char_map (pair context) is kept and only extended. With keep
+    (sorted line indices) only those lines are rendered, gaps as "[...]".
     """
     # Identify unique characters in order of appearance
     unique_chars = []
@@ -64,52 +251,65 @@ def anonymize_interaction(interaction_lines):
         if char_name not in unique_chars:
             unique_chars.append(char_name)
     
-    # Create mapping (Only expecting 2 characters per file based on description)
-    char_map = {}
-    if len(unique_chars) > 0: char_map[unique_chars[0]] = "Person A"
-    if len(unique_chars) > 1: char_map[unique_chars[1]] = "Person B"
-    
-    # Fallback for unexpected extra characters
-    for i, char in enumerate(unique_chars[2:]):
-        char_map[char] = f"Person {chr(67+i)}" # C, D, etc.
+    # Create mapping (Only expecting 2 characters per file based on description);
+    # unexpected extra characters become Person C, D, etc.
+    char_map = dict(char_map or {})
+    for char in unique_chars:
+        if char not in char_map:
+            char_map[char] = f"Person {chr(65 + len(char_map))}"
 
     anonymized_transcript = []
     
-    for idx, line_obj in enumerate(interaction_lines):
+    indices = range(len(interaction_lines)) if keep is None else keep
+    previous = -1
+    for idx in indices:
+        if idx > previous + 1:
+            anonymized_transcript.append("[...]")
+        previous = idx
+        line_obj = interaction_lines[idx]
         real_char = line_obj.get("character", "Unknown")
         anon_char = char_map.get(real_char, "Unknown")
         dialogue = line_obj.get("dialogue", "")
         
         # Store index and text for the prompt
         anonymized_transcript.append(f"[{idx}] {anon_char}: {dialogue}")
+    if keep is not None and previous < len(interaction_lines) - 1:
+        anonymized_transcript.append("[...]")
 
     return "\n".join(anonymized_transcript), char_map
 
-def construct_prompt(anonymized_text):
-    """Builds the prompt for the LLM."""
-    return f"""
-You are a relationship analyst. Analyze the following dialogue interaction between two characters (Person A and Person B).
+TASK_PROMPT = f"""
+You are a relationship analyst. You will be given a dialogue interaction between two characters (Person A and Person B).
 
 TASK:
 1. Classify the relationship between them into exactly one of these categories: {", ".join(RELATIONSHIPS)}.
 2. Identify specific lines (by their [index]) that act as evidence for this classification.
 3. Determine if the evidence is "Explicit" (directly stated) or "Implied" (subtext).
+"""
 
-INPUT DIALOGUE:
-{anonymized_text}
-
+FORMAT_PROMPT = """
 OUTPUT FORMAT:
 Provide a raw JSON object. Do not explain. Follow this schema exactly:
-{{
+{
     "relationship": "Category",
     "evidence": [
-      {{
+      {
         "line_indices": [0, 2],
         "text": "Full text of lines 0 and 2 combined...",
         "type": "Implied"
-      }}
+      }
     ]
-}}
+}
+"""
+
+# Static instructions sent as the system prompt
+SYSTEM_PROMPT = TASK_PROMPT + FORMAT_PROMPT
+
+def construct_prompt(anonymized_text):
+    """Builds the variable part of the prompt; the instructions are SYSTEM_PROMPT."""
+    return f"""
+INPUT DIALOGUE:
+{anonymized_text}
 """
 
 def clean_llm_json(response_text):
@@ -129,6 +329,28 @@ def clean_llm_json(response_text):
             pass
     return None
 
+def parse_response(response_text):
+    """clean_llm_json, timed against the call that produced the text."""
+    start = time.perf_counter()
+    result = clean_llm_json(response_text)
+    if TRACE is not None:
+        TRACE.parsed(time.perf_counter() - start, result is not None)
+    return result
+
+def answer_schema(interaction):
+    return llm_schema.relationship_schema(RELATIONSHIPS, EVIDENCE_TYPES, len(interaction))
+
+def validated_answer(result, response_text, schema, prompt, system=None, options=None):
+    """
+    Returns the answer once it matches schema (re-asking invalid fields), else None.
+    Re-asks go out with the original call's system prompt and options.
+    """
+    return llm_schema.validate_and_repair(
+        result, response_text, schema, llm_schema.compile_validator(schema), prompt,
+        ask=lambda reask, fmt: query_ollama(reask, fmt=fmt, system=system, options=options),
+        stats=SCHEMA_STATS, limit=SCHEMA_REASK_ROUNDS,
+    )
+
 def reconstruct_evidence_text(evidence_list, interaction_lines, char_map):
     """
     The LLM might hallucinate the text content or use the anonymized version.
@@ -143,7 +365,7 @@ def reconstruct_evidence_text(evidence_list, interaction_lines, char_map):
         indices = item.get("line_indices", [])
         combined_text = []
         for idx in indices:
-            if 0 <= idx < len(interaction_lines):
+            if isinstance(idx, int) and 0 <= idx < len(interaction_lines):
                 line_obj = interaction_lines[idx]
                 real_char = line_obj.get("character", "Unknown")
                 anon_char = char_map.get(real_char, "Unknown")
@@ -154,54 +376,647 @@ def reconstruct_evidence_text(evidence_list, interaction_lines, char_map):
         item["text"] = "\n".join(combined_text)
     return evidence_list
 
-def process_file(file_path, movie_name, output_folder):
+def evaluate_interaction(i, interaction, summary=None, char_map=None, options=None):
+    """
+    Runs the full anonymize -> prompt -> LLM -> parse chain for one interaction.
+    With a pair summary (and its char_map) the pair-context prompt is used;
+    options override the sampling options (vote samples).
+    Returns the result dict, or None if Ollama gave no response.
+    """
+    # 1. Anonymize
+    anonymized_text, char_map = anonymize_interaction(interaction, char_map, prompt_lines(interaction))
+    
+    # 2. Prompt
+    if summary:
+        prompt, system = construct_pair_prompt(summary, anonymized_text), PAIR_SYSTEM_PROMPT
+    else:
+        prompt, system = construct_prompt(anonymized_text), None
+    
+    # 3. Call LLM
+    schema = answer_schema(interaction) if USE_SCHEMA_FORMAT else None
+    response = query_ollama(prompt, fmt=schema or "json", system=system, options=options)
+    if not response:
+        print(f"  Skipping interaction {i} (No response)")
+        return None
+
+    # 4. Parse (and validate / repair against the schema)
+    result = parse_response(response)
+    if schema is not None:
+        result = validated_answer(result, response, schema, prompt, system, options)
+    
+    if result:
+        # 5. Post-process evidence text (ensure it matches indices)
+        if "evidence" in result:
+            result["evidence"] = reconstruct_evidence_text(result["evidence"], interaction, char_map)
+        return result
+
+    print(f"  Failed to parse JSON for interaction {i}")
+    # Fallback empty structure
+    return {"relationship": "Unknown", "evidence": [], "error": "LLM Parse Failure"}
+
+def cascade_model(movie):
+    # Pair files of one movie may be processed by several workers at once
+    with CASCADE_LOCK:
+        if movie not in CASCADE_MODELS:
+            CASCADE_MODELS[movie] = lexical_classifier.load_or_train(
+                exclude=movie if CASCADE_HOLDOUT else None, verbose=False)
+        return CASCADE_MODELS[movie]
+
+def cascade_answers(pending, movie, results, journal=None):
+    """
+    Answers the interactions the lexical classifier is confident about into
+    results (and the journal). Returns the ones still needing the LLM.
+    """
+    model = cascade_model(movie)
+    remaining = []
+    for i, interaction in pending:
+        result = lexical_classifier.cascade_result(model, interaction, CASCADE_THRESHOLD)
+        if result is None:
+            remaining.append((i, interaction))
+            continue
+        _, char_map = anonymize_interaction(interaction)
+        result["evidence"] = reconstruct_evidence_text(result["evidence"], interaction, char_map)
+        results[i] = result
+        if journal is not None:
+            journal.append(i, result)
+    answered = len(pending) - len(remaining)
+    CASCADE_STATS.add(answered=answered, routed=len(remaining))
+    if answered:
+        print(f"  Lexical cascade answered {answered}/{len(pending)} interactions")
+    return remaining
+
+# ==========================================
+# BATCHING
+# ==========================================
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style BPE vocabularies (~4 chars per token)."""
+    return len(text) // 4 + 1
+
+BATCH_SYSTEM_PROMPT = f"""
+You are a relationship analyst. You will be given several separate dialogue interactions, each headed by "=== INTERACTION <number> ===". Each one is between two characters (Person A and Person B); the labels are assigned per interaction.
+
+TASK (for EACH interaction independently):
+1. Classify the relationship between them into exactly one of these categories: {", ".join(RELATIONSHIPS)}.
+2. Identify specific lines (by their [index] within that interaction) that act as evidence for this classification.
+3. Determine if the evidence is "Explicit" (directly stated) or "Implied" (subtext).
+
+OUTPUT FORMAT:
+Provide a raw JSON object with one key per interaction number. Do not explain. Follow this schema exactly:
+{{
+    "<number>": {{
+        "relationship": "Category",
+        "evidence": [
+          {{ "line_indices": [0, 2], "text": "Full text of lines 0 and 2 combined...", "type": "Implied" }}
+        ]
+    }}
+}}
+"""
+
+def construct_batch_prompt(blocks):
+    """
+    Builds the variable part of a prompt covering several interactions (the
+    instructions are BATCH_SYSTEM_PROMPT). blocks is a list of
+    (interaction_id, anonymized_text); line indices restart at [0] inside each
+    interaction and the answer is keyed by interaction id.
+    """
+    sections = []
+    for i, anonymized_text in blocks:
+        sections.append(f"=== INTERACTION {i} ===\n{anonymized_text}")
+    return f"""
+INPUT DIALOGUES ({len(blocks)}):
+{chr(10).join(sections)}
+
+Answer with exactly these keys: {", ".join(str(i) for i, _ in blocks)}.
+"""
+
+def plan_batches(pending):
+    """
+    Greedily groups consecutive (i, interaction) pairs so that each batch
+    prompt plus its expected answers stays within NUM_CTX.
+    """
+    prompt_overhead = estimate_tokens(BATCH_SYSTEM_PROMPT) + estimate_tokens(construct_batch_prompt([]))
+    batches = []
+    current = []
+    used = prompt_overhead
+    for i, interaction in pending:
+        text, _ = anonymize_interaction(interaction, keep=prompt_lines(interaction))
+        cost = estimate_tokens(text) + 10 + BATCH_OUTPUT_TOKENS_PER_INTERACTION
+        if current and (used + cost > NUM_CTX or len(current) >= BATCH_MAX_INTERACTIONS):
+            batches.append(current)
+            current = []
+            used = prompt_overhead
+        current.append((i, interaction))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def evaluate_batch(batch):
+    """
+    Classifies a batch with one LLM call and splits the keyed answer back into
+    per-interaction results. Anything missing or malformed falls back to a
+    single-interaction prompt.
+    """
+    if len(batch) == 1:
+        i, interaction = batch[0]
+        if SELF_CONSISTENCY:
+            return {i: evaluate_by_vote(i, interaction)}
+        return {i: evaluate_interaction(i, interaction)}
+
+    blocks = []
+    char_maps = {}
+    item_schemas = {}
+    for i, interaction in batch:
+        anonymized_text, char_map = anonymize_interaction(interaction, keep=prompt_lines(interaction))
+        blocks.append((i, anonymized_text))
+        char_maps[i] = char_map
+        item_schemas[str(i)] = answer_schema(interaction)
+
+    fmt = llm_schema.keyed_schema(item_schemas) if USE_SCHEMA_FORMAT else "json"
+    response = query_ollama(construct_batch_prompt(blocks), fmt=fmt, system=BATCH_SYSTEM_PROMPT)
+    parsed = parse_response(response) if response else None
+    if not isinstance(parsed, dict):
+        parsed = {}
+
+    results = {}
+    for i, interaction in batch:
+        result = parsed.get(str(i))
+        if USE_SCHEMA_FORMAT:
+            valid = not llm_schema.compile_validator(item_schemas[str(i)])(result)
+            SCHEMA_STATS.add(answers=1, invalid_schema=0 if valid else 1)
+        else:
+            valid = isinstance(result, dict) and isinstance(result.get("relationship"), str)
+        if valid:
+            evidence = result.get("evidence", [])
+            if not isinstance(evidence, list):
+                evidence = []
+            result["evidence"] = reconstruct_evidence_text(
+                [item for item in evidence if isinstance(item, dict)], interaction, char_maps[i])
+            results[i] = result
+        else:
+            print(f"  Interaction {i} missing from batch answer, retrying alone")
+            results[i] = evaluate_interaction(i, interaction)
+    return results
+
+# ==========================================
+# SELF-CONSISTENCY VOTING
+# ==========================================
+
+class VoteStats(telemetry.Counters):
+    """Thread-safe counters of the samples spent per voted interaction."""
+
+    FIELDS = ("interactions", "samples", "contested", "undecided", "overturned")
+
+    def summary(self):
+        average = self.samples / self.interactions if self.interactions else 0.0
+        return (f"Voting: {self.interactions} interactions, {self.samples} samples "
+                f"({average:.2f} per interaction), {self.contested} needed more than {VOTE_MARGIN}, "
+                f"{self.undecided} stopped at {VOTE_MAX_SAMPLES} without a {VOTE_MARGIN}-vote margin, "
+                f"{self.overturned} overturned the greedy answer")
+
+VOTE_STATS = VoteStats()
+
+def vote_margin(votes):
+    counts = sorted(votes.values(), reverse=True) + [0, 0]
+    return counts[0] - counts[1]
+
+def sample_interaction(i, interaction, k):
+    """Sample k of an interaction: k = 0 is the greedy call, later ones are sampled with their own seed."""
+    if k == 0:
+        return evaluate_interaction(i, interaction)
+    return evaluate_interaction(i, interaction, options={"temperature": VOTE_TEMPERATURE, "seed": SEED + k})
+
+def is_vote(result):
+    return (isinstance(result, dict) and "error" not in result
+            and isinstance(result.get("relationship"), str))
+
+def merge_evidence(samples, interaction, share=VOTE_EVIDENCE_SHARE):
+    """
+    Evidence of the agreeing samples: line indices cited by at least share
+    of them, grouped by their most frequent evidence type.
+    """
+    need = max(1, math.ceil(share * len(samples)))
+    cited = collections.Counter()
+    types = collections.defaultdict(collections.Counter)
+    for sample in samples:
+        lines = {}
+        for item in sample.get("evidence", []):
+            if not isinstance(item, dict):
+                continue
+            for idx in item.get("line_indices", []):
+                if isinstance(idx, int) and 0 <= idx < len(interaction):
+                    lines[idx] = item.get("type") or EVIDENCE_TYPES[-1]
+        for idx, evidence_type in lines.items():
+            cited[idx] += 1
+            types[idx][evidence_type] += 1
+
+    grouped = {}
+    for idx in sorted(idx for idx, count in cited.items() if count >= need):
+        grouped.setdefault(types[idx].most_common(1)[0][0], []).append(idx)
+    evidence = [{"line_indices": lines, "type": evidence_type} for evidence_type, lines in grouped.items()]
+    _, char_map = anonymize_interaction(interaction)
+    return reconstruct_evidence_text(evidence, interaction, char_map)
+
+def evaluate_by_vote(i, interaction):
+    """
+    Draws samples one at a time until one label leads by VOTE_MARGIN votes.
+    Returns the winning label with the merged evidence, its votes, the sample
+    count and the greedy answer ("single").
+    """
+    samples = []
+    votes = collections.Counter()
+    while len(samples) < VOTE_MAX_SAMPLES:
+        if votes and vote_margin(votes) >= VOTE_MARGIN:
+            break
+        result = sample_interaction(i, interaction, len(samples))
+        samples.append(result)
+        if is_vote(result):
+            votes[result["relationship"]] += 1
+
+    single = samples[0]
+    if not votes:
+        VOTE_STATS.add(interactions=1, samples=len(samples), undecided=1)
+        return single
+
+    # Ties go to the label sampled first (the greedy answer if it voted)
+    best = max(votes.values())
+    winner = next(r["relationship"] for r in samples if is_vote(r) and votes[r["relationship"]] == best)
+    agreeing = [r for r in samples if is_vote(r) and r["relationship"] == winner]
+    VOTE_STATS.add(
+        interactions=1, samples=len(samples),
+        contested=int(len(samples) > VOTE_MARGIN),
+        undecided=int(vote_margin(votes) < VOTE_MARGIN),
+        overturned=int(is_vote(single) and single["relationship"] != winner),
+    )
+    result = {
+        "relationship": winner,
+        "evidence": merge_evidence(agreeing, interaction),
+        "votes": dict(votes),
+        "samples": len(samples),
+    }
+    if single is not None:
+        result["single"] = {key: single[key] for key in ("relationship", "evidence", "error") if key in single}
+    return result
+
+def vote_report(catalog):
+    """
+    Scores the relationship_eval outputs as written (voted) and with every
+    voted interaction replaced by its greedy answer, i.e. the single-sample run.
+    """
+    voted = lexical_classifier.load_llm_predictions(catalog)
+    single = {}
+    samples = interactions = 0
+    for pair, data in voted.items():
+        single[pair] = {}
+        for key, result in data.items():
+            if isinstance(result, dict) and "single" in result:
+                single[pair][key] = result["single"]
+                samples += result.get("samples", 1)
+                interactions += 1
+            else:
+                single[pair][key] = result
+
+    def scored(predictions):
+        return eval_results_relationships.score(
+            eval_results_relationships.load_scoring_data(catalog, predictions=predictions, verbose=False))
+    before, after = scored(single), scored(voted)
+
+    print("\n" + "="*58)
+    print(f"{'SELF-CONSISTENCY':<22} | {'SINGLE':>9} | {'VOTED':>9} | {'GAIN':>8}")
+    print("="*58)
+    for metric in ("accuracy", "macro_f1", "evidence_recall", "evidence_precision"):
+        print(f"{metric:<22} | {before[metric] * 100:8.2f}% | {after[metric] * 100:8.2f}% | "
+              f"{(after[metric] - before[metric]) * 100:+7.2f}")
+    print("="*58)
+    average = samples / interactions if interactions else 0.0
+    print(f"{interactions} voted interactions, {average:.2f} samples each "
+          f"(~{average:.2f}x the LLM tokens of a single-sample run for them)")
+
+# ==========================================
+# PAIR CONTEXT
+# ==========================================
+
+PAIR_PROMPT = """
+CONTEXT:
+You are also given a summary of the earlier interactions between the same two characters.
+A relationship rarely changes between interactions: keep the current relationship unless the new dialogue clearly shows a different one.
+Line indices refer to the new dialogue only.
+"""
+
+PAIR_SYSTEM_PROMPT = TASK_PROMPT + PAIR_PROMPT + FORMAT_PROMPT
+
+CONFIRM_SYSTEM_PROMPT = """
+You are a relationship analyst. You will be given a summary of the earlier interactions between two characters (Person A and Person B), including the relationship established so far, and one new dialogue interaction between them.
+
+TASK:
+1. Decide whether the new dialogue clearly shows that their relationship is no longer the current one ("changed": true). Relationships rarely change.
+2. Identify the lines (by their [index]) of the new dialogue that best show their relationship.
+
+OUTPUT FORMAT:
+Provide a raw JSON object. Do not explain. Follow this schema exactly:
+{"changed": false, "line_indices": [0, 2]}
+"""
+
+def construct_pair_prompt(summary, anonymized_text):
+    return f"""
+PAIR SO FAR:
+{summary}
+
+NEW DIALOGUE:
+{anonymized_text}
+"""
+
+class PairSummary:
+    """Running summary of a pair: current label, how long it has held and its latest evidence."""
+
+    def __init__(self):
+        self.label = None
+        self.run = 0
+        self.seen = 0
+        self.char_map = {}
+        self.evidence = []
+
+    def observe(self, result, interaction):
+        label = result.get("relationship")
+        if label == self.label:
+            self.run += 1
+        else:
+            self.label, self.run, self.evidence = label, 1, []
+        self.seen += 1
+        _, self.char_map = anonymize_interaction(interaction, self.char_map)
+        for item in result.get("evidence", []):
+            for idx in item.get("line_indices", []):
+                if isinstance(idx, int) and 0 <= idx < len(interaction):
+                    line_obj = interaction[idx]
+                    anon_char = self.char_map.get(line_obj.get("character", "Unknown"), "Unknown")
+                    dialogue = line_obj.get("dialogue", "")[:PAIR_SUMMARY_LINE_CHARS]
+                    self.evidence.append(f"{anon_char}: {dialogue}")
+        self.evidence = self.evidence[-PAIR_SUMMARY_LINES:]
+
+    def describe(self):
+        if self.label is None:
+            return ""
+        evidence = "\n".join(self.evidence) or "(none)"
+        return (f"Earlier interactions: {self.seen}\n"
+                f"Current relationship: {self.label} (held for the last {self.run})\n"
+                f"Key evidence:\n{evidence}")
+
+class PairContextStats(telemetry.Counters):
+    """Thread-safe counters of how pair-context interactions were answered."""
+
+    FIELDS = ("confirmed", "changed", "full")
+
+    def summary(self):
+        return (f"Pair context: {self.confirmed} interactions kept their label with a short answer, "
+                f"{self.changed} changed (re-asked in full), {self.full} full prompts in total")
+
+PAIR_STATS = PairContextStats()
+
+def confirm_interaction(i, interaction, state):
+    """
+    Asks whether the pair's current label still holds. Returns the carried
+    result, or None when it changed or the answer was unusable.
+    """
+    anonymized_text, char_map = anonymize_interaction(interaction, state.char_map, prompt_lines(interaction))
+    prompt = construct_pair_prompt(state.describe(), anonymized_text)
+    schema = llm_schema.confirmation_schema(len(interaction)) if USE_SCHEMA_FORMAT else None
+    response = query_ollama(prompt, fmt=schema or "json", system=CONFIRM_SYSTEM_PROMPT)
+    answer = parse_response(response) if response else None
+    if schema is not None:
+        valid = answer is not None and not llm_schema.compile_validator(schema)(answer)
+        SCHEMA_STATS.add(answers=1, invalid_schema=0 if valid else 1)
+    else:
+        valid = isinstance(answer, dict) and isinstance(answer.get("line_indices"), list)
+    if not valid or answer.get("changed") is not False:
+        return None
+    evidence = [{"line_indices": answer["line_indices"], "type": "Implied"}] if answer["line_indices"] else []
+    return {
+        "relationship": state.label,
+        "evidence": reconstruct_evidence_text(evidence, interaction, char_map),
+        "source": "carried",
+    }
+
+def evaluate_in_context(i, interaction, state):
+    if state.run >= PAIR_STABLE_RUN:
+        result = confirm_interaction(i, interaction, state)
+        if result is not None:
+            PAIR_STATS.add(confirmed=1)
+            return result
+        PAIR_STATS.add(changed=1)
+    PAIR_STATS.add(full=1)
+    return evaluate_interaction(i, interaction, summary=state.describe(), char_map=state.char_map)
+
+def evaluate_pair(interactions_list, results, journal=None, trace_context=None):
+    """
+    Evaluates a pair's missing interactions in order, each with the summary
+    of the ones before it; finished ones (journal, cascade) only update the
+    summary. Returns {i: result} for the newly evaluated interactions.
+    """
+    state = PairSummary()
+    new_results = {}
+    for i, interaction in enumerate(interactions_list):
+        result = results.get(i)
+        if result is None:
+            evaluate = lambda unit: {i: evaluate_in_context(i, interaction, state)}
+            result = evaluate_and_record([(i, interaction)], journal, trace_context, evaluate=evaluate)[i]
+            new_results[i] = result
+        if result is not None and "error" not in result:
+            state.observe(result, interaction)
+    return new_results
+
+# ==========================================
+# CHECKPOINT JOURNAL
+# ==========================================
+
+def run_signature():
+    """Hash of the configuration the relationship answers depend on."""
+    return corpus.run_signature(
+        model=MODEL_NAME,
+        options=build_payload("")["options"],
+        system_prefix=USE_SYSTEM_PREFIX,
+        schema_format=USE_SCHEMA_FORMAT,
+        prompts=[SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT, PAIR_SYSTEM_PROMPT, CONFIRM_SYSTEM_PROMPT],
+        labels=[RELATIONSHIPS, EVIDENCE_TYPES],
+        batch=[BATCH_INTERACTIONS, NUM_CTX, BATCH_MAX_INTERACTIONS, BATCH_OUTPUT_TOKENS_PER_INTERACTION],
+        cascade=[USE_CASCADE, CASCADE_THRESHOLD, CASCADE_HOLDOUT],
+        pair_context=[PAIR_CONTEXT, PAIR_STABLE_RUN, PAIR_SUMMARY_LINES, PAIR_SUMMARY_LINE_CHARS],
+        evidence_index=USE_EVIDENCE_INDEX,
+        vote=[SELF_CONSISTENCY, VOTE_MARGIN, VOTE_MAX_SAMPLES, VOTE_TEMPERATURE, VOTE_EVIDENCE_SHARE],
+    )
+
+def journal_path_for(output_path):
+    """llm-relationship_x.json -> llm-relationship_x.jsonl (ignored by the scorer)."""
+    return os.path.splitext(output_path)[0] + ".jsonl"
+
+def journal_run(journal_path):
+    """Run signature from a journal's header line, or None (no journal / no header)."""
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+    except (OSError, json.JSONDecodeError):
+        return None
+    return header.get("run") if isinstance(header, dict) else None
+
+def load_journal(journal_path):
+    """
+    Reads finished interactions from a journal. A torn last line (process killed
+    mid-write) is ignored. Parse failures are not treated as done so they get
+    retried on the next run.
+    """
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "interaction" not in entry:
+                continue
+            result = entry.get("result")
+            if result is None or "error" in result:
+                continue
+            done[int(entry["interaction"])] = result
+    return done
+
+class InteractionJournal:
+    """
+    Append-only JSONL writer shared by the worker threads of one pair file.
+    The journal is created with its {"run": ...} header line before any work
+    is dispatched, so a file whose interactions all fail (e.g. the backend is
+    down) keeps a pending journal and is not mistaken for a finished one.
+    """
+
+    def __init__(self, path, run=None):
+        self.path = path
+        self.run = run
+        self._lock = threading.Lock()
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', encoding='utf-8')
+        if fresh:
+            self._file.write(json.dumps({"run": run}) + "\n")
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, i, result):
+        line = json.dumps({"interaction": i, "result": result}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + "\n")
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def evaluate_and_record(batch, journal, trace_context=None, submitted=None, evaluate=None):
+    """Evaluates a unit of work (one interaction or a batch) and journals each result."""
+    evaluate = evaluate or evaluate_batch
+    if TRACE is not None:
+        queue_wait = time.perf_counter() - submitted if submitted is not None else 0.0
+        with TRACE.context(**(trace_context or {}), interactions=[i for i, _ in batch], queue_wait=queue_wait):
+            results = evaluate(batch)
+    else:
+        results = evaluate(batch)
+    if journal is not None:
+        for i, result in results.items():
+            if result is not None:
+                journal.append(i, result)
+    return results
+
+def process_file(file_path, movie_name, output_folder, executor=None):
     filename = os.path.basename(file_path)
     print(f"Processing: {filename}...")
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            interactions_list = json.load(f)
+        interactions_list = dialogue_store.load_pair_file(file_path, STORE)
     except Exception as e:
         print(f"Failed to load {filename}: {e}")
         return
 
-    output_data = {}
+    output_filename = f"llm-relationship_{filename}"
+    output_path = os.path.join(output_folder, output_filename)
+    journal_path = journal_path_for(output_path)
+    run = run_signature()
 
-    for i, interaction in enumerate(interactions_list):
-        # 1. Anonymize
-        anonymized_text, char_map = anonymize_interaction(interaction)
-        
-        # 2. Prompt
-        prompt = construct_prompt(anonymized_text)
-        
-        # 3. Call LLM
-        response = query_ollama(prompt)
-        if not response:
-            print(f"  Skipping interaction {i} (No response)")
-            continue
+    # Pick up interactions finished by an earlier, interrupted run with the same configuration
+    results = {}
+    journal = None
+    if RESUME_RUNS:
+        if os.path.exists(journal_path) and journal_run(journal_path) != run:
+            print("  Discarding journal of a differently configured run")
+            os.remove(journal_path)
+        results = load_journal(journal_path)
+        if results:
+            print(f"  Resuming: {len(results)}/{len(interactions_list)} interactions already done")
+        journal = InteractionJournal(journal_path, run)
 
-        # 4. Parse
-        result = clean_llm_json(response)
-        
-        if result:
-            # 5. Post-process evidence text (ensure it matches indices)
-            if "evidence" in result:
-                result["evidence"] = reconstruct_evidence_text(result["evidence"], interaction, char_map)
-            
-            output_data[str(i)] = result
+    pending = [(i, interaction) for i, interaction in enumerate(interactions_list) if i not in results]
+    if USE_CASCADE:
+        pending = cascade_answers(pending, movie_name, results, journal)
+    if PAIR_CONTEXT:
+        units = []
+    elif BATCH_INTERACTIONS and not SELF_CONSISTENCY:
+        units = plan_batches(pending)
+        print(f"  Packed {len(pending)} interactions into {len(units)} prompts")
+    else:
+        units = [[item] for item in pending]
+
+    # Dispatch every unit at once; the executor bounds how many are
+    # actually in flight. Without an executor we fall back to a serial loop.
+    trace_context = {"movie": movie_name, "file": filename}
+    try:
+        if PAIR_CONTEXT:
+            # Each interaction depends on the ones before it
+            results.update(evaluate_pair(interactions_list, results, journal, trace_context))
+        elif executor is not None:
+            futures = [
+                executor.submit(evaluate_and_record, unit, journal, trace_context, time.perf_counter())
+                for unit in units
+            ]
+            for future in futures:
+                results.update(future.result())
         else:
-            print(f"  Failed to parse JSON for interaction {i}")
-            # Fallback empty structure
-            output_data[str(i)] = {"relationship": "Unknown", "evidence": [], "error": "LLM Parse Failure"}
+            for unit in units:
+                results.update(evaluate_and_record(unit, journal, trace_context))
+    finally:
+        if journal is not None:
+            journal.close()
 
-    # Write Output
-    output_filename = f"llm-relationship_{filename}"
-    output_path = os.path.join(output_folder, output_filename)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
+    # Assemble in interaction order so the output layout is unchanged
+    output_data = {}
+    for i in range(len(interactions_list)):
+        if results.get(i) is not None:
+            output_data[str(i)] = results[i]
+
+    # Write Output (via a temp file so a crash never leaves a half-written JSON)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(output_data, f, indent=2)
+    os.replace(tmp_path, output_path)
+    corpus.write_signature(output_path, file_path, run)
     print(f"Saved: {output_path}")
 
+    # Compact: the journal is only needed while interactions are still missing
+    complete = all(
+        str(i) in output_data and "error" not in output_data[str(i)]
+        for i in range(len(interactions_list))
+    )
+    if RESUME_RUNS and complete and os.path.exists(journal_path):
+        os.remove(journal_path)
+
+def is_file_complete(output_path):
+    """A pair file is done when its output exists and no journal is pending."""
+    return os.path.exists(output_path) and not os.path.exists(journal_path_for(output_path))
+
 # ==========================================
 # MAIN LOOP
 # ==========================================
@@ -211,33 +1026,61 @@ def main():
         print(f"Error: Root folder '{ROOT_DIR}' not found.")
         return
 
-    # List movie folders
-    movie_folders = [f for f in os.listdir(ROOT_DIR) if os.path.isdir(os.path.join(ROOT_DIR, f))]
+    # One pass over the tree; unchanged pair files are not re-parsed
+    catalog = corpus.build_catalog(ROOT_DIR, verbose=True)
+    target = None if PROCESS_ALL_MOVIES else TARGET_MOVIE_FOLDER
 
-    for movie in movie_folders:
-        # Filter logic
-        if not PROCESS_ALL_MOVIES and movie != TARGET_MOVIE_FOLDER:
-            continue
-            
-        movie_path = os.path.join(ROOT_DIR, movie)
-        eval_folder = os.path.join(movie_path, "relationship_eval")
+    # Load the model once up front; every request then extends its keep-alive
+    pool = backends()
+    pool.preload(MODEL_NAME)
+
+    # Shared worker pool bounding the number of in-flight Ollama requests
+    workers = MAX_CONCURRENT_REQUESTS * len(pool.endpoints)
+    executor = None
+    if workers > 1:
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    run = run_signature()
+    pair_jobs = []
+    for movie, pair, entry in corpus.iter_pairs(catalog, target):
+        movie_path = catalog["movies"][movie]["path"]
+        eval_folder = os.path.join(movie_path, corpus.RELATIONSHIP_EVAL_FOLDER)
         
         # Create output directory
         os.makedirs(eval_folder, exist_ok=True)
 
-        # Iterate JSON files
-        for file in os.listdir(movie_path):
-            if file.endswith(".json") and "relationship_eval" not in file:
-                # Ensure we don't process files inside the 'relationships' subfolder if it exists
-                # The loop os.listdir(movie_path) doesn't recurse, so folders are skipped, 
-                # but we check extensions just in case.
-                
-                full_path = os.path.join(movie_path, file)
-                
-                # Double check naming convention to avoid processing non-dialogue files
-                # Expecting: [movie]_[char1]_[char2].json
-                if file.startswith(movie):
-                    process_file(full_path, movie, eval_folder)
+        file = os.path.basename(entry["path"])
+        output_path = os.path.join(eval_folder, f"llm-relationship_{file}")
+        # Skip finished files unless the pair file or the configuration changed since
+        if RESUME_RUNS and is_file_complete(output_path) and not corpus.is_stale(entry, "relationship_pred", run):
+            print(f"Skipping {file} (already evaluated)")
+            continue
+        if PAIR_CONTEXT and executor is not None:
+            # A pair runs serially, so the workers take whole pair files
+            pair_jobs.append(executor.submit(process_file, entry["path"], movie, eval_folder))
+        else:
+            process_file(entry["path"], movie, eval_folder, executor)
+
+    for job in pair_jobs:
+        job.result()
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+    if CACHE is not None:
+        print(CACHE.summary())
+    if BACKEND is not None or len(pool.endpoints) > 1:
+        print(pool.summary())
+    if USE_SCHEMA_FORMAT:
+        print(SCHEMA_STATS.summary())
+    if USE_CASCADE:
+        print(CASCADE_STATS.summary())
+    if PAIR_CONTEXT:
+        print(PAIR_STATS.summary())
+    if SELF_CONSISTENCY and not PAIR_CONTEXT:
+        print(VOTE_STATS.summary())
+        vote_report(corpus.build_catalog(ROOT_DIR))
+    if TRACE is not None and TRACE.records:
+        telemetry.print_report(TRACE.summary(), TRACE.path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,236 @@
+import os
+import re
+import sys
+import json
+import math
+import collections
+
+import numpy as np
+
+import corpus
+import lexical_classifier
+import eval_results_relationships
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+ROOT_DIR = corpus.ROOT_DIR
+
+# Learned cue vocabulary; relearned when any GT file changes
+CUES_PATH = ".evidence_cues.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+# A word is a relationship cue when it is over-represented in GT evidence
+# lines: smoothed log-odds (evidence vs. other lines) above zero, seen in at
+# least MIN_CUE_COUNT evidence lines. Its log-odds is its query weight.
+MIN_CUE_COUNT = 3
+CUE_SMOOTHING = 1.0
+
+# BM25 over the lines of one interaction (each line is a document)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Interactions longer than this are shrunk to the TOP_K best-ranked lines
+# plus NEIGHBOURS lines either side of each; original indices are kept.
+# Cross-validated, 12 lines alone keep more GT evidence than 6 lines +/- 1
+# while sending fewer lines, hence no neighbours by default.
+LONG_INTERACTION_LINES = 16
+TOP_K = 12
+NEIGHBOURS = 0
+
+# Cross-validation for the report (same movie folds as lexical_classifier)
+FOLDS = lexical_classifier.FOLDS
+
+# ==========================================
+# CUE VOCABULARY
+# ==========================================
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def learn_cues(rows, min_count=MIN_CUE_COUNT, smoothing=CUE_SMOOTHING):
+    """
+    rows: lexical_classifier.load_training_data() rows. Returns {word: weight}
+    for words whose line frequency is higher in GT evidence lines than in
+    the other lines of the same interactions.
+    """
+    evidence_df = collections.Counter()
+    other_df = collections.Counter()
+    evidence_lines = other_lines = 0
+    for _, _, _, lines, _, evidence in rows:
+        if not evidence:
+            continue
+        for idx, text in enumerate(lines):
+            words = set(tokenize(text))
+            if idx in evidence:
+                evidence_df.update(words)
+                evidence_lines += 1
+            else:
+                other_df.update(words)
+                other_lines += 1
+    cues = {}
+    for word, count in evidence_df.items():
+        if count < min_count:
+            continue
+        p_evidence = (count + smoothing) / (evidence_lines + 2 * smoothing)
+        p_other = (other_df[word] + smoothing) / (other_lines + 2 * smoothing)
+        weight = math.log(p_evidence / (1 - p_evidence)) - math.log(p_other / (1 - p_other))
+        if weight > 0:
+            cues[word] = round(weight, 4)
+    return cues
+
+def load_or_learn(path=CUES_PATH, catalog=None, verbose=True):
+    """The cached cue vocabulary if learned from the current GT files, else a fresh one."""
+    if catalog is None:
+        catalog = corpus.build_catalog(ROOT_DIR)
+    signature = lexical_classifier.gt_signature(catalog)
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get("signature") == signature:
+            return cached["cues"]
+    rows = lexical_classifier.load_training_data(catalog)
+    cues = learn_cues(rows)
+    if verbose:
+        print(f"Learned {len(cues)} evidence cue words from {len(rows)} GT interactions")
+    if path:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"signature": signature, "cues": cues}, f)
+        os.replace(tmp_path, path)
+    return cues
+
+# ==========================================
+# PER-INTERACTION INDEX
+# ==========================================
+
+class InteractionIndex:
+    """
+    Inverted index over the lines of one interaction: word -> {line: tf}.
+    rank() scores every line with BM25 against the cue vocabulary.
+    """
+
+    def __init__(self, lines):
+        self.n = len(lines)
+        self.postings = collections.defaultdict(dict)
+        self.lengths = np.zeros(self.n, dtype=np.float64)
+        for idx, text in enumerate(lines):
+            words = tokenize(text)
+            self.lengths[idx] = len(words)
+            for word, tf in collections.Counter(words).items():
+                self.postings[word][idx] = tf
+        self.avg_length = float(self.lengths.mean()) if self.n else 0.0
+
+    def rank(self, cues, k1=BM25_K1, b=BM25_B):
+        """BM25 score per line (array of length n)."""
+        scores = np.zeros(self.n, dtype=np.float64)
+        norm = k1 * (1 - b + b * self.lengths / (self.avg_length or 1.0))
+        for word, posting in self.postings.items():
+            weight = cues.get(word)
+            if weight is None:
+                continue
+            idf = math.log(1 + (self.n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for idx, tf in posting.items():
+                scores[idx] += weight * idf * tf * (k1 + 1) / (tf + norm[idx])
+        return scores
+
+    def candidates(self, cues, top_k=TOP_K, neighbours=NEIGHBOURS):
+        """Sorted line indices: the top_k ranked lines and their neighbours."""
+        scores = self.rank(cues)
+        # Stable sort: ties go to the earlier line
+        best = np.argsort(-scores, kind="stable")[:top_k]
+        keep = set()
+        for idx in best.tolist():
+            keep.update(range(max(0, idx - neighbours), min(self.n, idx + neighbours + 1)))
+        return sorted(keep)
+
+def select_lines(interaction, cues, limit=LONG_INTERACTION_LINES):
+    """Indices of the lines to send for a dialogue interaction, or None to send all of them."""
+    if cues is None or len(interaction) <= limit:
+        return None
+    lines = [line.get("dialogue", "") for line in interaction]
+    return InteractionIndex(lines).candidates(cues)
+
+# ==========================================
+# REPORT (cross-validated)
+# ==========================================
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style BPE vocabularies (~4 chars per token)."""
+    return len(text or "") // 4 + 1
+
+def prompt_tokens(lines, keep=None):
+    """Tokens of the dialogue block ("[idx] Person X: text" per line) with or without selection."""
+    indices = range(len(lines)) if keep is None else keep
+    return sum(estimate_tokens(f"[{idx}] Person A: {lines[idx]}") for idx in indices)
+
+def report():
+    catalog = corpus.build_catalog(ROOT_DIR)
+    rows = lexical_classifier.load_training_data(catalog)
+    movies = sorted({r[0] for r in rows})
+    fold_of = {m: i % FOLDS for i, m in enumerate(movies)}
+
+    # Out-of-fold selection for every interaction
+    selections = [None] * len(rows)
+    for fold in range(FOLDS):
+        cues = learn_cues([r for r in rows if fold_of[r[0]] != fold])
+        for i, r in enumerate(rows):
+            if fold_of[r[0]] == fold:
+                selections[i] = select_lines([{"dialogue": t} for t in r[3]], cues)
+
+    full = sum(prompt_tokens(r[3]) for r in rows)
+    reduced = sum(prompt_tokens(r[3], keep) for r, keep in zip(rows, selections))
+    long_rows = [(r, keep) for r, keep in zip(rows, selections) if keep is not None]
+    long_full = sum(prompt_tokens(r[3]) for r, _ in long_rows)
+    long_reduced = sum(prompt_tokens(r[3], keep) for r, keep in long_rows)
+
+    # Upper bound: share of GT evidence lines that are still in the prompt
+    gt_total = gt_kept = 0
+    for r, keep in long_rows:
+        gt_total += len(r[5])
+        gt_kept += len(r[5] & set(keep))
+
+    # Checked-in predictions with evidence outside the selection dropped,
+    # i.e. what the model could no longer cite, scored by the existing scorer
+    selection_of = {(r[1], r[2]): keep for r, keep in long_rows}
+    predictions = lexical_classifier.load_llm_predictions(catalog)
+    restricted = {}
+    for pair, data in predictions.items():
+        restricted[pair] = {}
+        for interaction_id, result in data.items():
+            keep = selection_of.get((pair, interaction_id))
+            if keep is not None and isinstance(result, dict):
+                keep = set(keep)
+                result = dict(result, evidence=[
+                    dict(item, line_indices=[i for i in item.get("line_indices", []) if i in keep])
+                    for item in result.get("evidence", []) if isinstance(item, dict)
+                ])
+            restricted[pair][interaction_id] = result
+
+    def scored(preds):
+        return eval_results_relationships.score(
+            eval_results_relationships.load_scoring_data(catalog, predictions=preds, verbose=False))
+    before, after = scored(predictions), scored(restricted)
+
+    print(f"Cross-validated over {FOLDS} movie folds, {len(rows)} labelled interactions")
+    print(f"Shrunk interactions (> {LONG_INTERACTION_LINES} lines): {len(long_rows)} "
+          f"({len(long_rows) / max(1, len(rows)) * 100:.2f}%), top {TOP_K} lines +/- {NEIGHBOURS}")
+    print("\n" + "="*60)
+    print(f"{'DIALOGUE PROMPT TOKENS':<30} | {'FULL':>9} | {'INDEXED':>9} | {'CHANGE':>7}")
+    print("="*60)
+    for label, a, b in (("all interactions", full, reduced), ("shrunk interactions", long_full, long_reduced)):
+        print(f"{label:<30} | {a:>9} | {b:>9} | {(b / a - 1) * 100 if a else 0.0:+6.1f}%")
+    print("="*60)
+    print(f"GT evidence lines kept in shrunk prompts: {gt_kept}/{gt_total} "
+          f"({gt_kept / max(1, gt_total) * 100:.2f}%)")
+    print(f"Evidence recall (checked-in predictions, lines outside the selection dropped): "
+          f"{before['evidence_recall'] * 100:.2f}% -> {after['evidence_recall'] * 100:.2f}% "
+          f"({(after['evidence_recall'] - before['evidence_recall']) * 100:+.2f})")
+
+if __name__ == "__main__":
+    if "--learn" in sys.argv:
+        load_or_learn(verbose=True)
+    else:
+        report()
@@ -0,0 +1,192 @@
+import json
+import time
+import random
+import threading
+
+from llm_cache import make_key
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Nominal speeds the mock reports (and, with simulate=True, sleeps for)
+MOCK_LATENCY = 0.0
+MOCK_PROMPT_TOKENS_PER_S = 2000.0
+MOCK_TOKENS_PER_S = 40.0
+MOCK_OUTPUT_TOKENS = 60
+
+# Recorded responses for ReplayBackend (written by RecordingBackend)
+RECORDING_PATH = "llm_recording.jsonl"
+
+# ==========================================
+# BACKEND INTERFACE
+# ==========================================
+
+class Backend:
+    """
+    What the evaluators need from an LLM server: generate(payload) returning
+    an Ollama-style body ({"response": text, ...timing metadata}) or None,
+    preload(model), summary(), and endpoints (one worker pool per endpoint).
+    ollama_client.BackendPool provides the same methods for real servers;
+    set evaluate_*.BACKEND to an instance to swap it in.
+    """
+
+    endpoints = ("local",)
+
+    def generate(self, payload, timeout=None, stream=False):
+        raise NotImplementedError
+
+    def preload(self, model, keep_alive=None):
+        return [True]
+
+    def summary(self):
+        return f"Backend: {type(self).__name__}"
+
+def payload_key(payload):
+    """Response-cache key of a generate payload."""
+    return make_key(payload.get("model"), payload.get("options"), payload.get("prompt", ""),
+                    payload.get("format"), payload.get("system"))
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style BPE vocabularies (~4 chars per token)."""
+    return len(text or "") // 4 + 1
+
+# ==========================================
+# MOCK
+# ==========================================
+
+def sample_schema(schema, rng):
+    """A random value valid under the schema subset used by llm_schema."""
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: sample_schema(sub, rng) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_schema(schema.get("items", {}), rng) for _ in range(rng.randint(1, 2))]
+    if kind == "integer":
+        low = schema.get("minimum", 0)
+        return rng.randint(low, schema.get("maximum", low + 5))
+    if kind == "number":
+        return rng.random()
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return "mock"
+
+class MockBackend(Backend):
+    """
+    Deterministic stand-in for Ollama: the answer is drawn from the request's
+    JSON Schema "format" with a RNG seeded by the request, so the same prompt
+    always gets the same answer. Plain "json" requests get "{}".
+
+    Timing metadata is computed from the nominal token rates. With
+    simulate=True the call also sleeps for that long.
+    """
+
+    endpoints = ("mock",)
+
+    def __init__(self, latency=MOCK_LATENCY, prompt_rate=MOCK_PROMPT_TOKENS_PER_S,
+                 token_rate=MOCK_TOKENS_PER_S, output_tokens=MOCK_OUTPUT_TOKENS, simulate=False):
+        self.latency = latency
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.output_tokens = output_tokens
+        self.simulate = simulate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, payload, timeout=None, stream=False):
+        key = payload_key(payload)
+        rng = random.Random(int(key[:16], 16))
+        fmt = payload.get("format")
+        answer = sample_schema(fmt, rng) if isinstance(fmt, dict) else {}
+        text = json.dumps(answer)
+
+        prompt_tokens = estimate_tokens(payload.get("system", "")) + estimate_tokens(payload.get("prompt", ""))
+        prompt_s = prompt_tokens / self.prompt_rate
+        eval_s = self.output_tokens / self.token_rate
+        total_s = self.latency + prompt_s + eval_s
+        if self.simulate:
+            time.sleep(total_s)
+        with self._lock:
+            self.calls += 1
+        return {
+            "model": payload.get("model"),
+            "response": text,
+            "done": True,
+            "total_duration": int(total_s * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_s * 1e9),
+            "eval_count": self.output_tokens,
+            "eval_duration": int(eval_s * 1e9),
+        }
+
+    def summary(self):
+        return f"Backend: mock ({self.calls} calls)"
+
+# ==========================================
+# RECORD / REPLAY
+# ==========================================
+
+class RecordingBackend(Backend):
+    """Wraps another backend and appends every answered request to a JSONL recording."""
+
+    def __init__(self, inner, path=RECORDING_PATH):
+        self.inner = inner
+        self.path = path
+        self.endpoints = inner.endpoints
+        self._lock = threading.Lock()
+
+    def generate(self, payload, timeout=None, stream=False):
+        body = self.inner.generate(payload, timeout=timeout, stream=stream)
+        if body is not None:
+            line = json.dumps({"key": payload_key(payload), "body": body}, ensure_ascii=False)
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+        return body
+
+    def preload(self, model, keep_alive=None):
+        return self.inner.preload(model)
+
+    def summary(self):
+        return f"{self.inner.summary()} (recording to {self.path})"
+
+class ReplayBackend(Backend):
+    """
+    Serves responses recorded by RecordingBackend, looked up by the request's
+    cache key. Unrecorded requests go to fallback (e.g. a MockBackend) or,
+    without one, fail like an unreachable server.
+    """
+
+    endpoints = ("replay",)
+
+    def __init__(self, path=RECORDING_PATH, fallback=None):
+        self.path = path
+        self.fallback = fallback
+        self.responses = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.responses[entry["key"]] = entry["body"]
+
+    def generate(self, payload, timeout=None, stream=False):
+        body = self.responses.get(payload_key(payload))
+        with self._lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if body is None:
+            return self.fallback.generate(payload, timeout=timeout) if self.fallback else None
+        return dict(body)
+
+    def summary(self):
+        return f"Backend: replay of {self.path} ({self.hits} hits, {self.misses} misses)"
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# On-disk location of the shared response cache (used by both evaluators)
+CACHE_PATH = ".llm_cache.sqlite"
+
+# Evict least-recently-used entries once the stored responses exceed this size
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# ==========================================
+# RESPONSE CACHE
+# ==========================================
+
+def make_key(model, options, prompt, fmt=None, system=None):
+    """
+    Content address of an LLM call: a SHA-256 over everything that influences
+    the generated text. Options are serialized with sorted keys so dict order
+    does not matter. The system prompt only enters the key when one is sent,
+    so keys of single-prompt calls are unchanged.
+    """
+    fields = {"model": model, "options": options or {}, "format": fmt, "prompt": prompt}
+    if system is not None:
+        fields["system"] = system
+    material = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    SQLite-backed store mapping make_key(...) -> raw LLM response text.
+
+    - bypass=True skips lookups but still stores fresh responses, so a forced
+      re-run refreshes the cache instead of ignoring it.
+    - hits / misses are counted per instance and shown by summary().
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, bypass=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        # Running size of the stored responses; recounted only when it
+        # crosses max_bytes (other processes may write to the same file)
+        self._total = None
+        # Evaluators call the cache from worker threads; sqlite connections are
+        # shared behind one lock.
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+            self._conn.commit()
+            self._total = self._stored_bytes(self._conn)
+        return self._conn
+
+    @staticmethod
+    def _stored_bytes(db):
+        return db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """Returns the cached response for key, or None on a miss."""
+        if self.bypass:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response, model=None):
+        """
+        Stores a response and evicts old entries if the size limit is exceeded.
+        Callers only store answers that parsed and validated, so a failed
+        answer is asked again on the next run instead of being replayed.
+        """
+        if response is None:
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            old = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._total += size - (old[0] if old else 0)
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict(db)
+            db.commit()
+
+    def _evict(self, db):
+        if self._total <= self.max_bytes:
+            return
+        total = self._stored_bytes(db)
+        if total <= self.max_bytes:
+            self._total = total
+            return
+        # Drop oldest-accessed rows until we are back under the limit
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._total = total - freed
+
+    def stats(self):
+        with self._lock:
+            db = self._db()
+            entries, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def summary(self):
+        s = self.stats()
+        lookups = s["hits"] + s["misses"]
+        rate = (s["hits"] / lookups * 100) if lookups else 0.0
+        return (f"Cache: {s['hits']} hits / {s['misses']} misses ({rate:.1f}% hit rate), "
+                f"{s['entries']} entries, {s['bytes'] / 1024:.1f} KiB")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,266 @@
+import json
+
+import telemetry
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Python type(s) accepted for each JSON Schema "type"
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+# ==========================================
+# SCHEMAS
+# ==========================================
+
+def relationship_schema(relationships, evidence_types, line_count=None):
+    """Answer schema of one interaction; line_indices are bounded when line_count is given."""
+    index = {"type": "integer", "minimum": 0}
+    if line_count:
+        index["maximum"] = line_count - 1
+    return {
+        "type": "object",
+        "properties": {
+            "relationship": {"type": "string", "enum": list(relationships)},
+            "evidence": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "line_indices": {"type": "array", "items": index},
+                        "text": {"type": "string"},
+                        "type": {"type": "string", "enum": list(evidence_types)},
+                    },
+                    "required": ["line_indices", "type"],
+                },
+            },
+        },
+        "required": ["relationship", "evidence"],
+    }
+
+def confirmation_schema(line_count=None):
+    """Short answer to "does the relationship still hold?" plus supporting line indices."""
+    index = {"type": "integer", "minimum": 0}
+    if line_count:
+        index["maximum"] = line_count - 1
+    return {
+        "type": "object",
+        "properties": {
+            "changed": {"type": "boolean"},
+            "line_indices": {"type": "array", "items": index},
+        },
+        "required": ["changed", "line_indices"],
+    }
+
+def keyed_schema(item_schemas):
+    """{key: schema} -> object schema requiring every key (batched prompts)."""
+    return {
+        "type": "object",
+        "properties": dict(item_schemas),
+        "required": list(item_schemas),
+    }
+
+def agesex_schema(persons, ages, sexes):
+    person = {
+        "type": "object",
+        "properties": {
+            "age": {"type": "string", "enum": list(ages)},
+            "sex": {"type": "string", "enum": list(sexes)},
+        },
+        "required": ["age", "sex"],
+    }
+    return keyed_schema({p: person for p in persons})
+
+# ==========================================
+# COMPILED VALIDATOR
+# ==========================================
+
+def _compile(schema):
+    """
+    Turns a schema into a closure check(value, path, errors). Only the subset
+    the evaluators use is supported: type, enum, minimum, maximum, properties,
+    required and items.
+    """
+    checks = []
+    expected = schema.get("type")
+    py_type = JSON_TYPES.get(expected)
+
+    if "enum" in schema:
+        allowed = set(schema["enum"])
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append((path, f"{value!r} is not one of {sorted(allowed)}"))
+        checks.append(check_enum)
+
+    if "minimum" in schema or "maximum" in schema:
+        low, high = schema.get("minimum"), schema.get("maximum")
+        def check_range(value, path, errors):
+            if (low is not None and value < low) or (high is not None and value > high):
+                errors.append((path, f"{value!r} is outside [{low}, {high}]"))
+        checks.append(check_range)
+
+    if "properties" in schema or "required" in schema:
+        properties = [(name, _compile(sub)) for name, sub in schema.get("properties", {}).items()]
+        required = list(schema.get("required", []))
+        def check_object(value, path, errors):
+            for name in required:
+                if name not in value:
+                    errors.append((path + (name,), "missing"))
+            for name, check in properties:
+                if name in value:
+                    check(value[name], path + (name,), errors)
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_check = _compile(schema["items"])
+        def check_items(value, path, errors):
+            for i, item in enumerate(value):
+                item_check(item, path + (i,), errors)
+        checks.append(check_items)
+
+    def check(value, path, errors):
+        if py_type is not None:
+            # bool is an int subclass but never a valid JSON integer / number
+            if not isinstance(value, py_type) or (isinstance(value, bool) and expected != "boolean"):
+                errors.append((path, f"expected {expected}, got {type(value).__name__}"))
+                return
+        for sub_check in checks:
+            sub_check(value, path, errors)
+    return check
+
+def compile_validator(schema):
+    """Returns validate(instance) -> list of (path, message); empty when valid."""
+    check = _compile(schema)
+    def validate(instance):
+        errors = []
+        check(instance, (), errors)
+        return errors
+    return validate
+
+# ==========================================
+# FIELD-LEVEL REPAIR
+# ==========================================
+
+def schema_at(schema, path):
+    for key in path:
+        schema = schema["items"] if isinstance(key, int) else schema["properties"][key]
+    return schema
+
+def set_at(instance, path, value):
+    target = instance
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+
+def field_paths(errors):
+    """
+    The fields to re-ask: each error path cut back to its last named property
+    (a bad list element re-asks the whole list), minus paths nested in others.
+    """
+    paths = set()
+    for path, _ in errors:
+        path = tuple(path)
+        while path and isinstance(path[-1], int):
+            path = path[:-1]
+        paths.add(path)
+    return sorted(p for p in paths if not any(q != p and p[:len(q)] == q for q in paths))
+
+def _path_label(path):
+    return "".join(f"[{k}]" if isinstance(k, int) else (f".{k}" if i else k) for i, k in enumerate(path)) or "the answer"
+
+def reask_prompt(prompt, path, messages, schema):
+    problems = "; ".join(messages)
+    return (
+        f"{prompt}\n"
+        f"Your previous answer had an invalid value for {_path_label(path)} ({problems}).\n"
+        f"Reply with only a JSON object {{\"value\": ...}} where value matches this schema:\n"
+        f"{json.dumps(schema)}\n"
+    )
+
+def reask_format(schema):
+    return {"type": "object", "properties": {"value": schema}, "required": ["value"]}
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style BPE vocabularies (~4 chars per token)."""
+    return len(text or "") // 4 + 1
+
+def parse_json(text):
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+def is_cacheable(text, fmt):
+    """
+    True if a response is worth caching: a JSON object that matches fmt when
+    fmt is a schema. Unparsable or off-schema answers are asked again instead.
+    """
+    result = parse_json(text)
+    if not isinstance(result, dict):
+        return False
+    return not isinstance(fmt, dict) or not compile_validator(fmt)(result)
+
+class SchemaStats(telemetry.Counters):
+    """Thread-safe counters behind the parse-failure and wasted-token summary."""
+
+    FIELDS = ("answers", "invalid_json", "invalid_schema", "repaired", "failed",
+              "reasks", "reask_tokens", "wasted_tokens")
+
+    def summary(self):
+        invalid = self.invalid_json + self.invalid_schema
+        rate = invalid / self.answers * 100 if self.answers else 0.0
+        return (f"Schema: {self.answers} answers, {invalid} invalid ({rate:.2f}%: "
+                f"{self.invalid_json} not JSON, {self.invalid_schema} off-schema), "
+                f"{self.repaired} repaired with {self.reasks} field re-asks (~{self.reask_tokens} tokens), "
+                f"{self.failed} unrecoverable, ~{self.wasted_tokens} output tokens wasted")
+
+def validate_and_repair(result, response_text, schema, validator, prompt, ask, stats=None, limit=2):
+    """
+    Checks a parsed answer against its schema. Invalid fields are re-asked one
+    by one through ask(prompt, format) -> text, with the original prompt plus
+    the error and the field's own schema, and patched into the answer.
+    Returns the valid answer, or None if it could not be repaired.
+    """
+    stats = stats or SchemaStats()
+    errors = validator(result) if result is not None else [((), "not valid JSON")]
+    if not errors:
+        stats.add(answers=1)
+        return result
+    if result is None:
+        stats.add(answers=1, invalid_json=1, wasted_tokens=estimate_tokens(response_text))
+    else:
+        stats.add(answers=1, invalid_schema=1)
+
+    for _ in range(limit):
+        for path in field_paths(errors):
+            messages = [m for p, m in errors if tuple(p[:len(path)]) == path]
+            sub_schema = schema_at(schema, path)
+            reply = ask(reask_prompt(prompt, path, messages, sub_schema), reask_format(sub_schema))
+            tokens = estimate_tokens(reply)
+            stats.add(reasks=1, reask_tokens=tokens)
+
+            parsed = parse_json(reply) if reply else None
+            value = parsed.get("value") if isinstance(parsed, dict) else None
+            if value is None or compile_validator(sub_schema)(value):
+                stats.add(wasted_tokens=tokens)
+                continue
+            if not path:
+                result = value
+            elif result is not None:
+                set_at(result, path, value)
+
+        errors = validator(result) if result is not None else [((), "not valid JSON")]
+        if not errors:
+            stats.add(repaired=1)
+            return result
+
+    stats.add(failed=1, wasted_tokens=estimate_tokens(response_text))
+    return None
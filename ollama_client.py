@@ -0,0 +1,286 @@
+import json
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+OLLAMA_URL = "http://localhost:11434/api/generate"
+
+# Keep-alive connection pool shared by all threads of a run
+POOL_SIZE = 16
+
+# (connect, read) timeouts in seconds. The read timeout covers a full
+# non-streaming generation, or the gap between two chunks when streaming.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 300
+
+# Retry policy for transient failures (5xx, 429, connection resets/refused).
+# Delay before attempt n is uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**n)).
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Stream tokens as NDJSON chunks instead of waiting for the full body
+USE_STREAMING = False
+
+# How long the server keeps the model (and its prompt cache) loaded after a
+# request. Sent with every call so the model stays resident for a whole run.
+KEEP_ALIVE = "30m"
+
+# Backend pool (several servers, e.g. one per NUMA node). Requests go to the
+# healthy endpoint with the fewest requests in flight. An endpoint that fails a
+# request and then its health check is taken out of rotation and probed again
+# every HEALTH_RETRY_INTERVAL seconds; its work fails over to the others.
+# When no healthy endpoint is left (e.g. the only server restarts), requests
+# keep going to the down endpoints with the full MAX_RETRIES backoff instead
+# of failing without an attempt.
+HEALTH_PATH = "/api/version"
+HEALTH_TIMEOUT = 2
+HEALTH_RETRY_INTERVAL = 10.0
+# Transient-error retries on one endpoint before failing over (pools of > 1)
+FAILOVER_RETRIES = 1
+
+# ==========================================
+# SESSION
+# ==========================================
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Returns the process-wide requests.Session with a pooled HTTP adapter."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+# ==========================================
+# GENERATE
+# ==========================================
+
+def _read_stream(response):
+    """
+    Concatenates the "response" field of every NDJSON chunk. The final chunk
+    (done=true) carries the timing metadata, which we keep as the result body.
+    """
+    parts = []
+    final = {}
+    for raw in response.iter_lines():
+        if not raw:
+            continue
+        chunk = json.loads(raw)
+        if "error" in chunk:
+            raise requests.exceptions.HTTPError(chunk["error"], response=response)
+        parts.append(chunk.get("response", ""))
+        if chunk.get("done"):
+            final = chunk
+    final = dict(final)
+    final["response"] = "".join(parts)
+    return final
+
+def generate(payload, url=OLLAMA_URL, timeout=None, stream=USE_STREAMING, retries=MAX_RETRIES):
+    """
+    POSTs a generate payload and returns Ollama's decoded response body
+    (the "response" text plus metadata such as eval_count), or None once all
+    retries are exhausted.
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    elif not isinstance(timeout, tuple):
+        timeout = (CONNECT_TIMEOUT, timeout)
+
+    body = dict(payload)
+    body["stream"] = stream
+    session = get_session()
+
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(url, json=body, timeout=timeout, stream=stream)
+            try:
+                if response.status_code in RETRY_STATUS and attempt < retries:
+                    raise requests.exceptions.HTTPError(f"{response.status_code} from Ollama", response=response)
+                response.raise_for_status()
+                if stream:
+                    return _read_stream(response)
+                return response.json()
+            finally:
+                response.close()
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and status not in RETRY_STATUS:
+                print(f"Error communicating with Ollama: {e}")
+                return None
+            error = e
+        except requests.exceptions.RequestException as e:
+            # Read timeouts and malformed requests are not worth repeating
+            print(f"Error communicating with Ollama: {e}")
+            return None
+        except ValueError as e:
+            print(f"Malformed response from Ollama: {e}")
+            return None
+
+        if attempt < retries:
+            delay = backoff_delay(attempt)
+            print(f"  Ollama request failed ({error}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    print(f"Error communicating with Ollama after {retries + 1} attempts: {error}")
+    return None
+
+def base_url(url):
+    """http://host:11434/api/generate -> http://host:11434"""
+    return url.split("/api/", 1)[0]
+
+# ==========================================
+# BACKEND POOL
+# ==========================================
+
+class Endpoint:
+    def __init__(self, url, index):
+        self.url = url
+        self.index = index
+        self.outstanding = 0
+        self.healthy = True
+        self.retry_at = 0.0
+        self.served = 0
+        self.failovers = 0
+
+class BackendPool:
+    """
+    Least-outstanding-requests dispatch over several generate endpoints with
+    health checks and failover. All servers run the same model and the
+    evaluators fix the sampling seed, so an answer does not depend on which
+    endpoint produced it.
+    """
+
+    def __init__(self, urls, retry_interval=HEALTH_RETRY_INTERVAL):
+        if not urls:
+            raise ValueError("BackendPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url, i) for i, url in enumerate(urls)]
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+
+    def check(self, endpoint):
+        """Probes the endpoint's health URL and updates its state. Returns True if it is up."""
+        try:
+            response = get_session().get(base_url(endpoint.url) + HEALTH_PATH, timeout=(CONNECT_TIMEOUT, HEALTH_TIMEOUT))
+            response.close()
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        with self._lock:
+            endpoint.healthy = ok
+            if not ok:
+                endpoint.retry_at = time.monotonic() + self.retry_interval
+        return ok
+
+    def check_all(self):
+        return [self.check(endpoint) for endpoint in self.endpoints]
+
+    def _acquire(self, exclude):
+        # Re-probe endpoints that are due; pushing retry_at first means only
+        # one thread probes a given endpoint at a time.
+        now = time.monotonic()
+        with self._lock:
+            due = [e for e in self.endpoints if not e.healthy and e.retry_at <= now and e.url not in exclude]
+            for endpoint in due:
+                endpoint.retry_at = now + self.retry_interval
+        for endpoint in due:
+            self.check(endpoint)
+
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e.url not in exclude]
+            if not candidates and not any(e.healthy for e in self.endpoints):
+                # Never leave the pool empty: fall back to the down endpoints
+                candidates = [e for e in self.endpoints if e.url not in exclude]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: (e.outstanding, e.index))
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _release(self, endpoint, served):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if served:
+                # An answer proves a down endpoint is back
+                endpoint.served += 1
+                endpoint.healthy = True
+
+    def generate(self, payload, timeout=None, stream=USE_STREAMING):
+        """
+        generate() on the least busy healthy endpoint. If the call fails and
+        the endpoint also fails its health check, the request moves to the next
+        endpoint; a failure on a healthy endpoint is the request's own and
+        returns None like generate(). With no healthy endpoint left the
+        request is still tried on the down ones, with full retries.
+        """
+        tried = set()
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                print("Error communicating with Ollama: no healthy endpoint left")
+                return None
+            retries = MAX_RETRIES if len(self.endpoints) == 1 or not endpoint.healthy else FAILOVER_RETRIES
+            body = None
+            try:
+                body = generate(payload, url=endpoint.url, timeout=timeout, stream=stream, retries=retries)
+            finally:
+                self._release(endpoint, body is not None)
+            if body is not None:
+                body["endpoint"] = endpoint.url
+                return body
+
+            tried.add(endpoint.url)
+            if self.check(endpoint):
+                return None
+            with self._lock:
+                endpoint.failovers += 1
+            print(f"  Ollama endpoint {endpoint.url} is down; failing over")
+
+    def preload(self, model, keep_alive=KEEP_ALIVE):
+        return [preload(model, url=e.url, keep_alive=keep_alive) for e in self.endpoints]
+
+    def summary(self):
+        parts = [
+            f"{e.url} served={e.served} failovers={e.failovers}{'' if e.healthy else ' DOWN'}"
+            for e in self.endpoints
+        ]
+        return "Backends: " + "; ".join(parts)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(urls):
+    """Process-wide pool for a list of endpoints (one per distinct list)."""
+    key = tuple(urls)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = BackendPool(list(key))
+        return _pools[key]
+
+def preload(model, url=OLLAMA_URL, keep_alive=KEEP_ALIVE):
+    """
+    Loads the model before the first real request (a generate call without a
+    prompt only loads it), so model load time is not charged to the first
+    interaction. Returns False if the server could not be reached.
+    """
+    return generate({"model": model, "keep_alive": keep_alive}, url=url, retries=0) is not None
@@ -0,0 +1,267 @@
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import shutil
+import cProfile
+import tempfile
+import tracemalloc
+import contextlib
+
+import corpus
+import llm_backends
+import llm_schema
+import lexical_classifier
+import evaluate_relationships
+import evaluate_agesex
+import eval_results_relationships
+import eval_results_agesex
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Stage timings of a known-good run; compared against on every run
+BASELINE_PATH = "benchmark_baseline.json"
+
+# A stage regresses when it is both this much slower (relative) and at least
+# MIN_REGRESSION_SECONDS slower (absolute) than the baseline
+TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.05
+
+# Each stage is run this many times on a fresh copy; the fastest run counts
+REPEATS = 3
+
+# Files copied into the scratch directory the pipeline runs in, so the
+# checked-in predictions, caches and catalog are never touched
+COPY_FILES = [eval_results_agesex.GT_XLSX]
+COPY_DIRS = ["dialogue_store"]
+
+# Breakdown of each run by (source file, function) cumulative time. Model time
+# is the backend's generate(); everything else is pipeline overhead.
+STAGE_FUNCTIONS = {
+    "relationships": {
+        "catalog": [("corpus.py", "build_catalog")],
+        "load": [("dialogue_store.py", "load_pair_file")],
+        "anonymize": [("evaluate_relationships.py", "anonymize_interaction")],
+        "cascade": [("evaluate_relationships.py", "cascade_answers")],
+        "prompt": [("evaluate_relationships.py", "construct_prompt"), ("evaluate_relationships.py", "construct_batch_prompt"),
+                   ("evaluate_relationships.py", "build_payload")],
+        "backend": [("llm_backends.py", "generate"), ("ollama_client.py", "generate")],
+        "parse": [("evaluate_relationships.py", "parse_response"), ("evaluate_relationships.py", "validated_answer")],
+        "evidence": [("evaluate_relationships.py", "reconstruct_evidence_text")],
+        "journal": [("evaluate_relationships.py", "append")],
+        "write": [("__init__.py", "dump")],
+    },
+    "agesex": {
+        "catalog": [("corpus.py", "build_catalog")],
+        "load": [("dialogue_store.py", "load_pair_file")],
+        "anonymize": [("evaluate_agesex.py", "get_char_mapping_and_text")],
+        "prompt": [("evaluate_agesex.py", "construct_prompt"), ("evaluate_agesex.py", "build_payload")],
+        "backend": [("llm_backends.py", "generate"), ("ollama_client.py", "generate")],
+        "parse": [("evaluate_agesex.py", "clean_llm_json"), ("llm_schema.py", "validate_and_repair")],
+        "merge": [("evaluate_agesex.py", "merge_votes")],
+        "write": [("__init__.py", "dump")],
+    },
+    "score_relationships": {
+        "load": [("eval_results_relationships.py", "load_scoring_data")],
+        "score": [("eval_results_relationships.py", "score")],
+        "bootstrap": [("eval_results_relationships.py", "bootstrap")],
+    },
+    "score_agesex": {
+        "gt": [("eval_results_agesex.py", "load_gt_index")],
+        "load": [("eval_results_agesex.py", "load_scoring_data")],
+        "score": [("eval_results_agesex.py", "score")],
+    },
+}
+
+# ==========================================
+# SETUP
+# ==========================================
+
+def prepare_workdir(root=corpus.ROOT_DIR):
+    """Copies the corpus (without predictions) into a scratch directory and returns its path."""
+    workdir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    ignore = shutil.ignore_patterns(corpus.RELATIONSHIP_EVAL_FOLDER, corpus.AGESEX_EVAL_FOLDER)
+    # The dialogue store is checked against content hashes, so it stays fresh for the copies
+    shutil.copytree(root, os.path.join(workdir, root), ignore=ignore)
+    for name in COPY_FILES:
+        if os.path.exists(name):
+            shutil.copy2(name, os.path.join(workdir, name))
+    for name in COPY_DIRS:
+        if os.path.isdir(name):
+            shutil.copytree(name, os.path.join(workdir, name))
+    return workdir
+
+def configure(backend):
+    """Points both evaluators at the backend with caches and telemetry off and one worker."""
+    for module in (evaluate_relationships, evaluate_agesex):
+        module.BACKEND = backend
+        module.CACHE = None
+        module.TRACE = None
+        module.PROCESS_ALL_MOVIES = True
+        module.SCHEMA_STATS = llm_schema.SchemaStats()
+    evaluate_relationships.CASCADE_STATS = lexical_classifier.CascadeStats()
+    # cProfile only sees the main thread
+    evaluate_relationships.MAX_CONCURRENT_REQUESTS = 1
+    evaluate_agesex.SKIP_UP_TO_DATE = False
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+
+def breakdown(profile, stages):
+    stats = pstats.Stats(profile).stats
+    result = {}
+    for stage, functions in stages.items():
+        wanted = set(functions)
+        result[stage] = sum(
+            ct for (filename, _, name), (_, _, _, ct, _) in stats.items()
+            if (os.path.basename(filename), name) in wanted
+        )
+    return result
+
+def run_stage(name, fn):
+    """Runs fn() with stdout silenced under cProfile and tracemalloc."""
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        profile.enable()
+        try:
+            fn()
+        finally:
+            profile.disable()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "peak_mb": peak / 2**20,
+        "breakdown": breakdown(profile, STAGE_FUNCTIONS.get(name, {})),
+    }
+
+SUITE = [
+    ("relationships", evaluate_relationships.main),
+    ("agesex", evaluate_agesex.main),
+    ("score_relationships", eval_results_relationships.main),
+    ("score_agesex", eval_results_agesex.main),
+]
+
+def run_suite(backend):
+    configure(backend)
+    return {name: run_stage(name, fn) for name, fn in SUITE}
+
+def fastest(runs):
+    """Element-wise minimum over repeated suite results (peak memory: maximum)."""
+    best = {}
+    for name in runs[0]:
+        stages = [run[name] for run in runs]
+        best[name] = {
+            "seconds": min(s["seconds"] for s in stages),
+            "peak_mb": max(s["peak_mb"] for s in stages),
+            "breakdown": {sub: min(s["breakdown"][sub] for s in stages) for sub in stages[0]["breakdown"]},
+        }
+    return best
+
+# ==========================================
+# REPORT / BASELINE
+# ==========================================
+
+def compare(results, baseline):
+    """Yields (label, seconds, baseline_seconds, regressed) for every stage and sub-stage."""
+    for name, stage in results.items():
+        base = baseline.get(name, {})
+        rows = [(name, stage["seconds"], base.get("seconds"))]
+        rows += [(f"  {sub}", seconds, base.get("breakdown", {}).get(sub)) for sub, seconds in stage["breakdown"].items()]
+        for label, seconds, base_seconds in rows:
+            regressed = (
+                base_seconds is not None
+                and seconds > base_seconds * (1 + TOLERANCE)
+                and seconds - base_seconds > MIN_REGRESSION_SECONDS
+            )
+            yield label, seconds, base_seconds, regressed
+
+def print_report(results, baseline=None, backend=None):
+    print("\n" + "="*78)
+    print(f"{'STAGE':<26} | {'TIME (s)':>9} | {'BASELINE':>9} | {'CHANGE':>8} | {'PEAK MB':>8}")
+    print("="*78)
+    regressions = []
+    stage = None
+    for label, seconds, base_seconds, regressed in compare(results, baseline or {}):
+        if label in results:
+            stage = label
+        peak = results[label]["peak_mb"] if label in results else None
+        base_cell = f"{base_seconds:9.3f}" if base_seconds is not None else f"{'-':>9}"
+        change = f"{(seconds / base_seconds - 1) * 100:+7.1f}%" if base_seconds else f"{'-':>8}"
+        peak_cell = f"{peak:8.1f}" if peak is not None else ""
+        flag = "  << REGRESSION" if regressed else ""
+        print(f"{label:<26} | {seconds:9.3f} | {base_cell} | {change} | {peak_cell}{flag}")
+        if regressed:
+            regressions.append(stage if label == stage else f"{stage}/{label.strip()}")
+    print("="*78)
+    print(f"Fastest of {REPEATS} runs, profiled (cProfile + tracemalloc). Sub-stages are the")
+    print("cumulative time of the functions in STAGE_FUNCTIONS and may nest.")
+    if backend is not None:
+        print(backend.summary())
+    return regressions
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)["stages"]
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "stages": results}, f, indent=2)
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def main():
+    """
+    python pipeline_benchmark.py [--replay RECORDING] [--save-baseline] [--keep]
+
+    Runs both evaluators and both scorers over a scratch copy of the corpus
+    with the deterministic mock backend (or a replay of recorded responses)
+    and compares stage times with BASELINE_PATH. Exits 1 on a regression.
+    """
+    args = sys.argv[1:]
+    backend = llm_backends.MockBackend()
+    if "--replay" in args:
+        backend = llm_backends.ReplayBackend(os.path.abspath(args[args.index("--replay") + 1]), fallback=backend)
+
+    baseline_path = os.path.abspath(BASELINE_PATH)
+    baseline = load_baseline(baseline_path)
+
+    runs = []
+    cwd = os.getcwd()
+    for _ in range(REPEATS):
+        workdir = prepare_workdir()
+        try:
+            os.chdir(workdir)
+            runs.append(run_suite(backend))
+        finally:
+            os.chdir(cwd)
+            if "--keep" in args:
+                print(f"Scratch directory kept: {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    results = fastest(runs)
+
+    regressions = print_report(results, baseline, backend)
+    if "--save-baseline" in args:
+        save_baseline(results, baseline_path)
+        print(f"Baseline saved to {baseline_path}")
+    elif baseline is None:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one.")
+    elif regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import sys
+import time
+
+import corpus
+import dialogue_store
+import evaluate_relationships
+import evaluate_agesex
+import telemetry
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Interactions (relationships) / pair files (age-sex) sent per layout
+MOVIE = "hitman"
+CALLS = 20
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+
+def relationship_prompts(catalog, movie=MOVIE, limit=CALLS):
+    prompts = []
+    for _, _, entry in corpus.iter_pairs(catalog, movie):
+        for interaction in dialogue_store.load_pair_file(entry["path"], evaluate_relationships.STORE):
+            text, _ = evaluate_relationships.anonymize_interaction(interaction)
+            prompts.append(evaluate_relationships.construct_prompt(text))
+            if len(prompts) >= limit:
+                return prompts
+    return prompts
+
+def agesex_prompts(catalog, movie=MOVIE, limit=CALLS):
+    prompts = []
+    for _, _, entry in corpus.iter_pairs(catalog, movie):
+        interactions_list = dialogue_store.load_pair_file(entry["path"], evaluate_agesex.STORE)
+        texts, _ = evaluate_agesex.get_char_mapping_and_text(interactions_list)
+        prompts.extend(evaluate_agesex.construct_prompt(text) for text in texts)
+        if len(prompts) >= limit:
+            break
+    return prompts[:limit]
+
+def run_layout(module, prompts, split):
+    """Sends every prompt uncached in one layout. Returns per-call metric dicts."""
+    calls = []
+    for prompt in prompts:
+        payload = module.build_payload(prompt, split=split)
+        start = time.perf_counter()
+        body = module.backends().generate(payload)
+        wall = time.perf_counter() - start
+        if body is None:
+            continue
+        calls.append({"wall": wall, **telemetry.ollama_timings(body)})
+    return calls
+
+def describe(calls):
+    n = len(calls) or 1
+    return {
+        "calls": len(calls),
+        "prompt_tokens": sum(c["prompt_eval_count"] for c in calls) / n,
+        "prompt_eval_ms": sum(c["prompt_eval_duration"] for c in calls) / n * 1000,
+        "latency_ms": sum(c["wall"] for c in calls) / n * 1000,
+        "p95_ms": telemetry.percentile([c["wall"] for c in calls], 95) * 1000,
+    }
+
+def print_comparison(name, before, after):
+    print(f"\n{name}")
+    print(f"  {'LAYOUT':<22} {'CALLS':>5} {'PROMPT TOK/CALL':>16} {'PROMPT EVAL ms':>15} {'LATENCY ms':>11} {'p95 ms':>9}")
+    for label, row in (("single prompt", before), ("system + suffix", after)):
+        print(f"  {label:<22} {row['calls']:>5} {row['prompt_tokens']:>16.1f} {row['prompt_eval_ms']:>15.1f} "
+              f"{row['latency_ms']:>11.1f} {row['p95_ms']:>9.1f}")
+    for key, label in (("prompt_tokens", "prompt tokens"), ("prompt_eval_ms", "prompt eval"), ("latency_ms", "latency")):
+        if before[key]:
+            print(f"  {label:<14} {(1 - after[key] / before[key]) * 100:6.1f}% lower")
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    movie = args[0] if args else MOVIE
+    catalog = corpus.build_catalog(corpus.ROOT_DIR)
+
+    suites = [("RELATIONSHIPS", evaluate_relationships, relationship_prompts(catalog, movie))]
+    if "--agesex" in sys.argv:
+        suites.append(("AGE / SEX", evaluate_agesex, agesex_prompts(catalog, movie)))
+
+    for name, module, prompts in suites:
+        # Model load is excluded: both layouts start with a resident model
+        module.backends().preload(module.MODEL_NAME)
+        before = describe(run_layout(module, prompts, split=False))
+        after = describe(run_layout(module, prompts, split=True))
+        print_comparison(f"{name} ({movie}, {len(prompts)} prompts)", before, after)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,548 @@
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import shutil
+import collections
+
+import numpy as np
+
+import corpus
+import script_parser
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+MOVIES_DIR = script_parser.MOVIES_DIR
+SCRIPT_FILENAME = script_parser.SCRIPT_FILENAME
+ROOT_DIR = corpus.ROOT_DIR
+
+# One shard per movie plus a manifest of the source files each shard was
+# built from; only shards whose script or pair files changed are rebuilt.
+# Shards are flat arrays memory-mapped on open (like dialogue_store), so a
+# query only touches the posting lists of its own terms.
+INDEX_DIR = ".search_index"
+INDEX_VERSION = 2
+MANIFEST_FILENAME = "manifest.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Pair-file lines are linked to script dialogue blocks by speaker + text
+# prefix (script_parser.block_key). Lines whose text was edited are linked
+# with a phrase search for their first LINK_PHRASE_TOKENS words instead, if
+# they have at least LINK_MIN_TOKENS words.
+LINK_PHRASE_TOKENS = 6
+LINK_MIN_TOKENS = 3
+
+# Default number of hits printed by the CLI
+SEARCH_LIMIT = 20
+
+# Document kinds (stored as their index in KIND_CODES)
+SCRIPT = "script"
+DIALOGUE = "dialogue"
+KIND_CODES = [SCRIPT, DIALOGUE]
+NONE = -1
+
+# ==========================================
+# LAYOUT
+# ==========================================
+#
+# <INDEX_DIR>/manifest.json   {"version", "movies": {movie: sources}}
+# <INDEX_DIR>/<movie>/        one shard:
+#
+#   meta.json             version, movie, pair names, interned speaker names
+#   terms.bin             the term dictionary: sorted UTF-8 terms, back to back
+#   term_offsets          int64 [terms+1]       byte range in terms.bin
+#   posting_offsets       int64 [terms+1]       posting range of each term
+#   posting_docs          int32 [postings]      doc of each posting (ascending per term)
+#   position_offsets      int64 [postings+1]    range in positions
+#   positions             int32 [...]           token positions of the term in the doc
+#
+#   one entry per document:
+#   doc_kind              int8                  KIND_CODES index: SCRIPT (one per
+#                                               parse_script event: scene heading,
+#                                               action line or dialogue block) or
+#                                               DIALOGUE (one per pair-file line)
+#   doc_script_line       int32                 script line number (cue line for
+#                                               dialogue blocks; the linked block's
+#                                               cue line for pair-file lines) or NONE
+#   doc_speaker           int32                 speaker id, NONE for scene / action lines
+#   doc_pair, doc_interaction, doc_line
+#                         int32                 pair index / interaction id / line
+#                                               index, NONE for SCRIPT
+#   text_offsets          int64 [docs+1]        byte range in text.bin
+#   text.bin                                    document text
+
+DOC_COLUMNS = ["kind", "script_line", "speaker", "pair", "interaction", "line", "text"]
+SHARD_ARRAYS = [
+    "term_offsets", "posting_offsets", "posting_docs", "position_offsets", "positions",
+    "doc_kind", "doc_script_line", "doc_speaker", "doc_pair", "doc_interaction", "doc_line", "text_offsets",
+]
+
+# ==========================================
+# BUILD
+# ==========================================
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def script_path_for(movie, movies_dir=MOVIES_DIR):
+    return os.path.join(movies_dir, movie, SCRIPT_FILENAME)
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def movie_sources(movie, catalog, movies_dir=MOVIES_DIR):
+    """Signature of everything a shard is built from: the script and every pair file."""
+    script_path = script_path_for(movie, movies_dir)
+    pairs = catalog["movies"].get(movie, {}).get("pairs", {})
+    return {
+        "script": _stat(script_path) if os.path.exists(script_path) else None,
+        "pairs": {pair: [entry["mtime"], entry["size"]] for pair, entry in pairs.items()},
+    }
+
+class _ShardBuilder:
+    def __init__(self):
+        self.docs = {column: [] for column in DOC_COLUMNS}
+        self.postings = collections.defaultdict(dict)
+
+    def add(self, kind, text, script_line=None, speaker=None, pair=-1, interaction=-1, line=-1):
+        doc = len(self.docs["kind"])
+        for column, value in zip(DOC_COLUMNS, (kind, script_line, speaker, pair, interaction, line, text)):
+            self.docs[column].append(value)
+        for position, term in enumerate(tokenize(text)):
+            self.postings[term].setdefault(doc, []).append(position)
+        return doc
+
+    def phrase_docs(self, terms):
+        """Docs added so far that contain terms as a phrase."""
+        return _match_phrase([self.postings.get(term, {}) for term in terms])
+
+    def write(self, out_dir, movie, pairs):
+        """Writes the shard's arrays, blobs and meta.json into out_dir."""
+        os.makedirs(out_dir, exist_ok=True)
+        terms = sorted(self.postings)
+        term_offsets, posting_offsets, position_offsets = [0], [0], [0]
+        posting_docs, positions = [], []
+        with open(os.path.join(out_dir, "terms.bin"), 'wb') as f:
+            for term in terms:
+                encoded = term.encode("utf-8")
+                f.write(encoded)
+                term_offsets.append(term_offsets[-1] + len(encoded))
+                for doc, doc_positions in self.postings[term].items():
+                    posting_docs.append(doc)
+                    positions.extend(doc_positions)
+                    position_offsets.append(len(positions))
+                posting_offsets.append(len(posting_docs))
+
+        speakers = {}
+        speaker_ids = [NONE if name is None else speakers.setdefault(name, len(speakers))
+                       for name in self.docs["speaker"]]
+        text_offsets = [0]
+        with open(os.path.join(out_dir, "text.bin"), 'wb') as f:
+            for text in self.docs["text"]:
+                encoded = text.encode("utf-8")
+                f.write(encoded)
+                text_offsets.append(text_offsets[-1] + len(encoded))
+
+        columns = {
+            "term_offsets": np.asarray(term_offsets, dtype=np.int64),
+            "posting_offsets": np.asarray(posting_offsets, dtype=np.int64),
+            "posting_docs": np.asarray(posting_docs, dtype=np.int32),
+            "position_offsets": np.asarray(position_offsets, dtype=np.int64),
+            "positions": np.asarray(positions, dtype=np.int32),
+            "doc_kind": np.asarray([KIND_CODES.index(k) for k in self.docs["kind"]], dtype=np.int8),
+            "doc_script_line": np.asarray([NONE if l is None else l for l in self.docs["script_line"]], dtype=np.int32),
+            "doc_speaker": np.asarray(speaker_ids, dtype=np.int32),
+            "doc_pair": np.asarray(self.docs["pair"], dtype=np.int32),
+            "doc_interaction": np.asarray(self.docs["interaction"], dtype=np.int32),
+            "doc_line": np.asarray(self.docs["line"], dtype=np.int32),
+            "text_offsets": np.asarray(text_offsets, dtype=np.int64),
+        }
+        for name, array in columns.items():
+            np.save(os.path.join(out_dir, name + ".npy"), array)
+        meta = {"version": INDEX_VERSION, "movie": movie, "pairs": pairs, "speakers": list(speakers)}
+        with open(os.path.join(out_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return len(terms)
+
+def _nearest(candidates, after):
+    """First candidate line at or after `after` (the script runs forward), else the first one."""
+    k = bisect.bisect_left(candidates, after)
+    return candidates[k] if k < len(candidates) else candidates[0]
+
+def build_shard(movie, catalog, movies_dir=MOVIES_DIR):
+    """
+    Indexes one movie: every parse_script event of its script, then every
+    line of its pair files, each linked to the script dialogue block it was
+    extracted from. Returns (builder, pairs, linked, unlinked).
+    """
+    builder = _ShardBuilder()
+    block_lines = collections.defaultdict(list)     # block_key -> cue line numbers
+    script_path = script_path_for(movie, movies_dir)
+    if os.path.exists(script_path):
+        with open(script_path, 'r', encoding='utf-8', errors='replace') as f:
+            for event in script_parser.parse_script(f):
+                if event[0] == "dialogue":
+                    _, speaker, text, _, line_no = event
+                    builder.add(SCRIPT, text, line_no, speaker.upper())
+                    block_lines[script_parser.block_key(speaker, text)].append(line_no)
+                else:
+                    builder.add(SCRIPT, event[1], event[2])
+    script_docs = len(builder.docs["kind"])
+
+    pairs = []
+    linked = unlinked = 0
+    for _, pair, entry in corpus.iter_pairs(catalog, movie):
+        pair_id = len(pairs)
+        pairs.append(pair)
+        for i, interaction in enumerate(corpus.load_pair(entry)):
+            previous = 0
+            for idx, line in enumerate(interaction):
+                speaker = line.get("character", "Unknown")
+                text = line.get("dialogue", "")
+                candidates = block_lines.get(script_parser.block_key(speaker, text))
+                if not candidates:
+                    terms = tokenize(text)[:LINK_PHRASE_TOKENS]
+                    if len(terms) >= LINK_MIN_TOKENS:
+                        candidates = sorted(
+                            builder.docs["script_line"][doc] for doc in builder.phrase_docs(terms)
+                            if doc < script_docs and builder.docs["speaker"][doc] is not None)
+                script_line = None
+                if candidates:
+                    script_line = previous = _nearest(candidates, previous)
+                    linked += 1
+                else:
+                    unlinked += 1
+                builder.add(DIALOGUE, text, script_line, speaker.upper(), pair_id, i, idx)
+    return builder, pairs, linked, unlinked
+
+def indexable_movies(catalog, movies_dir=MOVIES_DIR):
+    scripts = {m for m in os.listdir(movies_dir)
+               if os.path.exists(script_path_for(m, movies_dir))} if os.path.isdir(movies_dir) else set()
+    return sorted(scripts | set(catalog["movies"]))
+
+def shard_dir(index_dir, movie):
+    return os.path.join(index_dir, movie)
+
+def write_shard(index_dir, movie, builder, pairs):
+    """Writes a shard next to the old one and swaps it in, so readers never see a half-written shard."""
+    final = shard_dir(index_dir, movie)
+    tmp = f"{final}.{os.getpid()}.tmp"
+    old = f"{final}.{os.getpid()}.old"
+    terms = builder.write(tmp, movie, pairs)
+    if os.path.exists(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+    return terms
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def load_manifest(index_dir=INDEX_DIR):
+    path = os.path.join(index_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {"version": INDEX_VERSION, "movies": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("version") != INDEX_VERSION:
+        return {"version": INDEX_VERSION, "movies": {}}
+    return manifest
+
+def update_index(index_dir=INDEX_DIR, catalog=None, movies_dir=MOVIES_DIR, verbose=False):
+    """
+    Brings the index up to date: shards of movies whose script or pair files
+    changed (or that are new) are rebuilt, shards of removed movies deleted.
+    Returns the list of rebuilt movies.
+    """
+    if catalog is None:
+        catalog = corpus.build_catalog(ROOT_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = load_manifest(index_dir)
+    movies = indexable_movies(catalog, movies_dir)
+
+    rebuilt = []
+    for movie in movies:
+        sources = movie_sources(movie, catalog, movies_dir)
+        if manifest["movies"].get(movie) == sources:
+            continue
+        start = time.perf_counter()
+        builder, pairs, linked, unlinked = build_shard(movie, catalog, movies_dir)
+        terms = write_shard(index_dir, movie, builder, pairs)
+        manifest["movies"][movie] = sources
+        rebuilt.append(movie)
+        if verbose:
+            total = linked + unlinked
+            print(f"{movie:<30} {len(builder.docs['kind']):>6} docs  {terms:>6} terms  "
+                  f"{linked}/{total} lines linked to the script  {(time.perf_counter() - start) * 1000:7.1f}ms")
+
+    for movie in set(manifest["movies"]) - set(movies):
+        shutil.rmtree(shard_dir(index_dir, movie), ignore_errors=True)
+        del manifest["movies"][movie]
+        rebuilt.append(movie)
+
+    if rebuilt:
+        _write_json(os.path.join(index_dir, MANIFEST_FILENAME), manifest)
+    return rebuilt
+
+# ==========================================
+# QUERY
+# ==========================================
+
+def _match_phrase(postings):
+    """
+    postings: one {doc: positions} per phrase term. Returns the sorted docs in
+    which the terms occur at consecutive positions.
+    """
+    if not postings or any(not p for p in postings):
+        return []
+    order = sorted(range(len(postings)), key=lambda k: len(postings[k]))
+    docs = set(postings[order[0]])
+    for k in order[1:]:
+        docs.intersection_update(postings[k])
+        if not docs:
+            return []
+    if len(postings) == 1:
+        return sorted(docs)
+    matches = []
+    for doc in sorted(docs):
+        later = [set(postings[k][doc]) for k in range(1, len(postings))]
+        if any(all(start + k + 1 in positions for k, positions in enumerate(later))
+               for start in postings[0][doc]):
+            matches.append(doc)
+    return matches
+
+def parse_query(query):
+    """'"you have to" leave' -> [["you", "have", "to"], ["leave"]]; every phrase must match."""
+    phrases = []
+    for quoted, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        terms = tokenize(quoted or word)
+        if terms:
+            phrases.append(terms)
+    return phrases
+
+def _map_blob(path):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+class Shard:
+    """
+    One movie's memory-mapped shard. Terms are looked up by binary search in
+    the term dictionary and their posting lists decoded on first use.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version in {path}")
+        self.movie = meta["movie"]
+        self.pairs = meta["pairs"]
+        self.speakers = meta["speakers"]
+        for name in SHARD_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode='r'))
+        self._terms = _map_blob(os.path.join(path, "terms.bin"))
+        self._text = _map_blob(os.path.join(path, "text.bin"))
+        self._postings = {}
+        self._dialogue_ids = None
+
+    def __len__(self):
+        return len(self.doc_kind)
+
+    def term(self, k):
+        return self._terms[self.term_offsets[k]:self.term_offsets[k + 1]].tobytes().decode("utf-8")
+
+    def term_id(self, term):
+        lo, hi = 0, len(self.term_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self.term_offsets) - 1 and self.term(lo) == term else None
+
+    def postings(self, term):
+        """{doc: positions} of a term."""
+        decoded = self._postings.get(term)
+        if decoded is None:
+            decoded = {}
+            k = self.term_id(term)
+            if k is not None:
+                start, stop = self.posting_offsets[k], self.posting_offsets[k + 1]
+                offsets = self.position_offsets[start:stop + 1].tolist()
+                positions = self.positions[offsets[0]:offsets[-1]].tolist()
+                base = offsets[0]
+                for j, doc in enumerate(self.posting_docs[start:stop].tolist()):
+                    decoded[doc] = positions[offsets[j] - base:offsets[j + 1] - base]
+            self._postings[term] = decoded
+        return decoded
+
+    def find(self, phrases):
+        """Docs matching every phrase, in document order."""
+        matches = None
+        for terms in phrases:
+            docs = _match_phrase([self.postings(term) for term in terms])
+            matches = set(docs) if matches is None else matches.intersection(docs)
+            if not matches:
+                return []
+        return sorted(matches or ())
+
+    def kind(self, doc):
+        return KIND_CODES[self.doc_kind[doc]]
+
+    def speaker(self, doc):
+        speaker = int(self.doc_speaker[doc])
+        return None if speaker == NONE else self.speakers[speaker]
+
+    def script_line(self, doc):
+        line = int(self.doc_script_line[doc])
+        return None if line == NONE else line
+
+    def text(self, doc):
+        return self._text[self.text_offsets[doc]:self.text_offsets[doc + 1]].tobytes().decode("utf-8")
+
+    def hit(self, doc):
+        hit = {"movie": self.movie, "kind": self.kind(doc), "script_line": self.script_line(doc),
+               "speaker": self.speaker(doc), "text": self.text(doc)}
+        if hit["kind"] == DIALOGUE:
+            hit.update(pair=self.pairs[self.doc_pair[doc]], interaction=int(self.doc_interaction[doc]),
+                       line=int(self.doc_line[doc]))
+        return hit
+
+    def dialogue_doc(self, pair, interaction, line):
+        if self._dialogue_ids is None:
+            docs = np.flatnonzero(np.asarray(self.doc_kind) == KIND_CODES.index(DIALOGUE))
+            self._dialogue_ids = {
+                (self.pairs[p], i, l): doc for doc, p, i, l in zip(
+                    docs.tolist(), self.doc_pair[docs].tolist(),
+                    self.doc_interaction[docs].tolist(), self.doc_line[docs].tolist())
+            }
+        return self._dialogue_ids.get((pair, interaction, line))
+
+    def link_rate(self):
+        """Share of pair-file lines linked to a script line, or None without pair files."""
+        lines = np.asarray(self.doc_script_line)[np.asarray(self.doc_kind) == KIND_CODES.index(DIALOGUE)]
+        return float((lines != NONE).mean()) if len(lines) else None
+
+class SearchIndex:
+    """
+    Phrase search over every script and pair-file line of the corpus.
+
+        index = SearchIndex()
+        index.search('"get out"', speaker="ANI", kind="dialogue")
+        index.locate("anora_aleks_ani", 3, 2)   # -> script line number
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, update=True, verbose=False):
+        self.index_dir = index_dir
+        if update:
+            update_index(index_dir, verbose=verbose)
+        self.movies = sorted(load_manifest(index_dir)["movies"])
+        self._shards = {}
+
+    def shard(self, movie):
+        """Opens (memory-maps) a movie's shard on first use."""
+        shard = self._shards.get(movie)
+        if shard is None:
+            shard = self._shards[movie] = Shard(shard_dir(self.index_dir, movie))
+        return shard
+
+    def search(self, query, speaker=None, movie=None, kind=None, limit=None):
+        """
+        Hits for a query of words and "quoted phrases" (all must occur), in
+        movie / script order. speaker matches case-insensitively; kind is
+        SCRIPT or DIALOGUE. Every hit has movie, kind, script_line, speaker
+        and text; DIALOGUE hits also have pair, interaction and line.
+        """
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+        speaker = speaker.upper() if speaker else None
+        hits = []
+        for name in self.movies:
+            if movie is not None and name != movie:
+                continue
+            shard = self.shard(name)
+            for doc in shard.find(phrases):
+                if kind is not None and shard.kind(doc) != kind:
+                    continue
+                if speaker is not None and shard.speaker(doc) != speaker:
+                    continue
+                hits.append(shard.hit(doc))
+                if limit is not None and len(hits) >= limit:
+                    return hits
+        return hits
+
+    def locate(self, pair, interaction, line):
+        """Script line number of a pair-file line (e.g. a GT line_indices entry), or None."""
+        # Pair names are "<movie>_<char1>_<char2>"
+        owners = [m for m in self.movies if pair.startswith(m + "_")]
+        if not owners:
+            return None
+        shard = self.shard(max(owners, key=len))
+        doc = shard.dialogue_doc(pair, interaction, line) if pair in shard.pairs else None
+        return None if doc is None else shard.script_line(doc)
+
+    def link_rate(self):
+        """Share of pair-file lines linked to a script line, per movie."""
+        return {movie: self.shard(movie).link_rate() for movie in self.movies}
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def format_hit(hit):
+    where = f"{hit['movie']}:{hit['script_line']}" if hit["script_line"] is not None else f"{hit['movie']}:-"
+    if hit["kind"] == DIALOGUE:
+        where += f"  {hit['pair']} #{hit['interaction']} [{hit['line']}]"
+    text = f"{hit['speaker']}: {hit['text']}" if hit["speaker"] else hit["text"]
+    return f"{where:<60} {text}"
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def main():
+    """
+    python search_index.py --build                      (re)build changed shards
+    python search_index.py QUERY [--speaker NAME] [--movie MOVIE] [--kind script|dialogue] [--limit N]
+    python search_index.py --locate PAIR INTERACTION LINE
+    """
+    args = sys.argv[1:]
+    if "--build" in args or not args:
+        start = time.perf_counter()
+        rebuilt = update_index(verbose=True)
+        print(f"Index up to date ({len(rebuilt)} shards rebuilt in {time.perf_counter() - start:.2f}s)")
+        return
+
+    index = SearchIndex()
+
+    if "--locate" in args:
+        k = args.index("--locate")
+        pair, interaction, line = args[k + 1], int(args[k + 2]), int(args[k + 3])
+        script_line = index.locate(pair, interaction, line)
+        print(f"{pair} #{interaction} [{line}] -> script line {script_line if script_line is not None else '(not linked)'}")
+        return
+
+    values = {"--speaker", "--movie", "--kind", "--limit"}
+    query = " ".join(a for k, a in enumerate(args)
+                     if not a.startswith("--") and (k == 0 or args[k - 1] not in values))
+    limit = int(option(args, "--limit", SEARCH_LIMIT))
+    start = time.perf_counter()
+    hits = index.search(query, option(args, "--speaker"), option(args, "--movie"), option(args, "--kind"), limit)
+    elapsed = time.perf_counter() - start
+    for hit in hits:
+        print(format_hit(hit))
+    print(f"{len(hits)} hits (limit {limit}) in {elapsed * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import corpus
+import dialogue_store
+import evaluate_relationships
+import evaluate_agesex
+import eval_results_relationships
+import eval_results_agesex
+import llm_schema
+from llm_cache import make_key
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# Every variant's outputs and scores, keyed by variant ID (a hash of its
+# task, model, options and template); rerunning a sweep only sends the calls
+# that are not stored yet
+RESULTS_DB = ".sweep_results.sqlite"
+
+# Default grid; a JSON file with the same keys can be passed on the command
+# line instead. options are merged into the evaluator's defaults (temperature,
+# num_ctx, seed). A template is the instruction block sent as the system
+# prompt: None for the evaluator's own SYSTEM_PROMPT, "@path" to read it
+# from a file, or the text itself.
+GRID = {
+    "task": "relationships",
+    "models": ["llama3"],
+    "options": [{"temperature": 0.1}, {"temperature": 0.7}],
+    "templates": {"default": None},
+}
+
+# Sweep one movie (quick comparisons) or the whole corpus
+TARGET_MOVIE = None
+# Cap on prompts per variant (None = all). Age/sex pairs are never split: the
+# pair that reaches the cap keeps all of its prompts, since a pair's answer
+# merges the votes of every one of them.
+MAX_PROMPTS = None
+
+# Requests in flight per Ollama endpoint
+MAX_CONCURRENT_REQUESTS = evaluate_relationships.MAX_CONCURRENT_REQUESTS
+
+# Outputs are committed to the results DB every COMMIT_EVERY answers
+COMMIT_EVERY = 50
+
+TASKS = {"relationships": evaluate_relationships, "agesex": evaluate_agesex}
+
+# Column headers of the score table
+METRIC_LABELS = {
+    "accuracy": "ACCURACY", "macro_f1": "MACRO F1", "evidence_recall": "EV RECALL",
+    "evidence_precision": "EV PREC", "pred_switch_rate": "SWITCHES",
+    "age_accuracy": "AGE ACC", "age_within_one": "AGE +/-1", "sex_accuracy": "SEX ACC",
+    "age_consistency": "AGE CONS",
+}
+
+# ==========================================
+# VARIANTS
+# ==========================================
+
+def load_template(template, module):
+    if template is None:
+        return module.SYSTEM_PROMPT
+    if template.startswith("@"):
+        with open(template[1:], 'r', encoding='utf-8') as f:
+            return f.read()
+    return template
+
+def expand_grid(grid):
+    """The grid's cross product as variant dicts with a stable ID each."""
+    task = grid.get("task", "relationships")
+    module = TASKS[task]
+    variants = []
+    for model, options, (name, template) in itertools.product(
+            grid["models"], grid["options"], grid["templates"].items()):
+        text = load_template(template, module)
+        key = json.dumps({"task": task, "model": model, "options": options, "template": text}, sort_keys=True)
+        variants.append({
+            "id": hashlib.sha1(key.encode("utf-8")).hexdigest()[:10],
+            "task": task, "model": model, "options": options,
+            "template_name": name, "template": text,
+        })
+    return variants
+
+def describe(variant):
+    options = ",".join(f"{k}={v}" for k, v in sorted(variant["options"].items()))
+    return f"{variant['model']} [{options}] {variant['template_name']}"
+
+# ==========================================
+# RESULTS DATABASE
+# ==========================================
+
+def open_db(path=RESULTS_DB):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS variants ("
+        " id TEXT PRIMARY KEY, task TEXT, model TEXT, options TEXT,"
+        " template_name TEXT, template TEXT, created REAL);"
+        "CREATE TABLE IF NOT EXISTS outputs ("
+        " variant TEXT, pair TEXT, unit INTEGER, result TEXT,"
+        " PRIMARY KEY (variant, pair, unit));"
+        "CREATE TABLE IF NOT EXISTS scores ("
+        " variant TEXT, metric TEXT, value REAL, scored REAL,"
+        " PRIMARY KEY (variant, metric));"
+    )
+    return conn
+
+def register(conn, variants):
+    conn.executemany(
+        "INSERT OR IGNORE INTO variants VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(v["id"], v["task"], v["model"], json.dumps(v["options"], sort_keys=True),
+          v["template_name"], v["template"], time.time()) for v in variants])
+    conn.commit()
+
+def stored_units(conn, variant_id):
+    return set(conn.execute("SELECT pair, unit FROM outputs WHERE variant = ?", (variant_id,)))
+
+def load_variants(conn, ids=None):
+    rows = conn.execute("SELECT id, task, model, options, template_name, template FROM variants ORDER BY created, id")
+    variants = [{"id": r[0], "task": r[1], "model": r[2], "options": json.loads(r[3]),
+                 "template_name": r[4], "template": r[5]} for r in rows]
+    return [v for v in variants if ids is None or v["id"] in ids]
+
+# ==========================================
+# PROMPTS (built once, shared by every variant)
+# ==========================================
+
+def relationship_units(catalog, movie=None, limit=None):
+    """
+    (pair, interaction id, prompt, schema, context) per interaction, with
+    the anonymization done once. context rebuilds the evidence text.
+    """
+    units = []
+    for _, pair, entry in corpus.iter_pairs(catalog, movie):
+        for i, interaction in enumerate(dialogue_store.load_pair_file(entry["path"], evaluate_relationships.STORE)):
+            text, char_map = evaluate_relationships.anonymize_interaction(
+                interaction, keep=evaluate_relationships.prompt_lines(interaction))
+            schema = evaluate_relationships.answer_schema(interaction) if evaluate_relationships.USE_SCHEMA_FORMAT else None
+            units.append((pair, i, evaluate_relationships.construct_prompt(text), schema, (interaction, char_map)))
+            if limit is not None and len(units) >= limit:
+                return units
+    return units
+
+def agesex_units(catalog, movie=None, limit=None):
+    """
+    (pair, chunk number, prompt, schema, reverse_map) per age/sex prompt.
+    limit is applied at pair boundaries, so every pair keeps all its chunks.
+    """
+    units = []
+    for _, pair, entry in corpus.iter_pairs(catalog, movie):
+        interactions_list = dialogue_store.load_pair_file(entry["path"], evaluate_agesex.STORE)
+        if not interactions_list:
+            continue
+        texts, reverse_map = evaluate_agesex.get_char_mapping_and_text(interactions_list)
+        schema = None
+        if evaluate_agesex.USE_SCHEMA_FORMAT:
+            persons = [p for p in ("Person A", "Person B") if p in reverse_map]
+            schema = llm_schema.agesex_schema(persons, evaluate_agesex.AGE_CLASSES, evaluate_agesex.SEX_CLASSES)
+        for k, text in enumerate(texts):
+            units.append((pair, k, evaluate_agesex.construct_prompt(text), schema, reverse_map))
+        if limit is not None and len(units) >= limit:
+            return units
+    return units
+
+UNIT_BUILDERS = {"relationships": relationship_units, "agesex": agesex_units}
+
+# ==========================================
+# RUN
+# ==========================================
+
+def ask(module, variant, prompt, schema):
+    """One call for one variant through the evaluator's backend and response cache."""
+    payload = module.build_payload(prompt, variant["model"], schema or "json", system=variant["template"],
+                                   split=True, options=variant["options"])
+    cache_key = None
+    if module.CACHE is not None:
+        cache_key = make_key(variant["model"], payload["options"], payload["prompt"], payload["format"], payload["system"])
+        cached = module.CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+    body = module.backends().generate(payload)
+    if body is None:
+        return None
+    text = body.get("response", "")
+    if cache_key is not None and llm_schema.is_cacheable(text, payload["format"]):
+        module.CACHE.put(cache_key, text, variant["model"])
+    return text
+
+def parse_answer(variant, prompt, response, schema, context):
+    """
+    The stored output of one call in the evaluator's own result format, or
+    None if it is unusable. Schema failures are repaired like the evaluators
+    do, re-asking with the variant's model, system prompt and options.
+    """
+    module = TASKS[variant["task"]]
+    result = module.clean_llm_json(response)
+    if schema is not None:
+        result = llm_schema.validate_and_repair(
+            result if isinstance(result, dict) else None, response, schema,
+            llm_schema.compile_validator(schema), prompt,
+            ask=lambda reask, fmt: ask(module, variant, reask, fmt),
+            stats=module.SCHEMA_STATS, limit=module.SCHEMA_REASK_ROUNDS,
+        )
+    if not isinstance(result, dict):
+        return None
+    if variant["task"] == "relationships":
+        interaction, char_map = context
+        if isinstance(result.get("evidence"), list):
+            result["evidence"] = evaluate_relationships.reconstruct_evidence_text(
+                [item for item in result["evidence"] if isinstance(item, dict)], interaction, char_map)
+    return result
+
+def schedule(variants, units, done):
+    """
+    Calls still to be made, grouped by model (each model is loaded once) and
+    interleaved across that model's variants unit by unit, so every variant
+    fills in at the same pace and a stopped sweep leaves comparable partials.
+    """
+    calls = []
+    for model in dict.fromkeys(v["model"] for v in variants):
+        same_model = [v for v in variants if v["model"] == model]
+        for unit in units:
+            for variant in same_model:
+                if (unit[0], unit[1]) not in done[variant["id"]]:
+                    calls.append((variant, unit))
+    return calls
+
+def run_sweep(variants, catalog=None, movie=TARGET_MOVIE, limit=MAX_PROMPTS, db_path=RESULTS_DB):
+    """
+    Sends every missing (variant, prompt) call and stores the parsed outputs.
+    Calls without a usable answer are not stored, so the next run retries
+    them. Returns the number of outputs stored.
+    """
+    if not variants:
+        return 0
+    task = variants[0]["task"]
+    module = TASKS[task]
+    if catalog is None:
+        catalog = corpus.build_catalog(corpus.ROOT_DIR)
+    conn = open_db(db_path)
+    register(conn, variants)
+
+    start = time.perf_counter()
+    units = UNIT_BUILDERS[task](catalog, movie, limit)
+    done = {v["id"]: stored_units(conn, v["id"]) for v in variants}
+    calls = schedule(variants, units, done)
+    print(f"Sweep: {len(variants)} variants x {len(units)} prompts "
+          f"(built in {time.perf_counter() - start:.2f}s), {len(calls)} calls to make")
+
+    pool = module.backends()
+    workers = max(1, MAX_CONCURRENT_REQUESTS * len(pool.endpoints))
+
+    def call(job):
+        """The output row, None without a response, False for an unusable answer."""
+        variant, (pair, unit, prompt, schema, context) = job
+        response = ask(module, variant, prompt, schema)
+        if response is None:
+            return None
+        result = parse_answer(variant, prompt, response, schema, context)
+        if result is None:
+            return False
+        return variant["id"], pair, unit, json.dumps(result, ensure_ascii=False)
+
+    made = missing = unusable = 0
+    model = None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Models are swept one after the other; within a model the calls are interleaved
+        for model, group in itertools.groupby(calls, key=lambda job: job[0]["model"]):
+            pool.preload(model)
+            for row in executor.map(call, list(group)):
+                if not row:
+                    missing += row is None
+                    unusable += row is False
+                    continue
+                conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)", row)
+                made += 1
+                if made % COMMIT_EVERY == 0:
+                    conn.commit()
+                    print(f"  {made}/{len(calls)} calls ({made / (time.perf_counter() - start):.1f}/s)")
+    conn.commit()
+    conn.close()
+    print(f"Sweep finished: {made} outputs stored, {missing} calls without a response, "
+          f"{unusable} unusable answers in {time.perf_counter() - start:.1f}s")
+    return made
+
+# ==========================================
+# SCORING
+# ==========================================
+
+def variant_predictions(conn, variant):
+    """Stored outputs of a variant in the layout its scorer reads from disk."""
+    predictions = {}
+    rows = conn.execute("SELECT pair, unit, result FROM outputs WHERE variant = ? ORDER BY pair, unit", (variant["id"],))
+    for pair, unit, result in rows:
+        predictions.setdefault(pair, {})[unit] = json.loads(result)
+    if variant["task"] == "relationships":
+        return {pair: {str(i): r for i, r in units.items()} for pair, units in predictions.items()}
+    return predictions
+
+def agesex_predictions(catalog, chunk_answers):
+    """{pair: {chunk: answer}} -> {pair: llm-agesex rows}, chunks merged by vote like profile_pair."""
+    entries = {pair: entry for _, pair, entry in corpus.iter_pairs(catalog)}
+    predictions = {}
+    for pair, chunks in chunk_answers.items():
+        entry = entries.get(pair)
+        if entry is None:
+            continue
+        interactions_list = dialogue_store.load_pair_file(entry["path"], evaluate_agesex.STORE)
+        _, reverse_map = evaluate_agesex.get_char_mapping(interactions_list)
+        answers = [answer for _, answer in sorted(chunks.items()) if answer]
+        predictions[pair] = evaluate_agesex.prediction_rows(
+            reverse_map, evaluate_agesex.merge_votes(answers) if answers else {})
+    return predictions
+
+def score_variant(conn, variant, catalog):
+    """Headline metrics of one variant, scored from the DB in memory."""
+    predictions = variant_predictions(conn, variant)
+    if variant["task"] == "relationships":
+        data = eval_results_relationships.load_scoring_data(catalog, predictions=predictions, verbose=False)
+        results = eval_results_relationships.score(data)
+        return {"n": results["n"], "accuracy": results["accuracy"], "macro_f1": results["macro_f1"],
+                "evidence_recall": results["evidence_recall"], "evidence_precision": results["evidence_precision"],
+                "pred_switch_rate": results["pred_switch_rate"]}
+    data = eval_results_agesex.load_scoring_data(
+        catalog, predictions=agesex_predictions(catalog, predictions), verbose=False)
+    results = eval_results_agesex.score(data)
+    return {"n": results["rows"], "age_accuracy": results["age"]["accuracy"],
+            "age_within_one": results["age"]["within_one"], "sex_accuracy": results["sex"]["accuracy"],
+            "age_consistency": results["character_age"]["consistency"]}
+
+def score_all(variants, catalog=None, db_path=RESULTS_DB):
+    """Scores every variant in one pass and stores the metrics. Returns {variant id: metrics}."""
+    if catalog is None:
+        catalog = corpus.build_catalog(corpus.ROOT_DIR)
+    conn = open_db(db_path)
+    scores = {}
+    now = time.time()
+    for variant in variants:
+        metrics = score_variant(conn, variant, catalog)
+        conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+                         [(variant["id"], metric, float(value), now) for metric, value in metrics.items()])
+        scores[variant["id"]] = metrics
+    conn.commit()
+    conn.close()
+    return scores
+
+def print_scores(variants, scores):
+    by_task = {}
+    for variant in variants:
+        by_task.setdefault(variant["task"], []).append(variant)
+    for task, group in by_task.items():
+        metrics = [m for m in scores[group[0]["id"]] if m != "n"]
+        width = 12 + 50 + 8 + 12 * len(metrics)
+        print("\n" + "="*width)
+        print(f"{'VARIANT':<10} | {'MODEL [OPTIONS] TEMPLATE':<47} | {'N':>5} | "
+              + " | ".join(f"{METRIC_LABELS.get(m, m)[:9]:>9}" for m in metrics))
+        print("="*width)
+        for variant in sorted(group, key=lambda v: -scores[v["id"]][metrics[0]]):
+            row = scores[variant["id"]]
+            print(f"{variant['id']:<10} | {describe(variant)[:47]:<47} | {int(row['n']):>5} | "
+                  + " | ".join(f"{row[m] * 100:8.2f}%" for m in metrics))
+        print("="*width)
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def main():
+    """
+    python sweep.py [GRID.json] [--movie MOVIE] [--limit N]   run the grid, then score it
+    python sweep.py --report                                   score every stored variant
+    """
+    args = sys.argv[1:]
+    movie = args[args.index("--movie") + 1] if "--movie" in args else TARGET_MOVIE
+    limit = int(args[args.index("--limit") + 1]) if "--limit" in args else MAX_PROMPTS
+    catalog = corpus.build_catalog(corpus.ROOT_DIR, verbose=True)
+
+    if "--report" in args:
+        conn = open_db()
+        variants = load_variants(conn)
+        conn.close()
+    else:
+        files = [a for a in args if a.endswith(".json")]
+        grid = GRID
+        if files:
+            with open(files[0], 'r', encoding='utf-8') as f:
+                grid = json.load(f)
+        variants = expand_grid(grid)
+        run_sweep(variants, catalog, movie, limit)
+
+    start = time.perf_counter()
+    scores = score_all(variants, catalog)
+    print(f"Scored {len(variants)} variants in {time.perf_counter() - start:.2f}s")
+    print_scores(variants, scores)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# One JSONL trace per evaluator run: traces/<script>_<YYYYmmdd-HHMMSS>.jsonl
+TRACE_DIR = "traces"
+
+# Ollama reports durations in nanoseconds
+NS = 1e9
+
+# Number of files listed in the "slowest files" section of the report
+SLOWEST_FILES = 10
+
+PERCENTILES = (50, 95, 99)
+
+# ==========================================
+# TRACER
+# ==========================================
+
+def trace_path_for(script, trace_dir=TRACE_DIR):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(trace_dir, f"{script}_{stamp}.jsonl")
+
+def ollama_timings(body):
+    """Ollama's per-call metadata in seconds / tokens (missing fields -> 0)."""
+    body = body or {}
+    return {
+        "total_duration": body.get("total_duration", 0) / NS,
+        "load_duration": body.get("load_duration", 0) / NS,
+        "prompt_eval_duration": body.get("prompt_eval_duration", 0) / NS,
+        "eval_duration": body.get("eval_duration", 0) / NS,
+        "prompt_eval_count": body.get("prompt_eval_count", 0),
+        "eval_count": body.get("eval_count", 0),
+    }
+
+class Tracer:
+    """
+    Writes one JSONL record per LLM call. Worker threads attach their own
+    context (movie, file, interaction ids, queue wait) with context(); a call
+    record stays open after call() so the caller can add its parse time with
+    parsed(), and is written on the next call or when the context closes.
+    """
+
+    def __init__(self, script, path=None):
+        self.script = script
+        self.path = path or trace_path_for(script)
+        self.started = None
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+
+    # -- context ---------------------------------------------------------
+
+    @contextlib.contextmanager
+    def context(self, **fields):
+        """Tags every call made by this thread inside the block with fields."""
+        previous = getattr(self._local, "context", {})
+        self._local.context = {**previous, **fields}
+        try:
+            yield
+        finally:
+            self._flush_open()
+            self._local.context = previous
+
+    # -- recording -------------------------------------------------------
+
+    def call(self, body, prompt, wall, cached=False):
+        """Opens the record of one generate call (body is None on failure)."""
+        self._flush_open()
+        context = getattr(self._local, "context", {})
+        now = time.time()
+        with self._lock:
+            # The run clock starts when the first call was queued, not at import
+            if self.started is None:
+                self.started = now - wall - context.get("queue_wait", 0.0)
+        record = {
+            "ts": now,
+            **context,
+            "prompt_chars": len(prompt),
+            "wall": wall,
+            "cached": cached,
+            "ok": body is not None or cached,
+            "endpoint": (body or {}).get("endpoint"),
+            **ollama_timings(None if cached else body),
+        }
+        self._local.open = record
+
+    def parsed(self, seconds, ok):
+        """Adds the parse time of the open call record and writes it."""
+        record = getattr(self._local, "open", None)
+        if record is None:
+            return
+        record["parse"] = seconds
+        record["parse_ok"] = ok
+        self._flush_open()
+
+    def _flush_open(self):
+        record = getattr(self._local, "open", None)
+        if record is None:
+            return
+        self._local.open = None
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.records.append(record)
+            if self._file is None:
+                folder = os.path.dirname(self.path)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._flush_open()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary(self):
+        self.close()
+        return summarize(self.records, time.time() - self.started if self.started else None)
+
+# ==========================================
+# COUNTERS
+# ==========================================
+
+class Counters:
+    """
+    Thread-safe counters shared by the worker threads of a run. Subclasses
+    name their counters in FIELDS (all start at 0) and format summary().
+    """
+
+    FIELDS = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        return ", ".join(f"{name} {getattr(self, name)}" for name in self.FIELDS)
+
+# ==========================================
+# REPORT
+# ==========================================
+
+def load_trace(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def percentile(values, p):
+    """Nearest-rank percentile of an unsorted list (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+def summarize(records, elapsed=None):
+    """Aggregates call records into the numbers shown by print_report()."""
+    live = [r for r in records if not r.get("cached")]
+    answered = [r for r in live if r.get("ok")]
+    if elapsed is None:
+        stamps = [r["ts"] for r in records]
+        first = min((r["ts"] - r.get("wall", 0) - r.get("queue_wait", 0) for r in records), default=0)
+        elapsed = (max(stamps) - first) if stamps else 0.0
+
+    interactions = set()
+    for r in records:
+        for i in r.get("interactions") or []:
+            interactions.add((r.get("file"), i))
+        if not r.get("interactions"):
+            interactions.add((r.get("file"), None))
+
+    per_file = {}
+    for r in records:
+        per_file[r.get("file")] = per_file.get(r.get("file"), 0.0) + r.get("wall", 0.0)
+
+    def total(field, rows=answered):
+        return sum(r.get(field, 0) for r in rows)
+
+    server = total("total_duration")
+    load, prompt_eval, generation = total("load_duration"), total("prompt_eval_duration"), total("eval_duration")
+    tokens_in, tokens_out = total("prompt_eval_count"), total("eval_count")
+
+    def dist(field, rows):
+        values = [r[field] for r in rows if field in r]
+        return {p: percentile(values, p) for p in PERCENTILES}
+
+    return {
+        "elapsed": elapsed,
+        "calls": len(records),
+        "cached": len(records) - len(live),
+        "failed": len(live) - len(answered),
+        "parse_failures": sum(1 for r in records if r.get("parse_ok") is False),
+        "interactions": len(interactions),
+        "prompt_tokens": tokens_in,
+        "output_tokens": tokens_out,
+        "interactions_per_s": len(interactions) / elapsed if elapsed else 0.0,
+        "tokens_per_s": (tokens_in + tokens_out) / elapsed if elapsed else 0.0,
+        "generation_tokens_per_s": tokens_out / generation if generation else 0.0,
+        "latency": dist("wall", answered),
+        "queue_wait": dist("queue_wait", records),
+        "parse": dist("parse", records),
+        "server": server,
+        "split": {
+            "model load": load,
+            "prompt eval": prompt_eval,
+            "generation": generation,
+            "other (server)": max(0.0, server - load - prompt_eval - generation),
+            "client / network": max(0.0, total("wall") - server),
+        },
+        "slowest_files": sorted(per_file.items(), key=lambda kv: kv[1], reverse=True)[:SLOWEST_FILES],
+    }
+
+def print_report(summary, path=None):
+    print("\n" + "="*70)
+    print("RUN TELEMETRY" + (f"  ({path})" if path else ""))
+    print("="*70)
+    print(f"  Calls             {summary['calls']}  ({summary['cached']} cached, {summary['failed']} failed, "
+          f"{summary['parse_failures']} unparsable)")
+    print(f"  Wall time         {summary['elapsed']:.2f}s")
+    print(f"  Throughput        {summary['interactions_per_s']:.2f} interactions/s   "
+          f"{summary['tokens_per_s']:.1f} tokens/s   "
+          f"({summary['generation_tokens_per_s']:.1f} generated tokens/s while decoding)")
+    print(f"  Tokens            {summary['prompt_tokens']} prompt   {summary['output_tokens']} generated")
+    if summary["interactions"]:
+        n = summary["interactions"]
+        print(f"  Per interaction   {summary['prompt_tokens'] / n:.1f} prompt   {summary['output_tokens'] / n:.1f} generated")
+
+    print(f"\n  {'':<18}" + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES))
+    for label, key in (("Call latency (s)", "latency"), ("Queue wait (s)", "queue_wait"), ("Parse (s)", "parse")):
+        print(f"  {label:<18}" + "".join(f"{summary[key][p]:>10.3f}" for p in PERCENTILES))
+
+    split = summary["split"]
+    whole = sum(split.values())
+    print("\n  Where call time goes")
+    for label, seconds in split.items():
+        share = seconds / whole * 100 if whole else 0.0
+        print(f"    {label:<18} {seconds:10.2f}s  {share:6.2f}%")
+
+    if summary["slowest_files"]:
+        print("\n  Slowest files (summed call latency)")
+        for name, seconds in summary["slowest_files"]:
+            print(f"    {seconds:10.2f}s  {name}")
+    print("="*70)
+
+if __name__ == "__main__":
+    for trace in sys.argv[1:]:
+        print_report(summarize(load_trace(trace)), trace)
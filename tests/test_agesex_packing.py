@@ -0,0 +1,59 @@
+import evaluate_agesex as ea
+
+def cost(text):
+    return ea.estimate_tokens(text) + 2
+
+def test_transcript_within_budget_is_kept_whole():
+    lines = [(0, "Person A: Hi."), (0, "Person B: Hello."), (1, "Person A: Bye.")]
+    packed = ea.pack_transcript(iter(lines), budget=100)
+    assert packed.split("\n") == ["Person A: Hi.", "Person B: Hello.", ea.INTERACTION_SEPARATOR, "Person A: Bye."]
+
+def test_least_informative_lines_are_evicted_first():
+    lines = [
+        (0, "Person A: Pass the salt."),
+        (0, "Person B: My mom turns 70 at her birthday."),
+        (0, "Person A: Sure."),
+        (1, "Person B: Okay then."),
+        (1, "Person A: Dad, I'm 16 and in high school."),
+    ]
+    budget = cost(lines[1][1]) + cost(lines[4][1])
+    packed = ea.pack_transcript(iter(lines), budget=budget)
+    # Only the cue-bearing lines survive, in their original order
+    assert packed.split("\n") == [lines[1][1], ea.INTERACTION_SEPARATOR, lines[4][1]]
+
+def test_gaps_inside_an_interaction_get_an_omission_marker():
+    lines = [(0, "Person A: He is my son."), (0, "Person B: Fine."), (0, "Person A: She is my wife.")]
+    budget = cost(lines[0][1]) + cost(lines[2][1])
+    packed = ea.pack_transcript(iter(lines), budget=budget)
+    assert packed.split("\n") == [lines[0][1], ea.OMISSION_MARKER, lines[2][1]]
+
+def test_equal_scores_drop_the_later_line():
+    lines = [(0, "Person A: Fine."), (0, "Person B: Okay."), (0, "Person A: Right.")]
+    budget = cost(lines[0][1]) + cost(lines[1][1])
+    assert ea.pack_transcript(iter(lines), budget=budget).split("\n") == [lines[0][1], lines[1][1]]
+
+def test_denser_line_outranks_a_longer_one_with_the_same_cues():
+    assert ea.line_score("Person A: Mom?") > ea.line_score("Person A: Mom, " + "I really think " * 10 + "so.")
+    # The square root keeps several cues in a long line ahead of one cue in a short line
+    long_line = "Person B: My grandma was married at 18 and retired when my dad was born, " + "she said " * 4
+    assert ea.line_score(long_line) > ea.line_score("Person B: Mom?")
+
+def test_single_answer_is_returned_as_is():
+    answer = {"Person A": {"age": "Adult", "sex": "Male"}}
+    assert ea.merge_votes([answer]) is answer
+
+def test_votes_are_merged_per_person_and_field():
+    answers = [
+        {"Person A": {"age": "Adult", "sex": "Male"}, "Person B": {"age": "Child", "sex": "Female"}},
+        {"Person A": {"age": "Senior", "sex": "Male"}, "Person B": {"age": "Adolescent"}},
+        {"Person A": {"age": "Senior", "sex": "Female"}, "Person B": "unparsed"},
+    ]
+    assert ea.merge_votes(answers) == {
+        "Person A": {"age": "Senior", "sex": "Male"},
+        # One vote each: the first answer breaks the tie
+        "Person B": {"age": "Child", "sex": "Female"},
+    }
+
+def test_person_without_any_answer_is_left_out():
+    answers = [{"Person A": {"age": "Adult", "sex": "Male"}}, {"Person A": {"age": "Adult", "sex": "Male"}}]
+    assert ea.merge_votes(answers) == {"Person A": {"age": "Adult", "sex": "Male"}}
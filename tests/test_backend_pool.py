@@ -0,0 +1,100 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ollama_client
+
+class StubOllama:
+    """A local HTTP server answering /api/generate and /api/version like Ollama, or 503 while down."""
+
+    def __init__(self, name):
+        stub = self
+        self.name = name
+        self.down = False
+        self.generated = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.reply(503 if stub.down else 200, {"version": "stub"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if stub.down:
+                    self.reply(503, {"error": "down"})
+                    return
+                stub.generated += 1
+                self.reply(200, {"response": stub.name, "done": True})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/generate"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stubs(monkeypatch):
+    monkeypatch.setattr(ollama_client, "MAX_RETRIES", 1)
+    monkeypatch.setattr(ollama_client, "BACKOFF_BASE", 0.0)
+    servers = []
+
+    def start(name):
+        servers.append(StubOllama(name))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+def test_failover_to_next_endpoint(stubs):
+    first, second = stubs("first"), stubs("second")
+    first.down = True
+    pool = ollama_client.BackendPool([first.url, second.url], retry_interval=60)
+
+    body = pool.generate({"model": "m", "prompt": "hi"})
+
+    assert body["response"] == "second"
+    assert body["endpoint"] == second.url
+    assert not pool.endpoints[0].healthy
+    assert pool.endpoints[0].failovers == 1
+    # Later requests skip the down endpoint until its re-probe is due
+    assert pool.generate({"model": "m", "prompt": "again"})["response"] == "second"
+    assert second.generated == 2
+
+def test_single_endpoint_is_never_taken_out_of_rotation(stubs):
+    only = stubs("only")
+    only.down = True
+    pool = ollama_client.BackendPool([only.url], retry_interval=60)
+
+    assert pool.generate({"model": "m", "prompt": "hi"}) is None
+    assert not pool.endpoints[0].healthy
+
+    # The server is back long before the re-probe is due
+    only.down = False
+    body = pool.generate({"model": "m", "prompt": "again"})
+    assert body["response"] == "only"
+    assert pool.endpoints[0].healthy
+
+def test_requests_go_to_the_least_busy_endpoint():
+    pool = ollama_client.BackendPool(["http://a/api/generate", "http://b/api/generate", "http://c/api/generate"])
+    first, second, third = (pool._acquire(set()) for _ in range(3))
+    assert [e.index for e in (first, second, third)] == [0, 1, 2]
+
+    pool._release(second, served=True)
+    # b is idle again; a and c still have one request each
+    assert pool._acquire(set()) is second
+    assert pool._acquire({second.url}) is first
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import llm_schema
+import evaluate_relationships as er
+
+def interaction(words):
+    return [{"character": "ANN", "dialogue": " ".join(["word"] * words)}, {"character": "BOB", "dialogue": "Yes."}]
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Batch prompts and single-interaction fallbacks, answered without a backend."""
+    calls = {"batch": [], "single": []}
+    monkeypatch.setattr(er, "SCHEMA_STATS", llm_schema.SchemaStats())
+    monkeypatch.setattr(er, "SELF_CONSISTENCY", False)
+    monkeypatch.setattr(er, "USE_SCHEMA_FORMAT", True)
+
+    def evaluate_interaction(i, interaction, options=None):
+        calls["single"].append(i)
+        return {"relationship": "Platonic", "evidence": [], "single": True}
+
+    monkeypatch.setattr(er, "evaluate_interaction", evaluate_interaction)
+    return calls
+
+def answer_batch(monkeypatch, calls, answer):
+    def query_ollama(prompt, fmt="json", system=None, options=None):
+        calls["batch"].append((prompt, fmt, system))
+        return answer if isinstance(answer, str) else json.dumps(answer)
+
+    monkeypatch.setattr(er, "query_ollama", query_ollama)
+
+def test_batches_stop_at_the_interaction_cap(monkeypatch):
+    monkeypatch.setattr(er, "BATCH_MAX_INTERACTIONS", 2)
+    pending = [(i, interaction(3)) for i in range(5)]
+    assert [[i for i, _ in batch] for batch in er.plan_batches(pending)] == [[0, 1], [2, 3], [4]]
+
+def test_batches_stop_at_the_context_budget(monkeypatch):
+    monkeypatch.setattr(er, "BATCH_MAX_INTERACTIONS", 100)
+    small, huge = interaction(3), interaction(4 * er.NUM_CTX)
+    pending = [(0, small), (1, small), (2, huge), (3, small)]
+    # An interaction larger than the budget still gets a batch of its own
+    assert [[i for i, _ in batch] for batch in er.plan_batches(pending)] == [[0, 1], [2], [3]]
+
+def test_batch_answer_is_split_per_interaction(monkeypatch, calls):
+    batch = [(3, interaction(2)), (4, interaction(2))]
+    answer_batch(monkeypatch, calls, {
+        "3": {"relationship": "Familial", "evidence": [{"line_indices": [1], "type": "Explicit"}]},
+        "4": {"relationship": "Professional", "evidence": []},
+    })
+
+    results = er.evaluate_batch(batch)
+
+    assert len(calls["batch"]) == 1 and calls["single"] == []
+    _, fmt, system = calls["batch"][0]
+    assert system == er.BATCH_SYSTEM_PROMPT
+    assert fmt["required"] == ["3", "4"]
+    assert results[3]["relationship"] == "Familial"
+    assert results[3]["evidence"][0]["text"] == "Person B: Yes."
+    assert results[4] == {"relationship": "Professional", "evidence": []}
+
+def test_missing_or_off_schema_answers_fall_back_to_single_prompts(monkeypatch, calls):
+    batch = [(0, interaction(2)), (1, interaction(2)), (2, interaction(2))]
+    answer_batch(monkeypatch, calls, {
+        "0": {"relationship": "Familial", "evidence": []},
+        "1": {"relationship": "Friends", "evidence": []},
+    })
+
+    results = er.evaluate_batch(batch)
+
+    assert calls["single"] == [1, 2]
+    assert results[0]["relationship"] == "Familial"
+    assert results[1]["single"] and results[2]["single"]
+    assert er.SCHEMA_STATS.invalid_schema == 2
+
+def test_unparseable_batch_answer_retries_every_interaction(monkeypatch, calls):
+    answer_batch(monkeypatch, calls, "not json")
+    results = er.evaluate_batch([(0, interaction(2)), (1, interaction(2))])
+    assert calls["single"] == [0, 1]
+    assert sorted(results) == [0, 1]
+
+def test_single_interaction_batch_skips_the_batch_prompt(monkeypatch, calls):
+    answer_batch(monkeypatch, calls, {})
+    assert er.evaluate_batch([(7, interaction(2))]) == {7: {"relationship": "Platonic", "evidence": [], "single": True}}
+    assert calls["batch"] == []
+    assert calls["single"] == [7]
@@ -0,0 +1,89 @@
+import os
+import json
+import re
+
+import pytest
+
+import corpus
+import llm_schema
+import llm_backends
+import evaluate_agesex as ea
+
+PROFILES = {
+    "ANN": {"age": "Adult", "sex": "Female"},
+    "BOB": {"age": "Senior", "sex": "Male"},
+    "CAT": {"age": "Child", "sex": "Female"},
+}
+
+def line(name, text):
+    return {"character": name, "dialogue": f"I am {name}. {text}"}
+
+PAIRS = {
+    "film_ann_bob": [[line("ANN", "Hi."), line("BOB", "Hello.")], [line("ANN", "Bye.")]],
+    "film_ann_cat": [[line("CAT", "Where is Dad?"), line("ANN", "Hi.")]],
+    "film_bob_cat": [[line("BOB", "Homework done?"), line("CAT", "Yes.")]],
+}
+
+class ProfileBackend(llm_backends.MockBackend):
+    """Answers each character call with the PROFILES entry of whoever speaks as Person A."""
+
+    def __init__(self, unusable=()):
+        super().__init__()
+        self.unusable = set(unusable)
+        self.prompts = []
+
+    def generate(self, payload, timeout=None, stream=False):
+        self.prompts.append(payload["prompt"])
+        (name,) = set(re.findall(r"Person A: I am (\w+)\.", payload["prompt"]))
+        answer = {"Person A": PROFILES[name]} if name not in self.unusable else {"Person A": "?"}
+        return {"response": json.dumps(answer), "done": True}
+
+@pytest.fixture
+def movie(tmp_path, monkeypatch):
+    """One movie of three pair files sharing three characters; returns (entries, eval folder, root)."""
+    for name, value in {"CACHE": None, "TRACE": None, "STORE": None, "USE_SCHEMA_FORMAT": True,
+                        "USE_SYSTEM_PREFIX": True, "SCHEMA_STATS": llm_schema.SchemaStats()}.items():
+        monkeypatch.setattr(ea, name, value)
+    (tmp_path / "film").mkdir()
+    for pair, interactions in PAIRS.items():
+        (tmp_path / "film" / f"{pair}.json").write_text(json.dumps(interactions), encoding="utf-8")
+    eval_folder = tmp_path / "film" / corpus.AGESEX_EVAL_FOLDER
+    eval_folder.mkdir()
+    catalog = corpus.build_catalog(str(tmp_path), cache_path=None)
+    return catalog["movies"]["film"]["pairs"], str(eval_folder), str(tmp_path)
+
+def prediction(eval_folder, pair):
+    with open(os.path.join(eval_folder, f"{corpus.AGESEX_PREFIX}{pair}.json"), 'r', encoding='utf-8') as f:
+        return {row.get("char1") or row.get("char2"): {"age": row["age"], "sex": row["sex"]} for row in json.load(f)}
+
+def test_one_call_per_character_fans_out_to_every_pair_file(movie, monkeypatch):
+    entries, eval_folder, root = movie
+    backend = ProfileBackend()
+    monkeypatch.setattr(ea, "BACKEND", backend)
+
+    assert ea.process_movie("film", entries, eval_folder) == (3, 3)
+
+    assert len(backend.prompts) == 3
+    for pair, interactions in PAIRS.items():
+        names = {l["character"] for interaction in interactions for l in interaction}
+        assert prediction(eval_folder, pair) == {name: PROFILES[name] for name in names}
+    # Each character's prompt holds every line of theirs across pair files, once
+    (ann_prompt,) = [p for p in backend.prompts if "Person A: I am ANN." in p]
+    assert ann_prompt.count("Person A: I am ANN. Hi.") == 1
+    assert "Person A: I am ANN. Bye." in ann_prompt
+    assert "Other: I am CAT. Where is Dad?" in ann_prompt
+    # Signed for this configuration: a rerun skips the movie
+    catalog = corpus.build_catalog(root, cache_path=None)
+    assert not any(corpus.is_stale(e, "agesex_pred", ea.run_signature())
+                   for e in catalog["movies"]["film"]["pairs"].values())
+
+def test_character_without_an_answer_leaves_only_their_rows_out(movie, monkeypatch):
+    entries, eval_folder, _ = movie
+    monkeypatch.setattr(ea, "SCHEMA_REASK_ROUNDS", 0)
+    monkeypatch.setattr(ea, "BACKEND", ProfileBackend(unusable={"ANN"}))
+
+    assert ea.process_movie("film", entries, eval_folder) == (3, 3)
+
+    assert prediction(eval_folder, "film_ann_bob") == {
+        "ANN": {"age": "Unknown", "sex": "Unknown"}, "BOB": PROFILES["BOB"]}
+    assert prediction(eval_folder, "film_bob_cat") == {"BOB": PROFILES["BOB"], "CAT": PROFILES["CAT"]}
@@ -0,0 +1,41 @@
+import os
+import json
+
+import corpus
+
+def make_pair(root, movie="film", pair="film_ann_bob", interactions=None):
+    folder = os.path.join(root, movie)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, pair + ".json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(interactions or [[{"character": "ANN", "dialogue": "Hi."}, {"character": "BOB", "dialogue": "Hey."}]], f)
+    return path
+
+def write_prediction(root, pair_path, movie="film"):
+    folder = os.path.join(root, movie, corpus.RELATIONSHIP_EVAL_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    output_path = os.path.join(folder, corpus.RELATIONSHIP_PREFIX + os.path.basename(pair_path))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({"0": {"relationship": "Platonic", "evidence": []}}, f)
+    return output_path
+
+def stale(root):
+    catalog = corpus.build_catalog(root, cache_path=None)
+    return [pair for _, pair, _ in corpus.changed_pairs(catalog, "relationship_pred")]
+
+def test_prediction_without_signature_is_stale(tmp_path):
+    root = str(tmp_path)
+    write_prediction(root, make_pair(root))
+    assert stale(root) == ["film_ann_bob"]
+
+def test_signature_ignores_mtimes_and_tracks_content(tmp_path):
+    root = str(tmp_path)
+    pair_path = make_pair(root)
+    output_path = write_prediction(root, pair_path)
+    corpus.write_signature(output_path, pair_path)
+    # A checkout can leave the prediction older than its pair file
+    os.utime(output_path, (1, 1))
+    assert stale(root) == []
+
+    make_pair(root, interactions=[[{"character": "ANN", "dialogue": "Bye."}]])
+    assert stale(root) == ["film_ann_bob"]
@@ -0,0 +1,76 @@
+import os
+import json
+
+import pytest
+
+import corpus
+import dialogue_store
+
+INTERACTIONS = [
+    [{"character": "ANN", "dialogue": "Morning, Bob.", "movie": "film"},
+     {"character": "BOB", "dialogue": "Morning — coffee?", "movie": "film"}],
+    [{"character": "BOB", "dialogue": "See you tonight.", "movie": "film"},
+     {"character": "ANN", "dialogue": "Love you.", "movie": "film"},
+     {"character": "BOB", "dialogue": "", "movie": "film"}],
+    [{"character": "ANN", "dialogue": "Sign here.", "movie": "film"}],
+]
+GT = {
+    "1": {"relationship": "Romantic", "evidence": [
+        {"line_indices": [1], "text": "ANN: Love you.", "type": "Explicit"},
+        {"line_indices": [0, 1], "text": "", "type": "Implied"}]},
+    "2": {"relationship": "Professional", "evidence": []},
+}
+
+@pytest.fixture
+def store(tmp_path):
+    """A store built over a scratch tree with one pair file and its relationship GT."""
+    root = tmp_path / "corpus"
+    (root / "film" / corpus.GT_FOLDER).mkdir(parents=True)
+    pair_path = root / "film" / "film_ann_bob.json"
+    gt_path = root / "film" / corpus.GT_FOLDER / ("film_ann_bob" + corpus.GT_SUFFIX)
+    pair_path.write_text(json.dumps(INTERACTIONS), encoding="utf-8")
+    gt_path.write_text(json.dumps(GT), encoding="utf-8")
+    out_dir = str(tmp_path / "store")
+    dialogue_store.build_store(str(root), out_dir, corpus.build_catalog(str(root), cache_path=None))
+    return dialogue_store.DialogueStore(out_dir), str(pair_path), str(gt_path)
+
+def test_slices_match_the_pair_file(store):
+    store, pair_path, _ = store
+    with open(pair_path, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    views = store.interactions("film_ann_bob")
+    assert [len(view) for view in views] == [len(interaction) for interaction in expected]
+    for view, interaction in zip(views, expected):
+        assert list(view.lines()) == [(line["character"], line["dialogue"]) for line in interaction]
+        assert view.speakers() == [line["character"] for line in interaction]
+        assert [view.dialogue(k) for k in range(len(view))] == [line["dialogue"] for line in interaction]
+    assert store.load_pair("film_ann_bob") == expected
+    assert store.movie_of("film_ann_bob") == "film"
+
+def test_gt_evidence_matches_the_gt_file(store):
+    store, _, gt_path = store
+    with open(gt_path, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    views = store.interactions("film_ann_bob")
+    assert [view.gt_relationship for view in views] == [None, "Romantic", "Professional"]
+    assert [list(view.gt_evidence_lines()) for view in views] == [[], [1, 0, 1], []]
+    assert store.load_gt("film_ann_bob") == expected
+
+def test_store_is_used_only_for_unchanged_content(store):
+    store, pair_path, gt_path = store
+    assert store.is_fresh("film_ann_bob", corpus.content_hash(pair_path))
+    assert store.is_fresh("film_ann_bob", corpus.content_hash(gt_path), "gt_sha256")
+
+    # A new mtime alone keeps the store fresh
+    os.utime(pair_path, ns=(0, 0))
+    assert dialogue_store.load_pair_file(pair_path, store) == INTERACTIONS
+    assert store.is_fresh("film_ann_bob", corpus.content_hash(pair_path))
+
+    # Edited content falls back to the JSON, even with the old mtime
+    stat = os.stat(pair_path)
+    with open(pair_path, 'w', encoding='utf-8') as f:
+        json.dump(INTERACTIONS[:1], f)
+    os.utime(pair_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert dialogue_store.load_pair_file(pair_path, store) == INTERACTIONS[:1]
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+import corpus
+import eval_results_relationships as er
+
+def scoring_data(tmp_path, evidence):
+    movie = tmp_path / "film"
+    (movie / corpus.GT_FOLDER).mkdir(parents=True)
+    lines = [{"character": "ANN", "dialogue": "Hi, Dad."}, {"character": "BOB", "dialogue": "Hi."}]
+    (movie / "film_ann_bob.json").write_text(json.dumps([lines]), encoding="utf-8")
+    gt = {"0": {"relationship": "Familial", "evidence": [{"line_indices": [0], "type": "Definitive"}]}}
+    (movie / corpus.GT_FOLDER / ("film_ann_bob" + corpus.GT_SUFFIX)).write_text(json.dumps(gt), encoding="utf-8")
+    catalog = corpus.build_catalog(str(tmp_path), cache_path=None)
+    prediction = {"0": {"relationship": "Familial", "evidence": [{"line_indices": evidence, "type": "Explicit"}]}}
+    return er.load_scoring_data(catalog, {"film_ann_bob": prediction}, verbose=False)
+
+def test_out_of_range_indices_count_against_precision_without_widening_bitsets(tmp_path):
+    data = scoring_data(tmp_path, [0, 10**9, 5000])
+    assert data["pred_bits"].shape[1] == 1
+    metrics = er.per_interaction_metrics(data)
+    assert metrics["recall"][0] == 1.0
+    assert np.isclose(metrics["precision"][0], 1 / 3)
+
+def test_popcount_matches_bit_count():
+    rng = np.random.default_rng(0)
+    bits = rng.integers(0, 2**63, size=(5, 3), dtype=np.uint64)
+    expected = [sum(bin(int(word)).count("1") for word in row) for row in bits]
+    assert er._popcount(bits).tolist() == expected
+    assert er._popcount(bits[[4, 0]]).tolist() == [expected[4], expected[0]]
@@ -0,0 +1,83 @@
+import json
+import zipfile
+
+import pytest
+
+import corpus
+import eval_results_agesex as ea
+
+NS = ea.XLSX_NS["m"]
+
+def cell(ref, value):
+    """A shared-string cell for str values (index into SHARED), a plain value otherwise."""
+    if isinstance(value, str):
+        return f'<c r="{ref}" t="s"><v>{SHARED.index(value)}</v></c>'
+    return f'<c r="{ref}"><v>{value}</v></c>'
+
+SHARED = ["Character Name", "MovieName", "Sex", "Age", "Age-Class", "Notes",
+          "Dr. Jewell", "film", "f", "Young-Adult", "EDWARD", "m", "Adult", "-"]
+
+def write_xlsx(path, rows):
+    """A minimal workbook: shared strings plus one sheet of the given rows (lists of cell XML)."""
+    strings = "".join(f"<si><t>{s}</t></si>" for s in SHARED)
+    sheet = "".join(f'<row r="{r}">{"".join(cells)}</row>' for r, cells in enumerate(rows, start=1))
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("xl/sharedStrings.xml", f'<sst xmlns="{NS}">{strings}</sst>')
+        z.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="{NS}"><sheetData>{sheet}</sheetData></worksheet>')
+
+@pytest.fixture
+def gt_xlsx(tmp_path):
+    path = str(tmp_path / "gt.xlsx")
+    write_xlsx(path, [
+        # Columns out of order, with one the parser does not know
+        [cell("A1", "MovieName"), cell("B1", "Character Name"), cell("C1", "Notes"),
+         cell("D1", "Sex"), cell("E1", "Age"), cell("F1", "Age-Class")],
+        [cell("A2", "film"), cell("B2", "Dr. Jewell"), cell("D2", "f"), cell("E2", 31), cell("F2", "Young-Adult")],
+        [],
+        [cell("A4", "film"), '<c r="B4" t="inlineStr"><is><t> Edward </t></is></c>',
+         cell("D4", "m"), cell("F4", "-")],
+        # Rows without a movie or a name are skipped
+        [cell("B5", "EDWARD"), cell("D5", "m")],
+        [cell("A6", "film"), cell("D6", "m"), cell("F6", "Adult")],
+    ])
+    return path
+
+def test_spreadsheet_rows_are_indexed_by_movie_and_normalized_name(gt_xlsx):
+    assert ea.parse_gt_xlsx(gt_xlsx) == {"film": {
+        "dr jewell": {"name": "Dr. Jewell", "sex": "f", "age": "31", "age_class": "Young-Adult"},
+        "edward": {"name": "Edward", "sex": "m", "age": "", "age_class": "-"},
+    }}
+
+def test_gt_index_is_cached_until_the_spreadsheet_changes(gt_xlsx, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "gt_cache.json")
+    index = ea.load_gt_index(gt_xlsx, cache_path)
+
+    def parse_gt_xlsx(path):
+        raise AssertionError("cached index not used")
+
+    monkeypatch.setattr(ea, "parse_gt_xlsx", parse_gt_xlsx)
+    assert ea.load_gt_index(gt_xlsx, cache_path) == index
+
+    monkeypatch.undo()
+    write_xlsx(gt_xlsx, [[cell("A1", "MovieName"), cell("B1", "Character Name")], [cell("A2", "film"), cell("B2", "EDWARD")]])
+    assert ea.load_gt_index(gt_xlsx, cache_path) == {"film": {"edward": {"name": "EDWARD"}}}
+
+def test_names_match_case_and_punctuation_insensitively(gt_xlsx, tmp_path):
+    (tmp_path / "corpus" / "film").mkdir(parents=True)
+    (tmp_path / "corpus" / "film" / "film_dr_jewell_edward.json").write_text(json.dumps([[]]), encoding="utf-8")
+    catalog = corpus.build_catalog(str(tmp_path / "corpus"), cache_path=None)
+    predictions = {"film_dr_jewell_edward": [
+        {"char1": "DR JEWELL", "age": "Young Adult", "sex": "Female"},
+        {"char2": "edward.", "age": "Teenager", "sex": "Male"},
+        {"char2": "Nestor", "age": "Adult", "sex": "Male"},
+    ]}
+
+    data = ea.load_scoring_data(catalog, ea.parse_gt_xlsx(gt_xlsx), predictions, verbose=False)
+
+    assert data["characters"] == [("film", "Dr. Jewell"), ("film", "Edward")]
+    assert data["unmatched"] == [("film", "Nestor")]
+    young_adult = ea.AGE_CLASSES.index("Young Adult")
+    assert data["gt_age"].tolist() == [young_adult, ea.MISSING]
+    # An age outside the label set is kept as a wrong answer
+    assert data["pred_age"].tolist() == [young_adult, len(ea.AGE_CLASSES)]
+    assert data["gt_sex"].tolist() == data["pred_sex"].tolist() == [ea.SEXES.index("Female"), ea.SEXES.index("Male")]
@@ -0,0 +1,26 @@
+import llm_cache
+import llm_schema
+
+SCHEMA = {"type": "object", "properties": {"relationship": {"type": "string"}}, "required": ["relationship"]}
+
+def test_only_valid_answers_are_cacheable():
+    assert llm_schema.is_cacheable('{"relationship": "Familial"}', SCHEMA)
+    assert llm_schema.is_cacheable('{}', "json")
+    assert not llm_schema.is_cacheable('{"relationship": 3}', SCHEMA)
+    assert not llm_schema.is_cacheable('["Familial"]', "json")
+    assert not llm_schema.is_cacheable('not json', "json")
+
+def test_eviction_keeps_size_under_limit(tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=100)
+    for k in range(30):
+        cache.put(str(k), "x" * 10)
+    stats = cache.stats()
+    assert stats["bytes"] <= 100
+    assert cache.get("29") == "x" * 10
+    assert cache.get("0") is None
+
+def test_replacing_an_entry_keeps_the_running_total(tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=1000)
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 30)
+    assert cache._total == cache.stats()["bytes"] == 30
@@ -0,0 +1,42 @@
+import json
+
+import llm_schema
+import evaluate_relationships as er
+
+SCHEMA = llm_schema.relationship_schema(["Platonic", "Familial"], ["Explicit", "Implied"], 2)
+BAD = {"relationship": "Friends", "evidence": []}
+
+def repair(replies):
+    asked = []
+
+    def ask(prompt, fmt):
+        asked.append(fmt)
+        return replies[min(len(asked), len(replies)) - 1]
+
+    result = llm_schema.validate_and_repair(
+        dict(BAD), json.dumps(BAD), SCHEMA, llm_schema.compile_validator(SCHEMA), "prompt", ask)
+    return result, asked
+
+def test_invalid_field_is_reasked_and_patched():
+    result, asked = repair(['{"value": "Familial"}'])
+    assert result == {"relationship": "Familial", "evidence": []}
+    assert asked == [llm_schema.reask_format(SCHEMA["properties"]["relationship"])]
+
+def test_non_object_reask_reply_is_a_failed_repair():
+    result, asked = repair(['["Familial"]', '"Familial"'])
+    assert result is None
+    assert len(asked) == 2
+
+def test_reasks_keep_system_prompt_and_options(monkeypatch):
+    calls = []
+
+    def query_ollama(prompt, fmt="json", system=None, options=None):
+        calls.append((system, options))
+        return '{"value": "Familial"}'
+
+    monkeypatch.setattr(er, "query_ollama", query_ollama)
+    monkeypatch.setattr(er, "SCHEMA_STATS", llm_schema.SchemaStats())
+    options = {"temperature": 0.7, "seed": 43}
+    result = er.validated_answer(dict(BAD), json.dumps(BAD), SCHEMA, "prompt", er.PAIR_SYSTEM_PROMPT, options)
+    assert result["relationship"] == "Familial"
+    assert calls == [(er.PAIR_SYSTEM_PROMPT, options)]
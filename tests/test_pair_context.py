@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import llm_schema
+import llm_backends
+import evaluate_relationships as er
+
+INTERACTIONS = [
+    [{"character": "ANN", "dialogue": f"Line {k}a."}, {"character": "BOB", "dialogue": f"Line {k}b."}]
+    for k in range(5)
+]
+
+class ScriptedBackend(llm_backends.MockBackend):
+    """Full prompts get the next label, confirmations the next "changed" value (None: unusable)."""
+
+    def __init__(self, labels, changed):
+        super().__init__()
+        self.labels = iter(labels)
+        self.changed = iter(changed)
+        self.asked = []
+
+    def generate(self, payload, timeout=None, stream=False):
+        if payload["system"] == er.CONFIRM_SYSTEM_PROMPT:
+            changed = next(self.changed)
+            answer = {"changed": changed, "line_indices": [0]} if changed is not None else "no idea"
+            kind = "confirm"
+        else:
+            answer = {"relationship": next(self.labels), "evidence": [{"line_indices": [1], "type": "Explicit"}]}
+            kind = "pair" if payload["system"] == er.PAIR_SYSTEM_PROMPT else "plain"
+        self.asked.append((kind, payload["prompt"]))
+        return {"response": json.dumps(answer), "done": True}
+
+@pytest.fixture
+def evaluate(monkeypatch):
+    """Runs evaluate_pair over INTERACTIONS on a scripted backend; returns (results, backend)."""
+    for name, value in {"CACHE": None, "TRACE": None, "USE_SCHEMA_FORMAT": True, "USE_SYSTEM_PREFIX": True,
+                        "PAIR_STABLE_RUN": 2, "SCHEMA_STATS": llm_schema.SchemaStats(),
+                        "PAIR_STATS": er.PairContextStats()}.items():
+        monkeypatch.setattr(er, name, value)
+
+    def run(labels, changed):
+        backend = ScriptedBackend(labels, changed)
+        monkeypatch.setattr(er, "BACKEND", backend)
+        return er.evaluate_pair(INTERACTIONS, {}), backend
+
+    return run
+
+def test_stable_label_is_confirmed_with_a_short_answer(evaluate):
+    results, backend = evaluate(["Familial", "Familial", "Familial", "Familial"], [False, False, False])
+
+    assert [kind for kind, _ in backend.asked] == ["plain", "pair", "confirm", "confirm", "confirm"]
+    assert [results[i]["relationship"] for i in range(5)] == ["Familial"] * 5
+    carried = results[2]
+    assert carried["source"] == "carried"
+    assert carried["evidence"] == [{"line_indices": [0], "type": "Implied", "text": "Person A: Line 2a."}]
+    assert (er.PAIR_STATS.confirmed, er.PAIR_STATS.changed, er.PAIR_STATS.full) == (3, 0, 2)
+
+def test_changed_label_is_reasked_in_full_with_the_summary(evaluate):
+    results, backend = evaluate(["Familial", "Familial", "Romantic", "Romantic"], [False, True])
+
+    assert [kind for kind, _ in backend.asked] == ["plain", "pair", "confirm", "confirm", "pair", "pair"]
+    assert [results[i]["relationship"] for i in range(5)] == ["Familial", "Familial", "Familial", "Romantic", "Romantic"]
+    assert "source" not in results[3]
+    reask = backend.asked[4][1]
+    assert "Current relationship: Familial (held for the last 3)" in reask
+    assert "Line 3a." in reask
+    # The new label has to hold PAIR_STABLE_RUN times before it is confirmed again
+    assert (er.PAIR_STATS.confirmed, er.PAIR_STATS.changed, er.PAIR_STATS.full) == (1, 1, 4)
+
+def test_unusable_confirmation_falls_back_to_a_full_prompt(evaluate):
+    results, backend = evaluate(["Familial", "Familial", "Professional", "Professional"], [None, False])
+
+    assert [kind for kind, _ in backend.asked] == ["plain", "pair", "confirm", "pair", "pair", "confirm"]
+    assert results[2]["relationship"] == "Professional"
+    assert er.SCHEMA_STATS.invalid_schema == 1
+    assert er.PAIR_STATS.changed == 1
@@ -0,0 +1,99 @@
+import os
+import json
+
+import pytest
+
+import corpus
+import llm_backends
+import evaluate_relationships as er
+
+INTERACTIONS = [
+    [{"character": "ANN", "dialogue": "Morning, Bob."}, {"character": "BOB", "dialogue": "Morning."}],
+    [{"character": "ANN", "dialogue": "Did you sign it?"}, {"character": "BOB", "dialogue": "Not yet."}],
+    [{"character": "BOB", "dialogue": "See you tonight."}, {"character": "ANN", "dialogue": "Love you."}],
+]
+
+@pytest.fixture
+def pair(tmp_path, monkeypatch):
+    """A pair file in a scratch tree with the evaluator on the mock backend."""
+    for name, value in {"BACKEND": llm_backends.MockBackend(), "CACHE": None, "TRACE": None, "STORE": None,
+                        "USE_CASCADE": False, "RESUME_RUNS": True}.items():
+        monkeypatch.setattr(er, name, value)
+    evaluated = []
+    evaluate_batch = er.evaluate_batch
+
+    def recording(batch, *args, **kwargs):
+        evaluated.extend(i for i, _ in batch)
+        return evaluate_batch(batch, *args, **kwargs)
+
+    monkeypatch.setattr(er, "evaluate_batch", recording)
+    movie_path = tmp_path / "film"
+    eval_folder = movie_path / corpus.RELATIONSHIP_EVAL_FOLDER
+    eval_folder.mkdir(parents=True)
+    pair_path = movie_path / "film_ann_bob.json"
+    pair_path.write_text(json.dumps(INTERACTIONS), encoding="utf-8")
+    output_path = eval_folder / (corpus.RELATIONSHIP_PREFIX + pair_path.name)
+    return evaluated, str(tmp_path), str(pair_path), str(eval_folder), str(output_path)
+
+def write_journal(output_path, run, done):
+    with open(er.journal_path_for(output_path), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"run": run}) + "\n")
+        for i, result in done.items():
+            f.write(json.dumps({"interaction": i, "result": result}) + "\n")
+
+def test_interrupted_run_resumes_from_journal(pair):
+    evaluated, _, pair_path, eval_folder, output_path = pair
+    kept = {"relationship": "Familial", "evidence_type": "Explicit", "line_indices": [0]}
+    write_journal(output_path, er.run_signature(), {0: kept})
+
+    er.process_file(pair_path, "film", eval_folder)
+
+    with open(output_path, 'r', encoding='utf-8') as f:
+        output = json.load(f)
+    assert output["0"] == kept
+    assert sorted(output) == ["0", "1", "2"]
+    assert sorted(evaluated) == [1, 2]
+    assert not os.path.exists(er.journal_path_for(output_path))
+
+def test_journal_of_other_configuration_is_discarded(pair):
+    evaluated, _, pair_path, eval_folder, output_path = pair
+    kept = {"relationship": "Familial", "evidence_type": "Explicit", "line_indices": [0]}
+    write_journal(output_path, "another-run", {0: kept, 1: kept, 2: kept})
+
+    er.process_file(pair_path, "film", eval_folder)
+
+    assert sorted(evaluated) == [0, 1, 2]
+
+def test_configuration_change_makes_output_stale(pair, monkeypatch):
+    _, root, pair_path, eval_folder, output_path = pair
+    er.process_file(pair_path, "film", eval_folder)
+
+    def stale():
+        catalog = corpus.build_catalog(root, cache_path=None)
+        entry = catalog["movies"]["film"]["pairs"]["film_ann_bob"]
+        return corpus.is_stale(entry, "relationship_pred", er.run_signature())
+
+    assert not stale()
+    monkeypatch.setattr(er, "MODEL_NAME", "another-model")
+    assert stale()
+
+class DownBackend(llm_backends.MockBackend):
+    """Every call fails, like an unreachable Ollama."""
+
+    def generate(self, payload, timeout=None, stream=False):
+        return None
+
+def test_file_without_any_answer_is_retried(pair, monkeypatch):
+    evaluated, root, pair_path, eval_folder, output_path = pair
+    monkeypatch.setattr(er, "BACKEND", DownBackend())
+    er.process_file(pair_path, "film", eval_folder)
+    assert not er.is_file_complete(output_path)
+
+    # The backend is back: the rerun picks the file up again and finishes it
+    monkeypatch.setattr(er, "BACKEND", llm_backends.MockBackend())
+    evaluated.clear()
+    er.process_file(pair_path, "film", eval_folder)
+    with open(output_path, 'r', encoding='utf-8') as f:
+        assert sorted(json.load(f)) == ["0", "1", "2"]
+    assert sorted(evaluated) == [0, 1, 2]
+    assert er.is_file_complete(output_path)
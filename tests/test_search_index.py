@@ -0,0 +1,37 @@
+import json
+
+import corpus
+import search_index
+
+INTERACTIONS = [
+    [{"character": "ANN", "dialogue": "Get out of my room."}, {"character": "BOB", "dialogue": "I will get out."}],
+    [{"character": "BOB", "dialogue": "Out of the way, get going."}],
+]
+
+def build(tmp_path, interactions=INTERACTIONS):
+    movie = tmp_path / "corpus" / "film"
+    movie.mkdir(parents=True, exist_ok=True)
+    (movie / "film_ann_bob.json").write_text(json.dumps(interactions), encoding="utf-8")
+    catalog = corpus.build_catalog(str(tmp_path / "corpus"), cache_path=None)
+    index_dir = str(tmp_path / "index")
+    rebuilt = search_index.update_index(index_dir, catalog, movies_dir=str(tmp_path / "movies"))
+    return search_index.SearchIndex(index_dir, update=False), rebuilt
+
+def test_phrase_search_over_memory_mapped_shards(tmp_path):
+    index, rebuilt = build(tmp_path)
+    assert rebuilt == ["film"]
+
+    hits = index.search('"get out"')
+    assert [(h["pair"], h["interaction"], h["line"], h["speaker"]) for h in hits] == [
+        ("film_ann_bob", 0, 0, "ANN"), ("film_ann_bob", 0, 1, "BOB")]
+    assert hits[0]["text"] == "Get out of my room."
+    assert [h["line"] for h in index.search("out get", speaker="bob")] == [1, 0]
+    assert len(index.search("out", limit=2)) == 2
+    assert index.search("missing") == []
+    assert index.link_rate() == {"film": 0.0}
+
+def test_changed_pair_file_rebuilds_its_shard(tmp_path):
+    build(tmp_path)
+    index, rebuilt = build(tmp_path, INTERACTIONS + [[{"character": "ANN", "dialogue": "Get out now."}]])
+    assert rebuilt == ["film"]
+    assert [h["interaction"] for h in index.search('"get out"')] == [0, 0, 2]
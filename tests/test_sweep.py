@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import corpus
+import sweep
+import llm_schema
+import llm_backends
+import evaluate_agesex
+import evaluate_relationships as er
+
+def test_agesex_limit_never_splits_a_pair(tmp_path, monkeypatch):
+    movie = tmp_path / "film"
+    movie.mkdir()
+    for pair in ("film_ann_bob", "film_ann_cat", "film_bob_cat"):
+        (movie / f"{pair}.json").write_text(json.dumps([[{"character": "ANN", "dialogue": "Hi."}]]), encoding="utf-8")
+    catalog = corpus.build_catalog(str(tmp_path), cache_path=None)
+    # Every pair is split into three prompts
+    monkeypatch.setattr(evaluate_agesex, "STORE", None)
+    monkeypatch.setattr(evaluate_agesex, "get_char_mapping_and_text",
+                        lambda interactions: (["one", "two", "three"], {"Person A": "ANN"}))
+
+    units = sweep.agesex_units(catalog, limit=4)
+
+    assert [(pair, k) for pair, k, *_ in units] == [
+        ("film_ann_bob", 0), ("film_ann_bob", 1), ("film_ann_bob", 2),
+        ("film_ann_cat", 0), ("film_ann_cat", 1), ("film_ann_cat", 2)]
+
+class FirstAnswerOffSchema(llm_backends.MockBackend):
+    """Answers every first ask with an unknown label; re-asks get the mock's valid answer."""
+
+    def __init__(self, repairable=True):
+        super().__init__()
+        self.repairable = repairable
+        self.payloads = []
+
+    def generate(self, payload, timeout=None, stream=False):
+        self.payloads.append(payload)
+        if payload["format"].get("required") != ["value"] or not self.repairable:
+            return {"response": json.dumps({"relationship": "Friends", "evidence": []}), "done": True}
+        return super().generate(payload, timeout, stream)
+
+@pytest.fixture
+def relationships(tmp_path, monkeypatch):
+    """A one-interaction corpus and the relationships evaluator's module state for a sweep."""
+    (tmp_path / "film").mkdir()
+    (tmp_path / "film" / "film_ann_bob.json").write_text(json.dumps(
+        [[{"character": "ANN", "dialogue": "Morning, Bob."}, {"character": "BOB", "dialogue": "Morning."}]]),
+        encoding="utf-8")
+    for name, value in {"CACHE": None, "STORE": None, "USE_SCHEMA_FORMAT": True,
+                        "SCHEMA_STATS": llm_schema.SchemaStats()}.items():
+        monkeypatch.setattr(er, name, value)
+    variant = sweep.expand_grid({"task": "relationships", "models": ["m"],
+                                 "options": [{"temperature": 0.7}], "templates": {"custom": "Be brief."}})
+    return corpus.build_catalog(str(tmp_path), cache_path=None), variant, str(tmp_path / "sweep.sqlite")
+
+def stored(db_path):
+    conn = sweep.open_db(db_path)
+    rows = [json.loads(result) for (result,) in conn.execute("SELECT result FROM outputs")]
+    conn.close()
+    return rows
+
+def test_off_schema_answer_is_reasked_with_the_variant_settings(relationships, monkeypatch):
+    catalog, variant, db_path = relationships
+    backend = FirstAnswerOffSchema()
+    monkeypatch.setattr(er, "BACKEND", backend)
+
+    assert sweep.run_sweep(variant, catalog, db_path=db_path) == 1
+    (output,) = stored(db_path)
+    assert output["relationship"] in er.RELATIONSHIPS
+    assert "error" not in output
+    reask = backend.payloads[1]
+    assert (reask["model"], reask["system"], reask["options"]["temperature"]) == ("m", "Be brief.", 0.7)
+
+def test_unrepairable_answer_is_not_stored_and_retried(relationships, monkeypatch):
+    catalog, variant, db_path = relationships
+    monkeypatch.setattr(er, "BACKEND", FirstAnswerOffSchema(repairable=False))
+    assert sweep.run_sweep(variant, catalog, db_path=db_path) == 0
+    assert stored(db_path) == []
+
+    monkeypatch.setattr(er, "BACKEND", FirstAnswerOffSchema())
+    assert sweep.run_sweep(variant, catalog, db_path=db_path) == 1
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+import telemetry
+
+def record(wall, ok=True, cached=False, **fields):
+    return {"ts": 100.0, "file": "film_ann_bob.json", "wall": wall, "ok": ok, "cached": cached, **fields}
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    random.Random(0).shuffle(values)
+    assert [telemetry.percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    # Ranks round up: the 95th percentile of ten calls is the slowest one
+    assert telemetry.percentile([0.1 * k for k in range(1, 11)], 95) == pytest.approx(1.0)
+    assert telemetry.percentile([0.1 * k for k in range(1, 11)], 50) == pytest.approx(0.5)
+    assert telemetry.percentile([7.0], 99) == 7.0
+    assert telemetry.percentile([], 50) == 0.0
+
+def test_latency_percentiles_cover_answered_live_calls_only():
+    records = [record(float(k), queue_wait=0.0) for k in range(1, 21)]
+    records += [record(500.0, ok=False, queue_wait=2.0), record(0.0, cached=True, queue_wait=4.0)]
+
+    summary = telemetry.summarize(records, elapsed=10.0)
+
+    assert (summary["calls"], summary["cached"], summary["failed"]) == (22, 1, 1)
+    assert summary["latency"] == {50: 10.0, 95: 19.0, 99: 20.0}
+    # Queue wait is measured on every call, including failed and cached ones
+    assert summary["queue_wait"] == {50: 0.0, 95: 2.0, 99: 4.0}
+
+def test_missing_fields_are_left_out_of_the_distribution():
+    records = [record(1.0, parse=0.5, parse_ok=True), record(2.0), record(3.0, parse=0.1, parse_ok=False)]
+    summary = telemetry.summarize(records, elapsed=1.0)
+    assert summary["parse"] == {50: 0.1, 95: 0.5, 99: 0.5}
+    assert summary["parse_failures"] == 1
+
+def test_tracer_writes_the_records_it_summarizes(tmp_path):
+    tracer = telemetry.Tracer("test", str(tmp_path / "trace.jsonl"))
+    body = {"response": "{}", "total_duration": 2 * telemetry.NS, "eval_count": 5}
+    with tracer.context(file="film_ann_bob.json", interactions=[0]):
+        tracer.call(body, "prompt", wall=2.5)
+        tracer.parsed(0.01, True)
+        tracer.call(None, "prompt", wall=1.0)
+
+    summary = tracer.summary()
+    assert summary == telemetry.summarize(telemetry.load_trace(tracer.path), summary["elapsed"])
+    assert (summary["calls"], summary["failed"], summary["output_tokens"]) == (2, 1, 5)
+    assert summary["latency"][50] == 2.5
+    assert summary["split"]["client / network"] == pytest.approx(0.5)
@@ -0,0 +1,30 @@
+import threading
+
+import evaluate_relationships as er
+
+INTERACTION = [{"character": "ANN", "dialogue": "Hi, Dad."}, {"character": "BOB", "dialogue": "Hi."}]
+
+def vote(monkeypatch, labels):
+    """Runs evaluate_by_vote with sample k answering labels[k]; returns (result, sampling threads)."""
+    threads = []
+
+    def sample_interaction(i, interaction, k):
+        threads.append(threading.get_ident())
+        return {"relationship": labels[k], "evidence": [{"line_indices": [0], "type": "Explicit"}]}
+
+    monkeypatch.setattr(er, "sample_interaction", sample_interaction)
+    monkeypatch.setattr(er, "VOTE_STATS", er.VoteStats())
+    return er.evaluate_by_vote(0, INTERACTION), threads
+
+def test_agreeing_samples_stop_at_the_margin(monkeypatch):
+    result, threads = vote(monkeypatch, ["Familial"] * er.VOTE_MAX_SAMPLES)
+    assert result["relationship"] == "Familial"
+    assert result["samples"] == er.VOTE_MARGIN
+    # Samples run on the caller's (worker) thread, not a nested pool
+    assert set(threads) == {threading.get_ident()}
+
+def test_contested_vote_draws_until_a_label_leads(monkeypatch):
+    result, _ = vote(monkeypatch, ["Platonic", "Familial", "Familial", "Familial", "Platonic"])
+    assert result["relationship"] == "Familial"
+    assert result["votes"] == {"Platonic": 1, "Familial": 3}
+    assert result["single"]["relationship"] == "Platonic"
@@ -0,0 +1,121 @@
+import os
+import json
+
+import pytest
+
+import corpus
+import llm_backends
+import work_queue
+import evaluate_relationships as er
+
+INTERACTIONS = [
+    [{"character": "ANN", "dialogue": "Morning, Bob."}, {"character": "BOB", "dialogue": "Morning."}],
+    [{"character": "BOB", "dialogue": "See you tonight."}, {"character": "ANN", "dialogue": "Love you."}],
+]
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """A one-pair corpus, an empty queue and the relationships evaluator on the mock backend."""
+    for name, value in {"BACKEND": llm_backends.MockBackend(), "CACHE": None, "TRACE": None,
+                        "STORE": None, "USE_CASCADE": False, "PAIR_CONTEXT": False}.items():
+        monkeypatch.setattr(er, name, value)
+    root = tmp_path / "corpus"
+    (root / "film").mkdir(parents=True)
+    (root / "film" / "film_ann_bob.json").write_text(json.dumps(INTERACTIONS), encoding="utf-8")
+    queue_path = str(tmp_path / "queue.sqlite")
+    queue = work_queue.WorkQueue(queue_path)
+    yield str(root), queue, queue_path
+    queue.close()
+
+def enqueue(root, queue):
+    return queue.enqueue(work_queue.relationship_jobs(corpus.build_catalog(root, cache_path=None)))
+
+def output_path(root):
+    return os.path.join(root, "film", corpus.RELATIONSHIP_EVAL_FOLDER, corpus.RELATIONSHIP_PREFIX + "film_ann_bob.json")
+
+def test_expired_lease_is_reclaimed_and_the_late_result_dropped(tree, monkeypatch):
+    root, queue, _ = tree
+    assert enqueue(root, queue) == len(INTERACTIONS)
+    monkeypatch.setattr(work_queue, "LEASE_SECONDS", -1)
+
+    first = queue.claim("dead")
+    again = queue.claim("alive")
+    assert (again["id"], again["attempts"]) == (first["id"], 2)
+
+    # The worker that lost the lease finishes late: its answer is ignored
+    queue.complete(first, "dead", {"relationship": "Romantic"})
+    queue.complete(again, "alive", {"relationship": "Platonic"})
+    (jobs,) = queue.pairs("relationships").values()
+    results = {i: (state, result) for i, state, result, _ in jobs}
+    assert results[first["interaction"]] == ("done", {"relationship": "Platonic"})
+
+def test_lease_expiring_max_attempts_times_fails_the_job(tree, monkeypatch):
+    root, queue, _ = tree
+    enqueue(root, queue)
+    monkeypatch.setattr(work_queue, "LEASE_SECONDS", -1)
+    for _ in range(work_queue.MAX_ATTEMPTS):
+        assert queue.claim("dead", ["relationships"])["interaction"] == 0
+    assert queue.claim("dead", ["relationships"])["interaction"] == 1
+    assert queue.failures()[0][:4] == ("relationships", "film_ann_bob", 0, work_queue.MAX_ATTEMPTS)
+
+def test_failed_job_leaves_the_file_incomplete_and_is_rescheduled(tree, monkeypatch):
+    root, queue, _ = tree
+    monkeypatch.setattr(work_queue, "MAX_ATTEMPTS", 1)
+    enqueue(root, queue)
+    done, broken = queue.claim("w"), queue.claim("w")
+    queue.complete(done, "w", {"relationship": "Platonic", "evidence": []})
+    queue.fail(broken, "w", "no response")
+
+    assert work_queue.finalize(queue, root) == (1, 1, 0)
+    path = output_path(root)
+    assert not er.is_file_complete(path)
+    assert er.load_journal(er.journal_path_for(path)) == {0: {"relationship": "Platonic", "evidence": []}}
+
+    # Only the failed interaction goes back to pending
+    assert enqueue(root, queue) == 1
+    assert queue.claim("w")["interaction"] == broken["interaction"]
+
+def test_workers_finish_the_queue_and_finalize_completes_the_file(tree):
+    root, queue, queue_path = tree
+    enqueue(root, queue)
+
+    assert work_queue.run_worker("w", ["relationships"], path=queue_path) == len(INTERACTIONS)
+    assert work_queue.finalize(queue, root) == (1, 0, 0)
+
+    path = output_path(root)
+    with open(path, 'r', encoding='utf-8') as f:
+        assert sorted(json.load(f)) == ["0", "1"]
+    assert er.is_file_complete(path)
+    # Complete and signed for this configuration: nothing left to enqueue
+    assert enqueue(root, queue) == 0
+
+def test_pair_context_makes_one_job_per_pair_file(tree, monkeypatch):
+    root, queue, queue_path = tree
+    monkeypatch.setattr(er, "PAIR_CONTEXT", True)
+    assert enqueue(root, queue) == 1
+
+    assert work_queue.run_worker("w", ["relationships"], path=queue_path) == 1
+    assert work_queue.finalize(queue, root) == (1, 0, 0)
+    with open(output_path(root), 'r', encoding='utf-8') as f:
+        assert sorted(json.load(f)) == ["0", "1"]
+
+def test_pair_file_edited_after_enqueue_is_not_signed(tree):
+    root, queue, queue_path = tree
+    enqueue(root, queue)
+    work_queue.run_worker("w", ["relationships"], path=queue_path)
+
+    # The answers were made from the old content: nothing is written or signed
+    pair_path = os.path.join(root, "film", "film_ann_bob.json")
+    with open(pair_path, 'w', encoding='utf-8') as f:
+        json.dump(INTERACTIONS[:1], f)
+    assert work_queue.finalize(queue, root) == (0, 0, 1)
+    assert not os.path.exists(output_path(root))
+
+    # The next enqueue reschedules the file for its new content
+    assert enqueue(root, queue) == 1
+    job = queue.claim("w")
+    with open(pair_path, 'w', encoding='utf-8') as f:
+        json.dump(INTERACTIONS, f)
+    # A worker never answers for content other than what the job was queued for
+    with pytest.raises(work_queue.JobFailed):
+        work_queue.load_interactions(job["path"], job["sha256"])
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+import corpus
+import llm_backends
+import evaluate_relationships as er
+
+class CountingBackend(llm_backends.MockBackend):
+    """MockBackend that records the largest number of calls in flight at once."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.peak = 0
+        self._flight_lock = threading.Lock()
+
+    def generate(self, payload, timeout=None, stream=False):
+        with self._flight_lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(0.01)
+            return super().generate(payload, timeout, stream)
+        finally:
+            with self._flight_lock:
+                self.in_flight -= 1
+
+def interactions(pair, n):
+    return [[{"character": "ANN", "dialogue": f"{pair} line {i}, Dad."}, {"character": "BOB", "dialogue": f"Reply {i}."}]
+            for i in range(n)]
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """Runs evaluate_relationships.main() over a scratch corpus; returns (outputs, backend)."""
+    monkeypatch.chdir(tmp_path)
+    for pair, n in (("film_ann_bob", 7), ("film_ann_cat", 5)):
+        os.makedirs(os.path.join("corpus", "film"), exist_ok=True)
+        with open(os.path.join("corpus", "film", pair + ".json"), 'w', encoding='utf-8') as f:
+            json.dump(interactions(pair, n), f)
+    for name, value in {"ROOT_DIR": "corpus", "PROCESS_ALL_MOVIES": True, "CACHE": None, "TRACE": None,
+                        "STORE": None, "USE_CASCADE": False, "RESUME_RUNS": False}.items():
+        monkeypatch.setattr(er, name, value)
+
+    def run(workers):
+        backend = CountingBackend()
+        monkeypatch.setattr(er, "BACKEND", backend)
+        monkeypatch.setattr(er, "MAX_CONCURRENT_REQUESTS", workers)
+        er.main()
+        outputs = {}
+        folder = os.path.join("corpus", "film", corpus.RELATIONSHIP_EVAL_FOLDER)
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".json"):
+                with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                    outputs[name] = json.load(f)
+        return outputs, backend
+
+    return run
+
+def test_parallel_run_matches_serial_run_in_interaction_order(run):
+    serial, _ = run(1)
+    parallel, backend = run(3)
+    assert parallel == serial
+    for output in parallel.values():
+        assert list(output) == [str(i) for i in range(len(output))]
+    assert backend.peak > 1
+
+def test_in_flight_requests_are_bounded(run):
+    _, backend = run(3)
+    assert backend.peak <= 3
+    _, backend = run(1)
+    assert backend.peak == 1
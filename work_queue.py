@@ -0,0 +1,543 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import socket
+import sqlite3
+import functools
+import threading
+import subprocess
+
+import corpus
+import telemetry
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+
+# On-disk job queue shared by the coordinator and every worker process
+QUEUE_PATH = ".work_queue.sqlite"
+
+# A claimed job is leased for LEASE_SECONDS and the worker's heartbeat thread
+# extends the lease every HEARTBEAT_INTERVAL. A killed worker stops beating,
+# its lease runs out and the job is handed to the next worker that asks.
+LEASE_SECONDS = 120
+HEARTBEAT_INTERVAL = 20
+
+# A job that failed (or lost its lease) this many times is marked failed;
+# `python work_queue.py requeue` puts failed jobs back
+MAX_ATTEMPTS = 3
+
+# Idle workers started with --wait poll this often for new jobs
+POLL_INTERVAL = 5.0
+
+# Job kinds: one job per interaction (relationships) or per pair file (agesex).
+# With evaluate_relationships.PAIR_CONTEXT a relationships job is a whole pair
+# file too, since each interaction's prompt depends on the ones before it.
+KINDS = ["relationships", "agesex"]
+WHOLE_FILE = -1
+
+# Seconds of history used for the throughput / ETA estimate in status
+THROUGHPUT_WINDOW = 300
+
+# ==========================================
+# QUEUE
+# ==========================================
+
+class WorkQueue:
+    """
+    SQLite-backed queue of (kind, movie, pair file, interaction) jobs.
+
+    Job states: pending -> leased -> done | failed. Claims run inside
+    BEGIN IMMEDIATE so concurrent workers never take the same job. Each
+    object holds one connection; use one per process / thread.
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " movie TEXT NOT NULL,"
+            " pair TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " interaction INTEGER NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " lease_until REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " finished REAL,"
+            " UNIQUE (kind, pair, interaction))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_claim ON jobs(state, kind, id)")
+
+    def close(self):
+        self._conn.close()
+
+    # -- coordinator ------------------------------------------------------
+
+    def enqueue(self, jobs):
+        """
+        jobs: iterable of (kind, movie, pair, path, sha256, interaction).
+        Known jobs are left alone unless their pair file's content changed
+        since they were queued, in which case they start over, or they failed,
+        in which case they get another MAX_ATTEMPTS. Returns the number of
+        new or reset jobs.
+        """
+        before = self._conn.total_changes
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.executemany(
+            "INSERT INTO jobs (kind, movie, pair, path, sha256, interaction) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (kind, pair, interaction) DO UPDATE SET "
+            " path = excluded.path, sha256 = excluded.sha256, state = 'pending', attempts = 0,"
+            " worker = NULL, lease_until = NULL, result = NULL, error = NULL, finished = NULL "
+            "WHERE jobs.sha256 != excluded.sha256 OR jobs.state = 'failed'",
+            jobs,
+        )
+        self._conn.execute("COMMIT")
+        return self._conn.total_changes - before
+
+    def requeue_failed(self):
+        cursor = self._conn.execute(
+            "UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL, lease_until = NULL "
+            "WHERE state = 'failed'")
+        return cursor.rowcount
+
+    def counts(self):
+        """{kind: {state: count}} with expired leases counted as pending."""
+        counts = {kind: {"pending": 0, "leased": 0, "done": 0, "failed": 0} for kind in KINDS}
+        now = time.time()
+        rows = self._conn.execute(
+            "SELECT kind, CASE WHEN state = 'leased' AND lease_until < ? THEN 'pending' ELSE state END, COUNT(*) "
+            "FROM jobs GROUP BY 1, 2", (now,))
+        for kind, state, n in rows:
+            counts.setdefault(kind, {})[state] = n
+        return counts
+
+    def leases(self):
+        """Live leases as (worker, kind, pair, interaction, seconds until expiry)."""
+        now = time.time()
+        return self._conn.execute(
+            "SELECT worker, kind, pair, interaction, lease_until - ? FROM jobs "
+            "WHERE state = 'leased' AND lease_until >= ? ORDER BY worker", (now, now)).fetchall()
+
+    def finished_since(self, since):
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'done' AND finished >= ?",
+                                  (since,)).fetchone()[0]
+
+    def failures(self, limit=10):
+        return self._conn.execute(
+            "SELECT kind, pair, interaction, attempts, error FROM jobs WHERE state = 'failed' "
+            "ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def pairs(self, kind):
+        """
+        {(movie, pair, path): [(interaction, state, result, sha256)]} for one
+        kind, in job order; sha256 is the pair-file content the job was queued for.
+        """
+        grouped = {}
+        rows = self._conn.execute(
+            "SELECT movie, pair, path, interaction, state, result, sha256 FROM jobs WHERE kind = ? ORDER BY id",
+            (kind,))
+        for movie, pair, path, interaction, state, result, sha256 in rows:
+            grouped.setdefault((movie, pair, path), []).append(
+                (interaction, state, json.loads(result) if result is not None else None, sha256))
+        return grouped
+
+    # -- worker -----------------------------------------------------------
+
+    def claim(self, worker, kinds=KINDS):
+        """
+        Leases the oldest available job (pending, or leased with an expired
+        lease) of the given kinds to worker. Returns the job dict or None.
+        """
+        now = time.time()
+        marks = ",".join("?" * len(kinds))
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose workers died MAX_ATTEMPTS times are given up on
+            self._conn.execute(
+                "UPDATE jobs SET state = 'failed', error = COALESCE(error, 'lease expired') "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+            row = self._conn.execute(
+                f"SELECT id, kind, movie, pair, path, sha256, interaction, attempts FROM jobs "
+                f"WHERE kind IN ({marks}) AND (state = 'pending' OR (state = 'leased' AND lease_until < ?)) "
+                f"ORDER BY id LIMIT 1", (*kinds, now)).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE id = ?", (worker, now + LEASE_SECONDS, row[0]))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        keys = ("id", "kind", "movie", "pair", "path", "sha256", "interaction", "attempts")
+        job = dict(zip(keys, row))
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_id, worker):
+        self._conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+            (time.time() + LEASE_SECONDS, job_id, worker))
+
+    def complete(self, job, worker, result):
+        """Stores the result unless the lease was lost to another worker in the meantime."""
+        self._conn.execute(
+            "UPDATE jobs SET state = 'done', result = ?, error = NULL, lease_until = NULL, finished = ? "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job["id"], worker))
+
+    def fail(self, job, worker, error, result=None):
+        """Back to pending for another attempt, or failed (keeping the last result) after MAX_ATTEMPTS."""
+        state = "failed" if job["attempts"] >= MAX_ATTEMPTS else "pending"
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, error = ?, result = ?, lease_until = NULL, finished = ? "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (state, error, json.dumps(result) if result is not None else None, time.time(), job["id"], worker))
+
+# ==========================================
+# ENQUEUE
+# ==========================================
+
+def relationship_jobs(catalog, movie=None):
+    """
+    One job per interaction (per pair file with PAIR_CONTEXT) of every pair
+    file whose prediction is missing, incomplete, stale or made by a
+    differently configured run.
+    """
+    import evaluate_relationships
+    run = evaluate_relationships.run_signature()
+    for movie_name, pair, entry in corpus.iter_pairs(catalog, movie):
+        eval_folder = os.path.join(catalog["movies"][movie_name]["path"], corpus.RELATIONSHIP_EVAL_FOLDER)
+        output_path = os.path.join(eval_folder, corpus.RELATIONSHIP_PREFIX + os.path.basename(entry["path"]))
+        if (evaluate_relationships.is_file_complete(output_path)
+                and not corpus.is_stale(entry, "relationship_pred", run)):
+            continue
+        if evaluate_relationships.PAIR_CONTEXT:
+            yield ("relationships", movie_name, pair, entry["path"], entry["sha256"], WHOLE_FILE)
+            continue
+        for i in range(entry["interactions"]):
+            yield ("relationships", movie_name, pair, entry["path"], entry["sha256"], i)
+
+def agesex_jobs(catalog, movie=None):
+    """One job per pair file whose prediction is missing, stale or made by a differently configured run."""
+    import evaluate_agesex
+    run = evaluate_agesex.run_signature()
+    for movie_name, pair, entry in corpus.changed_pairs(catalog, "agesex_pred", movie, run):
+        yield ("agesex", movie_name, pair, entry["path"], entry["sha256"], WHOLE_FILE)
+
+# ==========================================
+# WORKER
+# ==========================================
+
+@functools.lru_cache(maxsize=16)
+def load_interactions(path, sha256):
+    """
+    Contents of the pair file a job was queued for; consecutive jobs mostly hit
+    the same file. A file edited since it was queued fails the job, so answers
+    are never recorded against content they were not made from.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if hashlib.sha256(raw).hexdigest() != sha256:
+        raise JobFailed("pair file changed since it was queued; enqueue again")
+    return json.loads(raw)
+
+class JobFailed(Exception):
+    """A job produced no usable answer; result (if any) is kept when it finally fails."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+def run_pair_context_job(job, interactions_list):
+    """A whole pair file evaluated in order; returns {"i": result} like the evaluator's output."""
+    import evaluate_relationships
+    results = {}
+    pending = list(enumerate(interactions_list))
+    if evaluate_relationships.USE_CASCADE:
+        evaluate_relationships.cascade_answers(pending, job["movie"], results)
+    results.update(evaluate_relationships.evaluate_pair(interactions_list, results))
+    output_data = {str(i): results[i] for i in range(len(interactions_list)) if results.get(i) is not None}
+    missing = [i for i in range(len(interactions_list))
+               if str(i) not in output_data or "error" in output_data[str(i)]]
+    if missing:
+        raise JobFailed(f"no usable answer for interactions {missing}", output_data)
+    return output_data
+
+def run_relationship_job(job, interactions_list):
+    import evaluate_relationships
+    if job["interaction"] == WHOLE_FILE:
+        return run_pair_context_job(job, interactions_list)
+    i = job["interaction"]
+    interaction = interactions_list[i]
+    results = {}
+    pending = [(i, interaction)]
+    if evaluate_relationships.USE_CASCADE:
+        pending = evaluate_relationships.cascade_answers(pending, job["movie"], results)
+    if pending:
+        results.update(evaluate_relationships.evaluate_batch(pending))
+    result = results.get(i)
+    if result is None:
+        raise JobFailed("no response")
+    if "error" in result:
+        raise JobFailed(result["error"], result)
+    return result
+
+def run_agesex_job(job, interactions_list):
+    import evaluate_agesex
+    if not interactions_list:
+        return []
+    reverse_map, result, response = evaluate_agesex.profile_pair(interactions_list)
+    if result is None:
+        raise JobFailed("no response" if response is None else "unparsable response")
+    return evaluate_agesex.prediction_rows(reverse_map, result)
+
+JOB_RUNNERS = {"relationships": run_relationship_job, "agesex": run_agesex_job}
+
+def prepare_worker(name, kinds):
+    """Per-process evaluator setup: own trace file, model preloaded."""
+    for kind in kinds:
+        module = __import__("evaluate_relationships" if kind == "relationships" else "evaluate_agesex")
+        if module.TRACE is not None:
+            module.TRACE = telemetry.Tracer(f"{kind}_{name}")
+        module.backends().preload(module.MODEL_NAME)
+
+def run_worker(name=None, kinds=KINDS, wait=False, path=QUEUE_PATH):
+    """
+    Claims and runs jobs until the queue is empty (or forever with wait).
+    A heartbeat thread keeps the current job's lease alive.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(path)
+    prepare_worker(name, kinds)
+
+    current = {"id": None}
+    stop = threading.Event()
+
+    def beat():
+        beat_queue = WorkQueue(path)
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            if current["id"] is not None:
+                beat_queue.heartbeat(current["id"], name)
+        beat_queue.close()
+
+    heart = threading.Thread(target=beat, daemon=True)
+    heart.start()
+    done = failed = 0
+    try:
+        while True:
+            job = queue.claim(name, kinds)
+            if job is None:
+                if wait:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                break
+            current["id"] = job["id"]
+            try:
+                interactions_list = load_interactions(job["path"], job["sha256"])
+                result = JOB_RUNNERS[job["kind"]](job, interactions_list)
+            except JobFailed as e:
+                queue.fail(job, name, str(e), e.result)
+                failed += 1
+            except Exception as e:
+                queue.fail(job, name, f"{type(e).__name__}: {e}")
+                failed += 1
+            else:
+                queue.complete(job, name, result)
+                done += 1
+            finally:
+                current["id"] = None
+    finally:
+        stop.set()
+        queue.close()
+    print(f"Worker {name}: {done} jobs done, {failed} failed attempts")
+    return done
+
+# ==========================================
+# FINALIZE
+# ==========================================
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def write_journal(path, run, output_data):
+    """A checkpoint journal (see evaluate_relationships.InteractionJournal) holding output_data."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"run": run}) + "\n")
+        for i, result in output_data.items():
+            f.write(json.dumps({"interaction": int(i), "result": result}, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+def finalize(queue, root=corpus.ROOT_DIR):
+    """
+    Writes the output file of every pair whose jobs have all finished (done
+    or failed) in the layout the evaluators produce. Only jobs queued for the
+    pair file's current content count: a file edited since it was queued is
+    left waiting for the next enqueue. A relationships file with failed jobs
+    is written with what is done plus a checkpoint journal holding those
+    answers, so it stays incomplete: the evaluator resumes the missing
+    interactions and the next enqueue reschedules them.
+    Returns (written, incomplete, waiting).
+    """
+    import evaluate_agesex
+    import evaluate_relationships
+    runs = {"relationships": evaluate_relationships.run_signature(), "agesex": evaluate_agesex.run_signature()}
+    written = incomplete = waiting = 0
+    for kind in KINDS:
+        folder = corpus.RELATIONSHIP_EVAL_FOLDER if kind == "relationships" else corpus.AGESEX_EVAL_FOLDER
+        prefix = corpus.RELATIONSHIP_PREFIX if kind == "relationships" else corpus.AGESEX_PREFIX
+        for (movie, pair, path), jobs in queue.pairs(kind).items():
+            if kind == "relationships":
+                # Only the jobs of the current mode (per interaction / whole file)
+                jobs = [job for job in jobs if (job[0] == WHOLE_FILE) == bool(evaluate_relationships.PAIR_CONTEXT)]
+            if not jobs:
+                continue
+            # The signature vouches for the content the answers were made from
+            current = corpus.content_hash(path) if os.path.exists(path) else None
+            jobs = [job for job in jobs if job[3] == current]
+            if not jobs or any(state not in ("done", "failed") for _, state, _, _ in jobs):
+                waiting += 1
+                continue
+            failed = any(state == "failed" for _, state, _, _ in jobs)
+            eval_folder = os.path.join(root, movie, folder)
+            os.makedirs(eval_folder, exist_ok=True)
+            output_path = os.path.join(eval_folder, prefix + os.path.basename(path))
+            if kind == "relationships":
+                if jobs[0][0] == WHOLE_FILE:
+                    output_data = jobs[0][2] or {}
+                else:
+                    output_data = {str(i): result for i, _, result, _ in sorted(jobs, key=lambda job: job[0])
+                                   if result is not None}
+                write_json(output_path, output_data)
+                # The queue replaces the evaluator's own checkpoint journal
+                journal_path = evaluate_relationships.journal_path_for(output_path)
+                if failed:
+                    write_journal(journal_path, runs[kind], output_data)
+                elif os.path.exists(journal_path):
+                    os.remove(journal_path)
+            else:
+                result = jobs[0][2]
+                if result is None:
+                    incomplete += 1
+                    continue
+                write_json(output_path, result)
+            corpus.write_signature(output_path, path, runs[kind])
+            written += 1
+            incomplete += int(failed)
+    return written, incomplete, waiting
+
+# ==========================================
+# STATUS
+# ==========================================
+
+def print_status(queue):
+    counts = queue.counts()
+    print("\n" + "="*62)
+    print(f"QUEUE {queue.path}")
+    print(f"{'KIND':<15} | {'PENDING':>8} | {'LEASED':>8} | {'DONE':>8} | {'FAILED':>8}")
+    print("="*62)
+    for kind, states in counts.items():
+        print(f"{kind:<15} | {states.get('pending', 0):>8} | {states.get('leased', 0):>8} | "
+              f"{states.get('done', 0):>8} | {states.get('failed', 0):>8}")
+    print("="*62)
+
+    leases = queue.leases()
+    workers = sorted({worker for worker, *_ in leases})
+    print(f"Active workers: {len(workers)}")
+    for worker, kind, pair, interaction, remaining in leases:
+        target = pair if interaction == WHOLE_FILE else f"{pair} #{interaction}"
+        print(f"  {worker:<28} {kind:<14} {target}  (lease {remaining:.0f}s)")
+
+    recent = queue.finished_since(time.time() - THROUGHPUT_WINDOW)
+    rate = recent / THROUGHPUT_WINDOW
+    remaining = sum(s.get("pending", 0) + s.get("leased", 0) for s in counts.values())
+    eta = f"{remaining / rate / 60:.1f} min" if rate else "-"
+    print(f"Throughput: {rate * 60:.1f} jobs/min over the last {THROUGHPUT_WINDOW // 60} min, "
+          f"{remaining} remaining, ETA {eta}")
+
+    failures = queue.failures()
+    if failures:
+        print("Failed jobs:")
+        for kind, pair, interaction, attempts, error in failures:
+            target = pair if interaction == WHOLE_FILE else f"{pair} #{interaction}"
+            print(f"  {kind:<14} {target}  after {attempts} attempts: {error}")
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def spawn_workers(count, kinds):
+    """Runs count worker processes to completion (Ctrl-C stops them all)."""
+    command = [sys.executable, os.path.abspath(__file__), "worker", "--kinds", ",".join(kinds)]
+    processes = [subprocess.Popen(command + ["--name", f"{socket.gethostname()}:w{k}"]) for k in range(count)]
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        raise
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def main():
+    """
+    python work_queue.py enqueue [relationships|agesex|all] [MOVIE]
+    python work_queue.py worker [--kinds relationships,agesex] [--name NAME] [--wait]
+    python work_queue.py run N [--kinds ...]     start N workers, then finalize
+    python work_queue.py status
+    python work_queue.py finalize
+    python work_queue.py requeue                 retry failed jobs
+    """
+    args = sys.argv[1:]
+    command = args[0] if args else "status"
+    kinds = option(args, "--kinds", ",".join(KINDS)).split(",")
+    queue = WorkQueue()
+
+    if command == "enqueue":
+        what = args[1] if len(args) > 1 else "all"
+        movie = args[2] if len(args) > 2 else None
+        catalog = corpus.build_catalog(corpus.ROOT_DIR, verbose=True)
+        added = 0
+        if what in ("relationships", "all"):
+            added += queue.enqueue(relationship_jobs(catalog, movie))
+        if what in ("agesex", "all"):
+            added += queue.enqueue(agesex_jobs(catalog, movie))
+        print(f"Enqueued {added} jobs")
+        print_status(queue)
+    elif command == "worker":
+        queue.close()
+        run_worker(option(args, "--name"), kinds, wait="--wait" in args)
+    elif command == "run":
+        spawn_workers(int(args[1]) if len(args) > 1 else os.cpu_count() or 1, kinds)
+        print_status(queue)
+        written, incomplete, waiting = finalize(queue)
+        print(f"Finalized {written} pair files ({incomplete} incomplete after failed jobs, "
+              f"{waiting} still waiting for jobs)")
+    elif command == "finalize":
+        written, incomplete, waiting = finalize(queue)
+        print(f"Finalized {written} pair files ({incomplete} incomplete after failed jobs, "
+              f"{waiting} still waiting for jobs)")
+    elif command == "requeue":
+        print(f"Requeued {queue.requeue_failed()} failed jobs")
+    else:
+        print_status(queue)
+
+if __name__ == "__main__":
+    main()